@@ -0,0 +1,257 @@
+"""Typical period aggregation of the storage and supply optimization.
+
+The demand, pv and wind series of optimization-commodities.csv are cut into
+periods (by default days of 24 time steps) and clustered into a number of
+typical periods (ward clustering of the periods scaled per column). The
+periods with the highest demand and the highest residual load (demand
+minus the wind and pv feed-in) are kept as extreme periods of their own.
+The reduced energy system has one time step per step of a typical period,
+each weighted in the objective by the number of real time steps it stands
+for, so the weights add up to the length of the series.
+The results are mapped back onto the full time index by the period
+assignment and compared with the full hourly solve.
+
+The storage is balanced over the chain of typical periods, not over the
+full year, so its content is an approximation of the full solve.
+"""
+import json
+import logging
+import optparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import fcluster, linkage
+from instrument import enable_profile, span
+
+series_columns = ["wind", "pv"]
+
+
+def period_values(data, columns, period_steps):
+    """Return the values (periods x steps x columns) of the periods.
+
+    The last period is filled up with its last values if the series are
+    not a multiple of period_steps long, the filled steps are not counted
+    in the typical periods (see cluster_periods).
+    """
+    values = data[columns].values.astype(float)
+    n_periods = -(-len(values) // period_steps)
+    padding = n_periods * period_steps - len(values)
+    values = np.pad(values, ((0, padding), (0, 0)), mode="edge")
+    return values.reshape(n_periods, period_steps, len(columns))
+
+
+def typical_steps(assignment, period_steps, n_steps):
+    """Return the typical step of every time step of the full series.
+
+    assignment: typical period of every period.
+    n_steps: int, number of time steps of the full series.
+    """
+    steps = np.arange(n_steps)
+    return assignment[steps // period_steps] * period_steps + \
+        steps % period_steps
+
+
+def extreme_periods(periods, capacities):
+    """Return the periods with the peak demand and peak residual load.
+
+    periods: array (periods x steps x columns) of wind, pv and demand.
+    capacities: dictionary of the installed wind and pv capacity.
+    """
+    demand = periods[:, :, 2]
+    residual = demand - periods[:, :, 0] * capacities["wind"] - \
+        periods[:, :, 1] * capacities["pv"]
+    return sorted({int(demand.max(axis=1).argmax()),
+                   int(residual.max(axis=1).argmax())})
+
+
+def cluster_periods(data, demand, capacities, n_typical=12,
+                    period_steps=24, extremes=True, representation="mean"):
+    """Cluster the periods of wind, pv and demand into typical periods.
+
+    data: dataframe, commodities with the columns wind, pv and demand.
+    demand: str object, demand column.
+    capacities: dictionary of the installed wind and pv capacity
+    (optimize.capacities), to find the peak residual load.
+    n_typical: int, number of typical periods, the extreme periods come on
+    top.
+    period_steps: int, time steps per period (24 for days of hourly data,
+    96 for days of 15 minute data).
+    representation: "mean" keeps the energy of every cluster, "medoid"
+    takes the most central real period.
+    returns: typical data (typical steps x columns), weight of every typical
+    step (the number of real time steps it stands for) and the typical
+    period of every period.
+    """
+    columns = series_columns + [demand]
+    periods = period_values(data, columns, period_steps)
+    n_periods = len(periods)
+    # the filled up steps of the last period are left out of the means
+    real = (np.arange(n_periods * period_steps) < len(data)).reshape(
+        n_periods, period_steps)
+    assignment = np.full(n_periods, -1)
+    typical = []
+    if extremes:
+        for period in extreme_periods(periods, capacities):
+            assignment[period] = len(typical)
+            typical.append(periods[period])
+    rest = np.flatnonzero(assignment < 0)
+    # each column scaled to its maximum, so all columns count the same
+    scale = np.abs(periods).max(axis=(0, 1))
+    scale[scale == 0] = 1
+    features = (periods[rest] / scale).reshape(len(rest), -1)
+    n_clusters = min(n_typical, len(rest))
+    if n_clusters > 1:
+        labels = fcluster(linkage(features, "ward"), n_clusters,
+                          criterion="maxclust") - 1
+    else:
+        labels = np.zeros(len(rest), dtype=int)
+    for label in np.unique(labels):
+        members = rest[labels == label]
+        if representation == "medoid":
+            member_features = features[labels == label]
+            distance = ((member_features[:, None] -
+                         member_features[None]) ** 2).sum(axis=(1, 2))
+            profile = periods[members[distance.argmin()]]
+        else:
+            count = real[members].sum(axis=0)[:, None]
+            total = (periods[members] * real[members][:, :, None]).sum(axis=0)
+            profile = np.where(count > 0, total / np.maximum(count, 1),
+                               periods[members].mean(axis=0))
+        assignment[members] = len(typical)
+        typical.append(profile)
+
+    # the typical steps follow each other from the start of the data, as
+    # oemof_power_system takes the year from the index
+    typical_data = pd.DataFrame(
+        np.concatenate(typical), columns=columns,
+        index=pd.date_range(data.index[0], periods=len(typical) *
+                            period_steps, freq=data.index[1] - data.index[0]))
+    weights = np.bincount(
+        typical_steps(assignment, period_steps, len(data)),
+        minlength=len(typical_data)).astype(float)
+    return typical_data, weights, assignment
+
+
+def expand(sequences, assignment, period_steps, index):
+    """Map the sequences of the typical steps onto the full time index.
+
+    sequences: dataframe (typical steps x results).
+    assignment: typical period of every period of the full index.
+    """
+    rows = typical_steps(assignment, period_steps, len(index))
+    return pd.DataFrame(sequences.values[rows], index=index,
+                        columns=sequences.columns)
+
+
+def result_sequences(energysystem):
+    """Return the electricity bus and storage sequences of a solved system."""
+    from oemof.outputlib import views
+    results = energysystem.results['main']
+    sequences = pd.concat([views.node(results, 'electricity')['sequences'],
+                           views.node(results, 'storage')['sequences']],
+                          axis=1)
+    return sequences.loc[:, ~sequences.columns.duplicated()]
+
+
+def solve(data, input_path, data_path, demand, fname,
+          objective_weighting=None):
+    """Build and solve the energy system of data.
+
+    returns: result sequences, objective value and solve time in seconds.
+    """
+    from optimize import oemof_power_system, optimize
+    start = time.time()
+    energysystem = oemof_power_system(data, input_path, demand)
+    energysystem = optimize(energysystem, data_path, fname,
+                            objective_weighting)
+    seconds = time.time() - start
+    return (result_sequences(energysystem),
+            energysystem.results['meta']['objective'], seconds)
+
+
+def compare(full, aggregated):
+    """Return the error of the mapped aggregated results per sequence.
+
+    returns: dataframe with the full and aggregated sums, the relative
+    error of the sum and the normalised root mean square error.
+    """
+    value_range = (full.max() - full.min()).replace(0, 1)
+    total = full.sum()
+    report = pd.DataFrame({
+        "full_sum": total, "aggregated_sum": aggregated.sum(),
+        "sum_error": (aggregated.sum() - total) /
+        total.abs().replace(0, 1),
+        "nrmse": np.sqrt(((aggregated - full) ** 2).mean()) / value_range})
+    report.index = [str(c) for c in report.index]
+    return report
+
+
+if __name__ == '__main__':
+    enable_profile()
+    parser = optparse.OptionParser()
+    parser.add_option("-n", "--typical-periods", action="store",
+                      dest="n_typical", type="int", default=12,
+                      help="number of typical periods")
+    parser.add_option("-p", "--period-steps", action="store",
+                      dest="period_steps", type="int", default=24,
+                      help="time steps per period")
+    parser.add_option("-r", "--representation", action="store",
+                      dest="representation", type="choice",
+                      choices=["mean", "medoid"], default="mean",
+                      help="typical period as mean or medoid of a cluster")
+    parser.add_option("-x", "--no-extremes", action="store_false",
+                      dest="extremes", default=True,
+                      help="do not keep the peak periods")
+    parser.add_option("-d", "--demand", action="store", dest="demand",
+                      default="demand_Mode3",
+                      help="demand column of the optimization")
+    parser.add_option("-s", "--skip-full", action="store_false",
+                      dest="full", default=True,
+                      help="only solve the aggregated system")
+    (options, args) = parser.parse_args()
+
+    from optimize_data import capacities, get_commodities
+    data_path = '../data/03_urban_energy_requirements/'
+    input_path = '../data/01_raw_input_data/'
+    data = get_commodities(data_path)
+    with span("aggregate.cluster", rows_in=len(data)) as s:
+        start = time.time()
+        typical, weights, assignment = cluster_periods(
+            data, options.demand, capacities, options.n_typical,
+            options.period_steps, options.extremes, options.representation)
+        cluster_seconds = time.time() - start
+        s.rows_out = len(typical)
+    with span("aggregate.solve", rows_in=len(typical)):
+        sequences, objective, seconds = solve(
+            typical, input_path, data_path, options.demand,
+            'om_data_aggregated', list(weights))
+    aggregated = expand(sequences, assignment, options.period_steps,
+                        data.index)
+    path = os.path.join(data_path, 'optimization-aggregated.csv')
+    aggregated.to_csv(path)
+    report = {"periods": len(assignment), "typical_periods":
+              int(assignment.max() + 1), "timesteps": len(typical),
+              "cluster_seconds": cluster_seconds,
+              "aggregated_seconds": seconds,
+              "aggregated_objective": objective}
+    print("INFO: {} periods as {} typical periods ({} time steps)".format(
+        report["periods"], report["typical_periods"], len(typical)))
+
+    if options.full:
+        with span("aggregate.solve_full", rows_in=len(data)):
+            full, full_objective, full_seconds = solve(
+                data, input_path, data_path, options.demand, 'om_data_full')
+        errors = compare(full, aggregated)
+        report.update({
+            "full_seconds": full_seconds, "full_objective": full_objective,
+            "speed_up": full_seconds / (seconds + cluster_seconds),
+            "objective_error": (objective - full_objective) /
+            (abs(full_objective) or 1),
+            "errors": errors.to_dict(orient="index")})
+        print(errors.to_string())
+        print("INFO: speed-up {:.1f}, objective error {:.2%}".format(
+            report["speed_up"], report["objective_error"]))
+    with open(os.path.join(data_path, 'aggregation_report.json'), 'w') as f:
+        json.dump(report, f, indent=1, default=float)
+    logging.info("aggregated optimization written to {}".format(path))
@@ -0,0 +1,210 @@
+"""Run FlexiGIS for many regions in a process pool.
+
+Each region is given as a .poly boundary file or as a region id with the
+boundary ../data/01_raw_input_data/<id>.poly. For every region the raw OSM
+data is cut with osmosis, the highways are extracted without database
+(get_highways_pbf.py), the street light load is simulated and the storage
+and supply are optimized. The outputs go to ../data/regions/<id>/ with the
+usual 02_urban_output_data, 03_urban_energy_requirements and
+04_Visualisation folders.
+
+The standard load profiles and the wind and pv feed-in profiles are the same
+for all regions. They are parsed once, written as .npy arrays to a
+temporary folder (timeseries_store.store_frame) and mapped copy-on-write by
+the workers without parsing or copying them again.
+"""
+import logging
+import optparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from instrument import enable_profile, span
+from timeseries_store import load_frame, read_timeseries, store_frame
+
+input_dir = "../data/01_raw_input_data/"
+regions_dir = "../data/regions/"
+region_folders = ["02_urban_output_data", "03_urban_energy_requirements",
+                  "04_Visualisation"]
+
+# shared profiles of a worker process, set by attach_inputs
+shared_inputs = {}
+
+
+def share_inputs(inputs, folder):
+    """Write the input frames to folder for the workers to map.
+
+    returns: folder of every input frame by name.
+    """
+    handles = {}
+    for name, frame in inputs.items():
+        handles[name] = os.path.join(folder, name)
+        store_frame(frame, handles[name])
+    return handles
+
+
+def load_inputs(input_path=input_dir):
+    """Load the standard load and the feed-in profiles once."""
+    standard_load = read_timeseries(os.path.join(input_path,
+                                                 "SLP_hourly.csv"),
+                                    index_col="Zeitstempel")
+    wind = read_timeseries(os.path.join(input_path, "wind_power.csv"))
+    pv = read_timeseries(os.path.join(input_path, "pv_power.csv"))
+    feedin = wind[["wind"]].assign(pv=pv["pv"].values)
+    return {"standard_load": standard_load, "feedin": feedin}
+
+
+def attach_inputs(handles):
+    """Initialize a worker with the shared profiles of the parent."""
+    for name, folder in handles.items():
+        shared_inputs[name] = load_frame(folder)
+
+
+def region_name(region):
+    """Return the id of a region given as .poly file or id."""
+    return os.path.splitext(os.path.basename(region))[0]
+
+
+def region_poly(region):
+    """Return the boundary file of a region given as .poly file or id."""
+    if region.endswith(".poly"):
+        return region
+    return os.path.join(input_dir, region + ".poly")
+
+
+def region_paths(region, output_dir=regions_dir):
+    """Create and return the output folders of a region."""
+    base = os.path.join(output_dir, region_name(region))
+    paths = {folder: os.path.join(base, folder) + "/"
+             for folder in region_folders}
+    for path in paths.values():
+        os.makedirs(path, exist_ok=True)
+    paths["pbf"] = os.path.join(base, "highways.osm.pbf")
+    return paths
+
+
+def cut_region(raw_pbf, poly, pbf_file):
+    """Cut the highways of a region from the raw data like make filter_data."""
+    subprocess.run(["osmosis", "--read-pbf", "file=" + raw_pbf,
+                    "--bounding-polygon", "file=" + poly,
+                    "--tag-filter", "accept-ways", "highway=*",
+                    "--write-pbf", "file=" + pbf_file],
+                   check=True, stdout=subprocess.DEVNULL,
+                   stderr=subprocess.PIPE)
+
+
+def run_region(region, raw_pbf, output_dir=regions_dir, output_format="csv",
+               demand="demand_Mode3", extract=True):
+    """Run extraction, street light simulation and optimization of a region.
+
+    Runs in a worker process initialized by attach_inputs.
+    returns: dictionary with the region id, status and duration.
+    """
+    start = time.time()
+    name = region_name(region)
+    paths = region_paths(region, output_dir)
+    standard_load = shared_inputs["standard_load"]
+    feedin = shared_inputs["feedin"]
+    try:
+        if extract:
+            from get_highways_pbf import extract_pbf
+            with span("batch.extract") as s:
+                cut_region(raw_pbf, region_poly(region), paths["pbf"])
+                rows = extract_pbf(paths["pbf"], output_format,
+                                   destination=paths["02_urban_output_data"])
+                s.rows_out = sum(rows.values())
+
+        from street_scenarios import simulateStreetLight
+        with span("batch.street_light") as s:
+            simulation = simulateStreetLight()
+            simulation.config(input_dir, paths["02_urban_output_data"],
+                              paths["03_urban_energy_requirements"],
+                              paths["04_Visualisation"])
+            simulation.get_standardLoad(standard_load)
+            simulation.electricityUsageIndex()
+            simulation.simulateLoadAllRoad()
+            simulation.get_feedInData(feedin)
+            simulation.plotLoadScenario()
+            s.rows_in = len(simulation.osmData)
+
+        from optimize import get_commodities, oemof_power_system, optimize
+        with span("batch.optimize"):
+            data_path = paths["03_urban_energy_requirements"]
+            data = get_commodities(data_path)
+            energysystem = oemof_power_system(data, input_dir, demand)
+            optimize(energysystem, data_path)
+    except Exception as e:
+        logging.exception("region {} failed.".format(name))
+        return {"region": name, "status": "error: {}".format(e),
+                "seconds": time.time() - start}
+    return {"region": name, "status": "ok", "seconds": time.time() - start}
+
+
+def run_batch(regions, raw_pbf, jobs=4, output_dir=regions_dir,
+              output_format="csv", demand="demand_Mode3", extract=True):
+    """Run all regions in a process pool with shared input profiles."""
+    folder = tempfile.mkdtemp(prefix="flexigis-inputs-")
+    try:
+        handles = share_inputs(load_inputs(), folder)
+        with ProcessPoolExecutor(max_workers=jobs, initializer=attach_inputs,
+                                 initargs=(handles,)) as executor:
+            futures = [executor.submit(run_region, region, raw_pbf,
+                                       output_dir, output_format, demand,
+                                       extract) for region in regions]
+            reports = [future.result() for future in futures]
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return reports
+
+
+def read_regions(args, regions_file=None):
+    """Return the regions of the command line and of a list file."""
+    regions = list(args)
+    if regions_file:
+        with open(regions_file) as f:
+            regions += [line.strip() for line in f
+                        if line.strip() and not line.startswith("#")]
+    return regions
+
+
+if __name__ == "__main__":
+    enable_profile()
+    parser = optparse.OptionParser(
+        usage="%prog [options] region.poly|region_id ...")
+    parser.add_option("-f", "--regions-file", action="store",
+                      dest="regions_file", default=None,
+                      help="file with one .poly file or region id per line")
+    parser.add_option("-r", "--raw-pbf", action="store", dest="raw_pbf",
+                      default=input_dir + "berlin-latest.osm.pbf",
+                      help="raw OSM data the regions are cut from")
+    parser.add_option("-J", "--jobs", action="store", dest="jobs",
+                      type="int", default=4, help="worker processes")
+    parser.add_option("-o", "--output-dir", action="store",
+                      dest="output_dir", default=regions_dir,
+                      help="folder of the region outputs")
+    parser.add_option("-F", "--format", action="store", dest="output_format",
+                      type="choice", choices=["csv", "parquet"],
+                      default="csv", help="output format, csv or parquet")
+    parser.add_option("-d", "--demand", action="store", dest="demand",
+                      default="demand_Mode3",
+                      help="demand column of the optimization")
+    parser.add_option("-s", "--skip-extract", action="store_false",
+                      dest="extract", default=True,
+                      help="reuse the highway tables of the regions")
+    (options, args) = parser.parse_args()
+    regions = read_regions(args, options.regions_file)
+    if not regions:
+        parser.error("no regions given")
+
+    print("  === BATCH OF {} REGIONS ON {} WORKERS ====".format(
+        len(regions), options.jobs))
+    reports = run_batch(regions, options.raw_pbf, options.jobs,
+                        options.output_dir, options.output_format,
+                        options.demand, options.extract)
+    for report in reports:
+        print("INFO: {region}: {status} ({seconds:.1f} s)".format(**report))
+    failed = [r for r in reports if r["status"] != "ok"]
+    print("INFO: {} of {} regions done, outputs in {}".format(
+        len(reports) - len(failed), len(reports), options.output_dir))
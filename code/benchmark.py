@@ -0,0 +1,443 @@
+"""Benchmark how the FlexiGIS stages scale with the number of ways.
+
+Synthetic planet_osm_line, planet_osm_polygon and planet_osm_point rows with
+a realistic mix of highway categories and geometry sizes are fed through the
+extraction classes of get_highways.py via an in-process stand-in cursor, and
+the outputs through the downstream stages. Every stage runs in a fresh
+process inside a scratch copy of the data folders, and its wall time, peak
+RSS and output size are recorded. With a stored baseline the run fails when
+a stage regresses beyond the tolerance.
+"""
+import json
+import multiprocessing as mp
+import optparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from instrument import output_bytes, peak_rss_mb
+
+code_dir = os.path.dirname(os.path.abspath(__file__))
+input_dir = os.path.join(code_dir, "../data/01_raw_input_data/")
+baseline_file = os.path.join(code_dir, "benchmark_baseline.json")
+result_file = os.path.join(code_dir, "log/benchmark.json")
+
+# share of the highway categories in the planet_osm_* tables, categories
+# outside the whitelists of get_highways.py are filtered by the stages
+line_mix = {"residential": 0.27, "service": 0.20, "footway": 0.16,
+            "track": 0.05, "path": 0.04, "cycleway": 0.03, "tertiary": 0.06,
+            "secondary": 0.05, "primary": 0.04, "living_street": 0.02,
+            "pedestrian": 0.02, "trunk": 0.01, "motorway": 0.01,
+            "motorway_link": 0.01, "primary_link": 0.01,
+            "secondary_link": 0.01, "tertiary_link": 0.005,
+            "trunk_link": 0.005}
+polygon_mix = {"pedestrian": 0.30, "footway": 0.15, "platform": 0.15,
+               "service": 0.10, "residential": 0.05, "crossing": 0.05,
+               "traffic_island": 0.05, "living_street": 0.05,
+               "rest_area": 0.05, "services": 0.05}
+point_mix = {"street_lamp": 0.35, "crossing": 0.22, "traffic_signals": 0.12,
+             "bus_stop": 0.10, "give_way": 0.05, "stop": 0.04,
+             "turning_circle": 0.04, "motorway_junction": 0.02,
+             "speed_camera": 0.02, "platform": 0.02, "passing_place": 0.02}
+# shares of the line, polygon and point rows of a synthetic region
+table_share = {"planet_osm_line": 1.0, "planet_osm_polygon": 0.05,
+               "planet_osm_point": 0.4}
+# center of the synthetic region (Berlin) in EPSG:3857
+center = (1491000.0, 6894000.0)
+extent = 25000.0
+
+
+def category_sample(rng, mix, n):
+    """Draw n highway categories with the shares of a category mix."""
+    shares = np.array(list(mix.values()))
+    return np.array(list(mix))[rng.choice(len(mix), n, p=shares/shares.sum())]
+
+
+def wkt_coordinates(x, y, counts):
+    """Return the WKT coordinate list of each part of flat coordinates."""
+    pairs = np.char.add(np.char.add(np.round(x, 2).astype(str), " "),
+                        np.round(y, 2).astype(str)).tolist()
+    ends = np.cumsum(counts)
+    return [", ".join(pairs[e - c:e]) for e, c in zip(ends, counts)]
+
+
+def synthetic_lines(n, seed=0):
+    """Return n synthetic rows of the line query.
+
+    Each way is a random walk of 2 and more vertices (8 on average) with
+    segments of about 25 m. Rows are (osm_id, highway, length, geometry,
+    lanes) like the line query with a lanes column.
+    """
+    rng = np.random.default_rng(seed)
+    counts = np.minimum(2 + rng.geometric(1/6, n), 200)
+    start = np.repeat(rng.uniform(-extent, extent, (n, 2)), counts, axis=0)
+    steps = rng.normal(0, 18, (counts.sum(), 2))
+    first = np.r_[0, np.cumsum(counts)[:-1]]
+    steps[first] = 0
+    # cumulative steps restarted at the first vertex of every way
+    walk = np.cumsum(steps, axis=0)
+    walk -= np.repeat(walk[first], counts, axis=0)
+    x, y = center[0] + start[:, 0] + walk[:, 0], \
+        center[1] + start[:, 1] + walk[:, 1]
+    segment = np.hypot(np.diff(x), np.diff(y))
+    index = np.repeat(np.arange(n), counts)
+    same = index[1:] == index[:-1]
+    length = np.bincount(index[1:][same], weights=segment[same], minlength=n)
+    geometry = ["SRID=3857;LINESTRING(" + c + ")"
+                for c in wkt_coordinates(x, y, counts)]
+    lanes = rng.choice(["unknown", "1", "2", "3", "4"], n,
+                       p=[0.6, 0.1, 0.2, 0.05, 0.05])
+    return list(zip(np.arange(1, n + 1), category_sample(rng, line_mix, n),
+                    length, geometry, lanes))
+
+
+def synthetic_polygons(n, seed=0):
+    """Return n synthetic rows (osm_id, highway, area, geometry).
+
+    Polygons are star shaped rings of 4 and more vertices (12 on average)
+    with a radius of about 30 m.
+    """
+    rng = np.random.default_rng(seed + 1)
+    counts = np.minimum(4 + rng.geometric(1/8, n), 200)
+    index = np.repeat(np.arange(n), counts)
+    angle = np.sort(rng.uniform(0, 2*np.pi, counts.sum()) + 2*np.pi*index)
+    radius = rng.uniform(10, 50, counts.sum())
+    start = rng.uniform(-extent, extent, (n, 2))
+    x = center[0] + start[index, 0] + radius*np.cos(angle)
+    y = center[1] + start[index, 1] + radius*np.sin(angle)
+    # close the rings by repeating their first vertex
+    ends = np.cumsum(counts)
+    first = ends - counts
+    x = np.insert(x, ends, x[first])
+    y = np.insert(y, ends, y[first])
+    closed = counts + 1
+    index = np.repeat(np.arange(n), closed)
+    cross = x[:-1]*y[1:] - x[1:]*y[:-1]
+    same = index[1:] == index[:-1]
+    area = np.abs(np.bincount(index[1:][same], weights=cross[same],
+                              minlength=n)) / 2
+    geometry = ["SRID=3857;POLYGON((" + c + "))"
+                for c in wkt_coordinates(x, y, closed)]
+    return list(zip(-np.arange(1, n + 1),
+                    category_sample(rng, polygon_mix, n), area, geometry))
+
+
+def synthetic_points(n, seed=0):
+    """Return n synthetic rows (osm_id, highway, geometry, x, y)."""
+    rng = np.random.default_rng(seed + 2)
+    x = center[0] + rng.uniform(-extent, extent, n)
+    y = center[1] + rng.uniform(-extent, extent, n)
+    geometry = ["SRID=3857;POINT(" + c + ")"
+                for c in wkt_coordinates(x, y, np.ones(n, dtype=int))]
+    return list(zip(np.arange(1, n + 1), category_sample(rng, point_mix, n),
+                    geometry, x, y))
+
+
+def synthetic_tables(size, seed=0):
+    """Return the synthetic rows of all tables of a region of size ways."""
+    generators = {"planet_osm_line": synthetic_lines,
+                  "planet_osm_polygon": synthetic_polygons,
+                  "planet_osm_point": synthetic_points}
+    return {table: generators[table](max(int(size*share), 1), seed)
+            for table, share in table_share.items()}
+
+
+class FakeCursor:
+    """In-process stand-in of a psycopg2 cursor over synthetic tables.
+
+    The table is taken from the FROM clause of the query, the lanes column
+    is only returned if the query asks for it. Query parameters are ignored,
+    so only the queries without pushdown are supported.
+    """
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.itersize = 2000
+        self.rows = []
+        self.position = 0
+
+    def execute(self, sql, params=None):
+        table = re.search(r"FROM (planet_osm_\w+)", sql).group(1)
+        rows = self.tables[table]
+        if table == "planet_osm_line" and "'lanes'" not in sql:
+            rows = [row[:4] for row in rows]
+        self.rows = rows
+        self.position = 0
+
+    def fetchall(self):
+        rows = self.rows[self.position:]
+        self.position = len(self.rows)
+        return rows
+
+    def fetchmany(self, size):
+        rows = self.rows[self.position:self.position + size]
+        self.position += len(rows)
+        return rows
+
+    def close(self):
+        self.rows = []
+
+
+class FakeConnection:
+    """Stand-in of a psycopg2 connection, named cursors are plain cursors."""
+
+    def __init__(self, tables):
+        self.tables = tables
+
+    def cursor(self, name=None):
+        return FakeCursor(self.tables)
+
+
+def lines_frame(tables):
+    """Return the synthetic lines as a dataframe indexed by highway."""
+    return pd.DataFrame(tables["planet_osm_line"],
+                        columns=["osm_id", "highway", "length", "geometry",
+                                 "lanes"]).set_index("highway")
+
+
+def prepare_tables(size, seed):
+    """Return the synthetic rows of all tables."""
+    return synthetic_tables(size, seed)
+
+
+def run_get_highways(tables):
+    """Extract all tables with fetchall and write the csv files."""
+    from get_highways import GetLines, GetPolygons, GetPoints, destination
+    cur = FakeCursor(tables)
+    lines, squares, points = GetLines(), GetPolygons(), GetPoints()
+    lines.get_line_from_db(cur, None)
+    rows = lines.get_line_features(lines.data)
+    squares.get_polygons_from_db(cur, None)
+    rows += squares.get_polygons_features(squares.data)
+    points.get_point_from_db(cur, None)
+    rows += points.get_point_features(points.data)
+    return rows, [destination + t + ".csv" for t in table_share]
+
+
+def run_stream_highways(tables):
+    """Stream all tables in batches to the csv files."""
+    from get_highways import GetLines, GetPolygons, GetPoints, destination
+    conn = FakeConnection(tables)
+    rows = GetLines().stream_line_features(conn)
+    rows += GetPolygons().stream_polygons_features(conn)
+    rows += GetPoints().stream_point_features(conn)
+    return rows, [destination + t + ".csv" for t in table_share]
+
+
+def prepare_lines(size, seed):
+    """Return the synthetic lines as dataframe."""
+    return lines_frame({"planet_osm_line": synthetic_lines(size, seed)})
+
+
+def run_compute_area(dataset):
+    """Compute the area of the whitelisted lines."""
+    from get_highways import GetLines, compute_area
+    lines = GetLines()
+    width = dict(zip(lines.highway_feature, lines.width))
+    dataset = dataset.loc[dataset.index.isin(lines.highway_feature)]
+    return len(compute_area(dataset, width, lines.lane_width)), []
+
+
+def run_data_to_csv(dataset):
+    """Write the lines with EWKT geometries to csv."""
+    from highway_io import data_to_csv
+    name = "../data/benchmark/data_to_csv.csv"
+    data_to_csv(dataset, name)
+    return len(dataset), [name]
+
+
+def prepare_nothing(size, seed):
+    """Downstream stages read the outputs of get_highways."""
+    return None
+
+
+def run_street_light(fixture):
+    """Simulate the street light load of the extracted areas."""
+    from street_scenarios import simulateStreetLight
+    simulation = simulateStreetLight()
+    simulation.config()
+    simulation.get_standardLoad()
+    simulation.electricityUsageIndex()
+    simulation.simulateLoadAllRoad()
+    return len(simulation.osmData), [
+        simulation.output_path + "streetlight_load.csv"]
+
+
+def run_shapefile(fixture):
+    """Convert the extracted tables to shape files."""
+    from create_shapefile import csv_to_shapefile, shapeFile_dir
+    shapeFile_dir()
+    csv_to_shapefile()
+    return None, ["../data/02_urban_output_data/shape_files/"]
+
+
+def run_plot_highway(fixture):
+    """Plot points, lines and polygons like plot_highway.py."""
+    import matplotlib
+    matplotlib.use("Agg")
+    from geopandas import GeoDataFrame
+    from highway_io import read_highways
+    from plot_highway import plot_line_polygon, plot_point
+    folder = "../data/02_urban_output_data/"
+    destination = "../data/04_Visualisation/"
+    columns = ["highway", "geometry"]
+    df_line = read_highways(folder, "planet_osm_line", columns)
+    df_point = read_highways(folder, "planet_osm_point", columns)
+    df_polygon = read_highways(folder, "planet_osm_polygon", columns)
+    data = GeoDataFrame(pd.concat([df_line, df_polygon]),
+                        geometry="geometry", crs=df_line.crs)
+    style = ((0.0, 0.05, 0.01, 0.7), 15, (8, 5), "whitesmoke")
+    plot_point(df_point, destination, *style)
+    plot_line_polygon(data, destination, *style)
+    return len(df_line) + len(df_point) + len(df_polygon), [
+        destination + "points.png", destination + "roads.png"]
+
+
+# stage name: (untimed fixture preparation, timed stage), in run order, the
+# downstream stages read the outputs of get_highways
+stages = {"get_highways": (prepare_tables, run_get_highways),
+          "stream_highways": (prepare_tables, run_stream_highways),
+          "compute_area": (prepare_lines, run_compute_area),
+          "data_to_csv": (prepare_lines, run_data_to_csv),
+          "street_light": (prepare_nothing, run_street_light),
+          "shapefile": (prepare_nothing, run_shapefile),
+          "plot_highway": (prepare_nothing, run_plot_highway)}
+
+
+def run_stage(stage, size, seed, workdir, queue):
+    """Run one stage inside workdir/code and put its record on the queue."""
+    sys.path.insert(0, code_dir)
+    os.chdir(os.path.join(workdir, "code"))
+    prepare, run = stages[stage]
+    fixture = prepare(size, seed)
+    rss_before = peak_rss_mb()
+    start = time.time()
+    rows, outputs = run(fixture)
+    seconds = time.time() - start
+    queue.put({"stage": stage, "size": size, "seconds": seconds,
+               "peak_rss_mb": peak_rss_mb(), "fixture_rss_mb": rss_before,
+               "rows": rows, "output_bytes": output_bytes(outputs)})
+
+
+def make_workdir(workdir=None):
+    """Create the scratch layout code/, code/log/ and data/ of a run."""
+    workdir = workdir or tempfile.mkdtemp(prefix="flexigis_benchmark_")
+    for folder in ["code/log", "data/01_raw_input_data",
+                   "data/02_urban_output_data", "data/04_Visualisation",
+                   "data/benchmark"]:
+        os.makedirs(os.path.join(workdir, folder), exist_ok=True)
+    for name in ["SLP_hourly.csv", "highway_width.csv"]:
+        if os.path.exists(os.path.join(input_dir, name)):
+            shutil.copy(os.path.join(input_dir, name),
+                        os.path.join(workdir, "data/01_raw_input_data"))
+    return workdir
+
+
+def run_benchmark(sizes, stage_names, seed=0, workdir=None):
+    """Run the stages for every size, each stage in a fresh process."""
+    context = mp.get_context("spawn")
+    records = []
+    for size in sizes:
+        path = make_workdir(workdir)
+        try:
+            for stage in stage_names:
+                queue = context.Queue()
+                process = context.Process(target=run_stage, args=(
+                    stage, size, seed, path, queue))
+                process.start()
+                process.join()
+                if process.exitcode != 0:
+                    raise RuntimeError("stage {} failed for size {}".format(
+                        stage, size))
+                record = queue.get()
+                records.append(record)
+                print("INFO: {stage} {size}: {seconds:.2f} s, peak RSS "
+                      "{peak_rss_mb:.0f} MB, {output_bytes} bytes written"
+                      .format(**record))
+        finally:
+            if workdir is None:
+                shutil.rmtree(path, ignore_errors=True)
+    return records
+
+
+def compare_baseline(records, baseline, tolerance=0.25, min_seconds=0.5):
+    """Return the stages slower or larger than the baseline by tolerance.
+
+    Time differences below min_seconds are ignored as timer noise.
+    """
+    regressions = []
+    for record in records:
+        key = "{}@{}".format(record["stage"], record["size"])
+        if key not in baseline:
+            continue
+        base = baseline[key]
+        if record["seconds"] > base["seconds"] * (1 + tolerance) and \
+                record["seconds"] - base["seconds"] > min_seconds:
+            regressions.append("{}: {:.2f} s, baseline {:.2f} s".format(
+                key, record["seconds"], base["seconds"]))
+        if record["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+            regressions.append("{}: {:.0f} MB, baseline {:.0f} MB".format(
+                key, record["peak_rss_mb"], base["peak_rss_mb"]))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = optparse.OptionParser()
+    parser.add_option("-s", "--sizes", action="store", dest="sizes",
+                      default="10000,100000",
+                      help="comma separated numbers of ways")
+    parser.add_option("-t", "--stages", action="store", dest="stages",
+                      default=",".join(stages),
+                      help="comma separated stages to run")
+    parser.add_option("-b", "--baseline", action="store", dest="baseline",
+                      default=baseline_file, help="baseline json file")
+    parser.add_option("-u", "--update-baseline", action="store_true",
+                      dest="update", default=False,
+                      help="store this run as the new baseline")
+    parser.add_option("-r", "--tolerance", action="store", dest="tolerance",
+                      type="float", default=0.25,
+                      help="allowed relative regression of time and memory")
+    parser.add_option("-w", "--workdir", action="store", dest="workdir",
+                      default=None, help="keep the outputs and "
+                      "benchmark.json in this folder")
+    parser.add_option("--seed", action="store", dest="seed", type="int",
+                      default=0, help="seed of the synthetic data")
+    (options, args) = parser.parse_args()
+
+    sizes = [int(s) for s in options.sizes.split(",")]
+    stage_names = options.stages.split(",")
+    records = run_benchmark(sizes, stage_names, options.seed,
+                            options.workdir)
+    path = os.path.join(options.workdir, "benchmark.json") \
+        if options.workdir else result_file
+    with open(path, "w") as f:
+        json.dump(records, f, indent=1)
+    print("INFO: measurements written to {}".format(path))
+
+    if options.update:
+        baseline = {}
+        if os.path.exists(options.baseline):
+            with open(options.baseline) as f:
+                baseline = json.load(f)
+        baseline.update({"{}@{}".format(r["stage"], r["size"]):
+                         {"seconds": r["seconds"],
+                          "peak_rss_mb": r["peak_rss_mb"]} for r in records})
+        with open(options.baseline, "w") as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+        print("INFO: baseline written to {}".format(options.baseline))
+    elif os.path.exists(options.baseline):
+        with open(options.baseline) as f:
+            regressions = compare_baseline(records, json.load(f),
+                                           options.tolerance)
+        for regression in regressions:
+            print("ERROR: regression {}".format(regression))
+        if regressions:
+            sys.exit(1)
+        print("INFO: no regression against {}".format(options.baseline))
+    else:
+        print("INFO: no baseline {}, run with --update-baseline to store "
+              "one".format(options.baseline))
@@ -100,3 +100,172 @@ wind_data:= wind_data.csv
 pv_panel:= Advent_Solar_Ventura_210___2008_
 inverter_type:= ABB__MICRO_0_25_I_OUTD_US_208__208V_
 solar_data:= solar_data.csv
+# size limit of the feed-in cache (../data/feedin_cache/) in MB, wind and pv
+# series are only computed again when the weather data or the plant
+# parameters changed, 0 switches the cache off
+feedin_cache_mb:=512
+
+# 11. Highway abstraction (get_highways.py)
+#     Set extract_stream to 1 to stream the planet_osm_* tables through
+#     server-side cursors, extract_itersize rows per batch. Peak memory then
+#     stays flat regardless of the size of the extracted region.
+extract_stream:=0
+extract_itersize:=20000
+#     Set extract_pushdown to 1 to filter the highway categories and compute
+#     the line areas from the category widths inside the database, so only
+#     the wanted ways are transferred.
+extract_pushdown:=0
+#     Output format of the abstracted highway tables: csv (WKT geometries)
+#     or parquet (GeoParquet with WKB geometries and the CRS in the metadata,
+#     loaded column-wise by the downstream scripts).
+output_format:=csv
+#     Set extract_copy to 1 to bulk export the line, polygon and point tables
+#     concurrently with COPY TO STDOUT over extract_jobs connections.
+extract_copy:=0
+extract_jobs:=3
+
+# 12. Highway abstraction without database (get_highways_pbf.py)
+#     make abstract_data_pbf reads $(OSM_merged_data) directly instead of
+#     the osm2pgsql import, so export_data and the Postgres server are not
+#     needed. pbf_batch_size features are projected and written per batch,
+#     pbf_index is the osmium node location index (flex_mem keeps it in
+#     memory, sparse_file_array or dense_file_array for large regions).
+pbf_batch_size:=50000
+pbf_index:=flex_mem
+
+# 13. Benchmark (benchmark.py)
+#     Numbers of synthetic ways (comma separated) the stages are measured
+#     with, e.g. 10000,100000,1000000,10000000. make benchmark fails when a
+#     stage is slower or uses more memory than the stored baseline by more
+#     than benchmark_tolerance (0.25 = 25%).
+benchmark_sizes:=10000,100000
+benchmark_tolerance:=0.25
+
+# 14. Stage instrumentation (instrument.py)
+#     Every stage appends a json record (duration, peak memory, rows in/out,
+#     bytes written) to log/stages.jsonl, make report prints the summary of
+#     the last run. Set profile to 1 to dump the cProfile stats of every
+#     stage to log/profile/ (or pass --profile to a single script).
+profile:=0
+
+# 15. Multi-region batch (batch_regions.py)
+#     Regions as .poly files or ids (boundary ../data/01_raw_input_data/<id>.poly),
+#     separated by spaces, and/or a file with one region per line. Each
+#     region is cut from OSM_raw_data and processed by one of batch_jobs
+#     worker processes, the outputs are written to batch_output/<id>/.
+batch_regions:=
+batch_regions_file:=
+batch_jobs:=4
+batch_output:=../data/regions/
+
+# 16. Per-segment street light load (segment_load.py)
+#     The load of every osm_id is written in chunks of segment_chunk
+#     segments to 03_urban_energy_requirements/segment_load.zarr for the
+#     lighting mode segment_mode (Mode1, Mode2 or Mode3). Give a file of
+#     district polygons to aggregate by district, segment_aggregate is
+#     highway, district or table.
+segment_mode:=Mode3
+segment_chunk:=2000
+segment_districts:=
+segment_district_column:=name
+segment_aggregate:=highway
+
+# 17. Scenario sweep (scenario_sweep.py)
+#     All combinations of the electricity usage indices, the category to
+#     profile assignments (csv, one row per assignment and one column per
+#     highway category or squares with SB1, SB2 or off, empty for
+#     Mode1-Mode3) and the dimming factors. sweep_profiles writes the full
+#     profiles of the n variants with the highest peak.
+sweep_x_sl:=0.01,0.01464,0.02
+sweep_assignments:=
+sweep_dimming:=1.0,0.75,0.5
+sweep_profiles:=0
+
+# 18. Multi-location feed-in (feedin_locations.py)
+#     Wind and pv feed-in of every grid point of target_file (download it
+#     with region:=1), computed by feedin_jobs worker processes and written
+#     to ../data/01_raw_input_data/feedin_locations.csv (or .parquet with
+#     output_format:=parquet).
+feedin_jobs:=4
+
+# 19. Weather data store (weather_store.py)
+#     make weather_store converts target_file to a zarr store chunked by
+#     grid point (weather_point_chunk x weather_point_chunk points per
+#     chunk) for repeated point extraction. Set target_file to the store
+#     to use it in feedin_data_format and feedin_locations.
+weather_zarr:=../data/01_raw_input_data/ERA5_data.zarr
+weather_point_chunk:=1
+
+# 20. Feed-in portfolio (feedin_portfolio.py)
+#     csv file of plant configurations, one row per plant with the columns
+#     name, plant (wind or pv), turbine_name, hub_height, module_name,
+#     inverter_name, azimuth, tilt, albedo. The feed-in of all plants at
+#     the single location is written to
+#     ../data/01_raw_input_data/feedin_portfolio.csv.
+feedin_portfolio:=../data/01_raw_input_data/feedin_portfolio_plants.csv
+
+# 21. Typical period aggregation (aggregate_periods.py)
+#     make optimization_aggregated clusters the commodities into
+#     typical_periods periods of period_steps time steps (24 for days of
+#     hourly data) plus the peak demand and peak residual load periods,
+#     solves the reduced system and compares it with the full solve
+#     (aggregation_report.json, the full results in om_data_full). Set
+#     aggregate_full to 0 to skip the full solve.
+typical_periods:=12
+period_steps:=24
+aggregate_full:=1
+
+# 22. Optimization scenarios (optimize_batch.py)
+#     All combinations of the demand columns and the comma separated wind,
+#     pv and storage capacities are solved by scenario_jobs worker processes
+#     with scenario_threads cbc threads each, results in
+#     optimization-scenarios.csv. Set scenario_store to 1 to also write
+#     the results of every scenario to optimization-scenarios/ (parquet
+#     result store, result_store.py). scenario_backend highs solves the
+#     scenarios in process with HiGHS (optimize_lp.py) instead of oemof and
+#     cbc.
+scenario_demands:=demand_Mode1,demand_Mode2,demand_Mode3
+scenario_wind:=50000
+scenario_pv:=40000
+scenario_storage:=10077997
+scenario_jobs:=4
+scenario_threads:=1
+scenario_store:=0
+scenario_backend:=oemof
+
+# 23. Optimization sensitivity (optimize_persistent.py)
+#     make optimization_sensitivity builds the oemof model once and solves
+#     it again for the sensitivity_parameter capacity (wind, pv or storage)
+#     scaled by each of the comma separated sensitivity_factors, results in
+#     optimization-sensitivity.csv.
+sensitivity_parameter:=storage
+sensitivity_factors:=0.5,0.75,1,1.25,1.5
+sensitivity_demand:=demand_Mode3
+
+# 24. Optimization with HiGHS (optimize_lp.py)
+#     make optimization_lp solves the storage and supply dispatch of
+#     lp_demand as one sparse LP with the HiGHS solver of scipy.
+#     Set lp_check to 1 to also solve it with oemof and cbc and compare the
+#     objective and energy of every flow (optimization-lp-check.csv).
+lp_demand:=demand_Mode3
+lp_check:=0
+
+# 25. Optimization profile (optimize_profile.py)
+#     make optimization_profile solves the optimization for the first
+#     profile_horizons time steps (comma separated, 0 is the full time
+#     series) and reports the time and peak memory of every phase, the lp
+#     size and the parsed cbc log in om_data_<steps>_profile.json. All runs
+#     are appended to optimization_profiles.jsonl and printed by time steps.
+profile_horizons:=0
+
+# 26. Highway maps (plot_highway.py, raster_map.py)
+#     plot_renderer vector draws each geometry. Set it to raster to count
+#     the geometries of every highway category into a raster of plot_width
+#     pixels instead, so the maps scale with the pixels and not the
+#     features (needs pygeos). With tiles_max_zoom above 0 the roads are
+#     also written as web map tiles ../data/04_Visualisation/tiles/z/x/y.png
+#     from tiles_min_zoom to tiles_max_zoom (e.g. 10 to 16 for a city).
+plot_renderer:=vector
+plot_width:=2400
+tiles_max_zoom:=0
+tiles_min_zoom:=10
@@ -1,10 +1,9 @@
-"""Convert categorised csv file to shape file."""
-import pandas as pd
-from geopandas import GeoDataFrame
-from shapely import wkt
+"""Convert categorised csv or GeoParquet files to shape file."""
 import glob
 import os
 from pathlib import Path
+from highway_io import output_formats, read_highways
+from instrument import enable_profile, span
 
 
 def csv_to_shapefile():
@@ -12,25 +11,20 @@ def csv_to_shapefile():
     shape_file_dest = "../data/02_urban_output_data/shape_files/"
     folder = "../data/02_urban_output_data/"
 
-    # csv files
-    csv_files = glob.glob(folder + "*.csv")
-    for csv_file in csv_files:
-        base_name = os.path.basename(csv_file)
-        base_name = os.path.splitext(base_name)[0]
+    # csv or parquet files, each table is converted once
+    tables = set()
+    for ext in output_formats.values():
+        for data_file in glob.glob(folder + "*" + ext):
+            base_name = os.path.basename(data_file)
+            tables.add(os.path.splitext(base_name)[0])
+    for base_name in sorted(tables):
         print("Creating shape file for"+" "+str(base_name))
-        df = pd.read_csv(csv_file, index_col=False)
-
-        if "Unnamed: 0" in df:
-            df = df.drop(columns=["Unnamed: 0"])
-
-        df["geometry_shp"] = df["geometry"].apply(wkt.loads)
-        gdf = GeoDataFrame(df, geometry="geometry_shp")
-        gdf = gdf.drop(columns=["geometry"])
-        gdf.rename(columns={"geometry_shp": "geometry"})
-        # gdf.crs = {'init': 'epsg:4326'}
-        # gdf = gdf.to_crs({'init': 'epsg:3857'})
-        gdf.to_file(driver='ESRI Shapefile',
-                    filename=shape_file_dest+base_name)
+        with span("shapefile." + base_name) as s:
+            gdf = read_highways(folder, base_name)
+            gdf.to_file(driver='ESRI Shapefile',
+                        filename=shape_file_dest+base_name)
+            s.rows_in = s.rows_out = len(gdf)
+            s.add_output(shape_file_dest+base_name)
 
     print("INFO: Shape Files For OSM Categories Generated. See " + " " +
           shape_file_dest+" "+"for output files")
@@ -48,5 +42,6 @@ def shapeFile_dir():
 
 
 if __name__ == "__main__":
+    enable_profile()
     shapeFile_dir()
     csv_to_shapefile()
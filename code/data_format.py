@@ -1,31 +1,40 @@
 """Store Downloaded data as csv file in feedinlib format.
 
 This script is used to write the downloaded weather data to csv file in the format
-that Feedinlib understands.
+that Feedinlib understands. The netcdf file (or its zarr store, see weather_store.py)
+is opened once and both formats are produced from one read of the location.
 """
-from feedinlib import era5
 import sys
 import os
+from weather_store import open_era5, weather_frames
 
 weather_dir = "../data/01_raw_input_data/"
 
 
-def feedin_solarFormat(lon, lat, target_file, to_csv=False):
-    """Get weather data in pvlib format."""
-    pv_data = era5.weather_df_from_era5(era5_netcdf_filename=target_file,
-                                        lib="pvlib",
-                                        area=[lon, lat])
+def feedin_solarFormat(lon, lat, target_file, to_csv=False, pv_data=None):
+    """Get weather data in pvlib format.
+
+    pv_data: dataframe already in pvlib format, read from target_file if
+    None.
+    """
+    if pv_data is None:
+        with open_era5(target_file) as ds:
+            pv_data, _ = weather_frames(ds, lon, lat)
     print(pv_data.head(5))
 
     if to_csv:
         pv_data.to_csv(os.path.join(weather_dir, "solar_data.csv"))
 
 
-def feedin_windFormat(lon, lat, target_file, to_csv=False):
-    """Get weather data in windpowerlib format."""
-    wind_data = era5.weather_df_from_era5(era5_netcdf_filename=target_file,
-                                          lib="windpowerlib",
-                                          area=[lon, lat])
+def feedin_windFormat(lon, lat, target_file, to_csv=False, wind_data=None):
+    """Get weather data in windpowerlib format.
+
+    wind_data: dataframe already in windpowerlib format, read from
+    target_file if None.
+    """
+    if wind_data is None:
+        with open_era5(target_file) as ds:
+            _, wind_data = weather_frames(ds, lon, lat)
     print(wind_data.head(5))
 
     if to_csv:
@@ -36,5 +45,9 @@ if __name__ == "__main__":
     lon = float(sys.argv[1])
     lat = float(sys.argv[2])
     target_file = sys.argv[3]
-    feedin_solarFormat(lon, lat, target_file, to_csv=True)
-    feedin_windFormat(lon, lat, target_file, to_csv=True)
+    # one read of the location for both formats
+    with open_era5(target_file) as ds:
+        pv_data, wind_data = weather_frames(ds, lon, lat)
+    feedin_solarFormat(lon, lat, target_file, to_csv=True, pv_data=pv_data)
+    feedin_windFormat(lon, lat, target_file, to_csv=True,
+                      wind_data=wind_data)
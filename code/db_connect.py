@@ -3,13 +3,14 @@ import os
 import sys
 import optparse
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
 
 
-def dbconn_from_args(argv=sys.argv[1:], environ=os.environ):
-    """Get database connection from command-line arguments.
+def db_option_parser():
+    """Return the option parser of the database connection arguments.
 
-    or environment variables. Reuse environment variables from libpq/psql
-    (see http://www.postgresql.org/docs/9.1/static/libpq-envars.html)
+    Scripts with options of their own add them to this parser and pass it
+    to dbconn_from_args.
     """
     parser = optparse.OptionParser()
     parser.add_option("-D", "--dbname", action="store", dest="dbname",
@@ -22,6 +23,20 @@ def dbconn_from_args(argv=sys.argv[1:], environ=os.environ):
                       help="database user name of the topology network")
     parser.add_option("-X", "--dbpwrd", action="store", dest="dbpwrd",
                       help="database user password of the topology network")
+    return parser
+
+
+def dbconn_from_args(argv=sys.argv[1:], environ=os.environ, parser=None,
+                     maxconn=None):
+    """Get database connection from command-line arguments.
+
+    or environment variables. Reuse environment variables from libpq/psql
+    (see http://www.postgresql.org/docs/9.1/static/libpq-envars.html)
+    With maxconn a thread-safe pool of up to maxconn connections is returned
+    instead of a single connection.
+    """
+    if parser is None:
+        parser = db_option_parser()
 
     (options, args) = parser.parse_args(argv)
     # Options have precedence over environment variables, which have
@@ -43,6 +58,10 @@ def dbconn_from_args(argv=sys.argv[1:], environ=os.environ):
     dbname = options.dbname
 
     try:
+        if maxconn:
+            return ThreadedConnectionPool(1, maxconn, host=dbhost,
+                                          port=dbport, user=dbuser,
+                                          password=dbpwrd, database=dbname)
         return psycopg2.connect(host=dbhost, port=dbport, user=dbuser,
                                 password=dbpwrd, database=dbname)
     except psycopg2.Error as e:
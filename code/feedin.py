@@ -23,6 +23,10 @@ solar_data:= solar_data.csv : Weather data in csv. It important (if not generate
 see link below for example
 https://github.com/oemof/feedinlib/blob/dev/example/simple_feedin.py
 
+feedin_cache_mb:= 512 : Size limit of the feed-in cache. The wind and pv series are cached
+under the hash of the weather data and plant parameters and only computed again when one of
+them changed (0 switches the cache off).
+
 Note: if the weather data is dowloaded using "make weather_data", the wind and solar data csv
 files generated are already set to feedinlib format, hence no further work is needed to be done
 before using them for feedin calculations.
@@ -30,16 +34,20 @@ before using them for feedin calculations.
 see https://github.com/oemof/feedinlib/tree/dev/example for an example implementation of feedinlib.
 """
 from feedinlib import Photovoltaic, WindPowerPlant
-import pandas as pd
 from numpy import isnan
 import sys
 import os
+from feedin_cache import cache_mb, cached_feedin
+from instrument import enable_profile, span
+from timeseries_store import read_timeseries
 
 weather_dir = "../data/01_raw_input_data/"
+# orientation of the pv system
+pv_orientation = {'azimuth': 180, 'tilt': 30, 'albedo': 0.2}
 
 
-def windpower_timeseries(wind_data, turbine_name, hub_height, scale=True):
-    """Generate windpower feedin time-series."""
+def wind_plant(turbine_name, hub_height):
+    """Return the wind power plant, the power curve is looked up once."""
     # The available in turbine types and specification can found in the oemof database.
     # "https://github.com/wind-python/windpowerlib/blob/dev/windpowerlib/oedb/turbine_data.csv"
 
@@ -47,7 +55,19 @@ def windpower_timeseries(wind_data, turbine_name, hub_height, scale=True):
         'turbine_type': turbine_name,
         'hub_height': hub_height
     }
-    wind_turbine = WindPowerPlant(**turbine_spec)
+    return WindPowerPlant(**turbine_spec)
+
+
+def windpower_timeseries(wind_data, turbine_name, hub_height, scale=True,
+                         plant=None):
+    """Generate windpower feedin time-series.
+
+    plant: WindPowerPlant of wind_plant, built from turbine_name and
+    hub_height if None.
+    """
+    wind_turbine = plant
+    if wind_turbine is None:
+        wind_turbine = wind_plant(turbine_name, hub_height)
     if scale:
 
         feedin_wind = wind_turbine.feedin(
@@ -58,17 +78,27 @@ def windpower_timeseries(wind_data, turbine_name, hub_height, scale=True):
     return feedin_wind
 
 
-def pv_timeseries(lon, lat, solar_data, pv_panel, inverter_type, scale=True):
-    """Generate PV power feedin timeseries."""
+def pv_plant(pv_panel, inverter_type):
+    """Return the pv system, the module and inverter data is read once."""
     # pv system parameters
     system_data = {
         'module_name': pv_panel,
         'inverter_name': inverter_type,
-        'azimuth': 180,
-        'tilt': 30,
-        'albedo': 0.2
     }
-    pv_system = Photovoltaic(**system_data)
+    system_data.update(pv_orientation)
+    return Photovoltaic(**system_data)
+
+
+def pv_timeseries(lon, lat, solar_data, pv_panel, inverter_type, scale=True,
+                  plant=None):
+    """Generate PV power feedin timeseries.
+
+    plant: Photovoltaic of pv_plant, built from pv_panel and inverter_type
+    if None.
+    """
+    pv_system = plant
+    if pv_system is None:
+        pv_system = pv_plant(pv_panel, inverter_type)
     if scale:
 
         feedin_pv = pv_system.feedin(weather=solar_data,
@@ -83,7 +113,24 @@ def pv_timeseries(lon, lat, solar_data, pv_panel, inverter_type, scale=True):
     return feedin_pv
 
 
+def wind_params(turbine_name, hub_height, scale=True):
+    """Return the parameters of a wind feed-in for the feed-in cache."""
+    return {"plant": "wind", "turbine_name": turbine_name,
+            "hub_height": hub_height,
+            "scaling": "nominal_power" if scale else None}
+
+
+def pv_params(lon, lat, pv_panel, inverter_type, scale=True):
+    """Return the parameters of a pv feed-in for the feed-in cache."""
+    params = {"plant": "pv", "module_name": pv_panel,
+              "inverter_name": inverter_type, "location": [lat, lon],
+              "scaling": "peak_power" if scale else None}
+    params.update(pv_orientation)
+    return params
+
+
 if __name__ == "__main__":
+    enable_profile()
 
     lon = float(sys.argv[1])
     lat = float(sys.argv[2])
@@ -93,26 +140,37 @@ if __name__ == "__main__":
     pv_panel = sys.argv[6]
     inverter_type = sys.argv[7]
     hub_height = int(sys.argv[8])
+    # size limit of the feed-in cache in MB, 0 switches it off
+    max_mb = float(sys.argv[9]) if len(sys.argv) > 9 else cache_mb
 
-    solar_data = pd.read_csv(os.path.join(weather_dir, "solar_data.csv"),
-                             index_col=0, date_parser=lambda idx:
-                             pd.to_datetime(idx, utc=True))
+    solar_data = read_timeseries(os.path.join(weather_dir, "solar_data.csv"),
+                                 utc=True)
     # read multi-index wind data
-    wind_data = pd.read_csv(os.path.join(weather_dir, "wind_data.csv"), index_col=[
-                            0], header=[0, 1], date_parser=lambda idx:
-                            pd.to_datetime(idx, utc=True))
+    wind_data = read_timeseries(os.path.join(weather_dir, "wind_data.csv"),
+                                header=[0, 1], utc=True)
     # convert multi-index data frame columns levels to integer
     wind_data.columns = wind_data.columns.set_levels(
         wind_data.columns.levels[1].astype(int), level=1)
 
-    windpower = windpower_timeseries(
-        wind_data, turbine_name, hub_height, scale=True)
-    pvpower = pv_timeseries(lon, lat, solar_data,
-                            pv_panel, inverter_type, scale=True)
-
-    windpower = windpower.to_frame().rename(
-        columns={"feedin_power_plant": "wind"})
-    windpower.to_csv(os.path.join(weather_dir, "wind_power.csv"))
-
-    pvpower = pvpower.to_frame().rename(columns={0: "pv"})
-    pvpower.to_csv(os.path.join(weather_dir, "pv_power.csv"))
+    with span("feedin.wind", rows_in=len(wind_data)) as s:
+        windpower = cached_feedin(
+            wind_data, wind_params(turbine_name, hub_height),
+            lambda: windpower_timeseries(wind_data, turbine_name,
+                                         hub_height, scale=True),
+            max_mb)
+        windpower = windpower.to_frame().rename(
+            columns={"feedin_power_plant": "wind"})
+        windpower.to_csv(os.path.join(weather_dir, "wind_power.csv"))
+        s.rows_out = len(windpower)
+        s.add_output(os.path.join(weather_dir, "wind_power.csv"))
+
+    with span("feedin.pv", rows_in=len(solar_data)) as s:
+        pvpower = cached_feedin(
+            solar_data, pv_params(lon, lat, pv_panel, inverter_type),
+            lambda: pv_timeseries(lon, lat, solar_data, pv_panel,
+                                  inverter_type, scale=True),
+            max_mb)
+        pvpower = pvpower.to_frame().rename(columns={0: "pv"})
+        pvpower.to_csv(os.path.join(weather_dir, "pv_power.csv"))
+        s.rows_out = len(pvpower)
+        s.add_output(os.path.join(weather_dir, "pv_power.csv"))
@@ -0,0 +1,102 @@
+"""Content-addressed cache of the wind and PV feed-in series.
+
+A feed-in series is stored under the hash of its weather data (index,
+columns and values) and the plant parameters (plant type, hub height,
+module, inverter, azimuth, tilt, albedo, location and scaling), so
+repeated runs and parameter sweeps compute only the combinations that are
+not cached yet. The series are stored like the time series inputs (see
+timeseries_store.py) in ../data/feedin_cache/<key>/. When the cache grows
+beyond its size limit, the least recently used series are removed.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import numpy as np
+from timeseries_store import load_frame, store_frame
+
+cache_dir = "../data/feedin_cache/"
+cache_mb = 512
+
+
+def weather_hash(weather):
+    """Return the sha1 of the index, columns and values of weather data."""
+    sha = hashlib.sha1(json.dumps([str(c) for c in weather.columns])
+                       .encode("utf-8"))
+    index = weather.index
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    sha.update(index.values.astype("datetime64[ns]").view(np.int64)
+               .tobytes())
+    sha.update(np.ascontiguousarray(weather.values, dtype=np.float64)
+               .tobytes())
+    return sha.hexdigest()
+
+
+def feedin_key(weather, params):
+    """Return the cache key of the feed-in of a plant for weather data.
+
+    params: dictionary of the plant parameters, values must be json
+    serializable.
+    """
+    sha = hashlib.sha1(weather_hash(weather).encode("utf-8"))
+    sha.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return sha.hexdigest()
+
+
+def folder_bytes(folder):
+    """Return the size of the files of a cache entry."""
+    return sum(os.path.getsize(os.path.join(folder, f))
+               for f in os.listdir(folder))
+
+
+def evict(max_mb=cache_mb):
+    """Remove the least recently used entries beyond max_mb."""
+    if not os.path.isdir(cache_dir):
+        return 0
+    entries = []
+    for key in os.listdir(cache_dir):
+        folder = os.path.join(cache_dir, key)
+        if os.path.exists(os.path.join(folder, "meta.json")):
+            entries.append((os.path.getmtime(folder), folder_bytes(folder),
+                            folder))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, folder in sorted(entries):
+        if total <= max_mb * 1024 * 1024:
+            break
+        shutil.rmtree(folder, ignore_errors=True)
+        total -= size
+        removed += 1
+    if removed:
+        logging.info("{} feed-in series removed from {}.".format(removed,
+                                                                cache_dir))
+    return removed
+
+
+def cached_feedin(weather, params, compute, max_mb=cache_mb):
+    """Return the cached feed-in series or compute and store it.
+
+    weather: dataframe, weather data the feed-in is computed from.
+    params: dictionary of the plant parameters.
+    compute: function without arguments returning the feed-in series.
+    max_mb: float, size limit of the cache, 0 switches the cache off.
+    """
+    if not max_mb:
+        return compute()
+    folder = os.path.join(cache_dir, feedin_key(weather, params))
+    if os.path.exists(os.path.join(folder, "meta.json")):
+        try:
+            # the modification time orders the entries for the eviction
+            os.utime(folder)
+            return load_frame(folder).iloc[:, 0]
+        except FileNotFoundError:
+            # evicted by another process in the meantime, a cache miss
+            logging.info("feed-in series {} evicted while read.".format(
+                folder))
+    feedin = compute()
+    os.makedirs(cache_dir, exist_ok=True)
+    store_frame(feedin.to_frame(), folder)
+    evict(max_mb)
+    return feedin
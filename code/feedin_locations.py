@@ -0,0 +1,138 @@
+"""Wind and PV feed-in of every grid point of an ERA5 file in parallel.
+
+The weather data of the ERA5 netcdf file (make weather_data with region=1)
+or of its zarr store (make weather_store) is brought to feedinlib format
+for all grid points in one read (weather_store.py) and split by
+location. Worker processes compute the wind and PV feed-in of the
+locations, the wind turbine power curve and the PV module and inverter
+database lookups are done once per worker by its initializer. The result
+is one table with the columns latitude, longitude, wind and pv per time
+step, written to ../data/01_raw_input_data/feedin_locations.csv (or
+.parquet).
+"""
+import logging
+import optparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from feedin import (pv_params, pv_plant, pv_timeseries, weather_dir,
+                    wind_params, wind_plant, windpower_timeseries)
+from feedin_cache import cache_mb, cached_feedin
+from instrument import enable_profile, span
+from weather_store import open_era5, weather_frames
+
+# wind and pv plant of a worker process, set by init_plants
+plants = {}
+
+
+def init_plants(turbine_name, hub_height, pv_panel, inverter_type,
+                max_mb=cache_mb):
+    """Initialize a worker with the plants used for all its locations."""
+    plants["wind"] = wind_plant(turbine_name, hub_height)
+    plants["pv"] = pv_plant(pv_panel, inverter_type)
+    plants["parameters"] = (turbine_name, hub_height, pv_panel,
+                            inverter_type)
+    plants["max_mb"] = max_mb
+
+
+def location_weather(target_file):
+    """Return the wind and solar weather data of every grid point.
+
+    target_file: ERA5 netcdf file or its zarr store, read in one pass.
+    returns: list of (latitude, longitude), wind data and solar data in
+    feedinlib format indexed by UTC time.
+    """
+    with open_era5(target_file) as ds:
+        solar_data, wind_data = weather_frames(ds)
+    solar = dict(iter(solar_data.groupby(level=["latitude", "longitude"])))
+    locations = []
+    for location, wind in wind_data.groupby(level=["latitude", "longitude"]):
+        frames = []
+        for frame in [wind, solar[location]]:
+            frame = frame.droplevel(["latitude", "longitude"])
+            if frame.index.tz is None:
+                frame.index = frame.index.tz_localize("UTC")
+            frames.append(frame)
+        locations.append((location, frames[0], frames[1]))
+    return locations
+
+
+def location_feedin(location, wind_data, solar_data, scale=True):
+    """Return the wind and pv feed-in of one location.
+
+    Runs in a worker process initialized by init_plants, cached series are
+    taken from the feed-in cache.
+    """
+    lat, lon = location
+    turbine_name, hub_height, pv_panel, inverter_type = plants["parameters"]
+    wind = cached_feedin(
+        wind_data, wind_params(turbine_name, hub_height, scale),
+        lambda: windpower_timeseries(wind_data, None, None, scale,
+                                     plant=plants["wind"]),
+        plants["max_mb"])
+    pv = cached_feedin(
+        solar_data, pv_params(lon, lat, pv_panel, inverter_type, scale),
+        lambda: pv_timeseries(lon, lat, solar_data, None, None, scale,
+                              plant=plants["pv"]),
+        plants["max_mb"])
+    return pd.DataFrame({"latitude": lat, "longitude": lon,
+                         "wind": wind.values, "pv": pv.values},
+                        index=pd.DatetimeIndex(wind.index, name="time"))
+
+
+def locations_feedin(target_file, turbine_name, hub_height, pv_panel,
+                     inverter_type, jobs=4, scale=True, max_mb=cache_mb):
+    """Compute the feed-in of all grid points of target_file.
+
+    returns: dataframe (locations x time) of the wind and pv feed-in.
+    """
+    locations = location_weather(target_file)
+    logging.info("feed-in of {} locations on {} workers.".format(
+        len(locations), jobs))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_plants,
+                             initargs=(turbine_name, hub_height, pv_panel,
+                                       inverter_type, max_mb)) as executor:
+        futures = [executor.submit(location_feedin, location, wind_data,
+                                   solar_data, scale)
+                   for location, wind_data, solar_data in locations]
+        results = [future.result() for future in futures]
+    return pd.concat(results)
+
+
+def write_feedin(feedin, output_format="csv", destination=weather_dir):
+    """Write the feed-in of all locations as csv or parquet."""
+    path = os.path.join(destination, "feedin_locations." + output_format)
+    if output_format == "parquet":
+        feedin.to_parquet(path)
+    else:
+        feedin.to_csv(path)
+    return path
+
+
+if __name__ == "__main__":
+    enable_profile()
+    parser = optparse.OptionParser(
+        usage="%prog [options] target_file turbine_name hub_height "
+        "pv_panel inverter_type")
+    parser.add_option("-J", "--jobs", action="store", dest="jobs",
+                      type="int", default=4, help="worker processes")
+    parser.add_option("-F", "--format", action="store", dest="output_format",
+                      type="choice", choices=["csv", "parquet"],
+                      default="csv", help="output format, csv or parquet")
+    parser.add_option("-C", "--cache-mb", action="store", dest="cache_mb",
+                      type="float", default=cache_mb,
+                      help="size limit of the feed-in cache, 0 is off")
+    (options, args) = parser.parse_args()
+    if len(args) != 5:
+        parser.error("expected 5 arguments, got {}".format(len(args)))
+    target_file, turbine_name, hub_height, pv_panel, inverter_type = args
+
+    with span("feedin.locations") as s:
+        feedin = locations_feedin(target_file, turbine_name, int(hub_height),
+                                  pv_panel, inverter_type, options.jobs,
+                                  max_mb=options.cache_mb)
+        path = write_feedin(feedin, options.output_format)
+        s.rows_out = len(feedin)
+        s.add_output(path)
+    print("INFO: feed-in of {} locations written to {}".format(
+        len(feedin.groupby(["latitude", "longitude"])), path))
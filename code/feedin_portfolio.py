@@ -0,0 +1,203 @@
+"""Feed-in of a portfolio of wind turbine and PV configurations.
+
+The configurations are given as a table with one row per plant:
+
+    name, plant (wind or pv), turbine_name, hub_height, module_name,
+    inverter_name, azimuth, tilt, albedo
+
+The weather dependent quantities are computed once for all plants: the
+wind speed at every hub height of the portfolio (logarithmic profile from
+the closest data height, like the windpowerlib model chain) and the solar
+position, airmass, extraterrestrial and direct normal irradiance. The
+plants are then evaluated as arrays (configurations x time): one power
+curve interpolation per turbine type and one irradiance transposition,
+SAPM module and Sandia inverter model per module and inverter type over
+all orientations. The feed-in is scaled like feedin.py, to the nominal
+power of the turbine and to the peak power of the module.
+"""
+import functools
+import optparse
+import os
+import numpy as np
+import pandas as pd
+import pvlib
+from windpowerlib import WindTurbine
+from feedin import pv_orientation, weather_dir
+from instrument import enable_profile, span
+from timeseries_store import read_timeseries
+
+temperature_model = pvlib.temperature.TEMPERATURE_MODEL_PARAMETERS[
+    "sapm"]["open_rack_glass_glass"]
+
+
+@functools.lru_cache(maxsize=None)
+def turbine_data(turbine_name):
+    """Return power curve wind speeds, values and nominal power of a type.
+
+    The turbine library is read once per type.
+    """
+    turbine = WindTurbine(turbine_type=turbine_name, hub_height=100)
+    curve = turbine.power_curve
+    return (curve["wind_speed"].values.astype(float),
+            curve["value"].values.astype(float), float(turbine.nominal_power))
+
+
+@functools.lru_cache(maxsize=None)
+def sam_library(name):
+    """Return a SAM module or inverter library, read once per process."""
+    return pvlib.pvsystem.retrieve_sam(name)
+
+
+def hub_wind_speed(wind_data, hub_heights):
+    """Return the wind speed (heights x time) at the hub heights.
+
+    wind_data: dataframe in windpowerlib format.
+    hub_heights: array of hub heights in m.
+    """
+    speeds = wind_data["wind_speed"]
+    heights = np.asarray(speeds.columns, dtype=float)
+    hub_heights = np.asarray(hub_heights, dtype=float)
+    closest = np.abs(heights[None, :] - hub_heights[:, None]).argmin(axis=1)
+    roughness = wind_data["roughness_length"].iloc[:, 0].values
+    profile = np.log(hub_heights[:, None] / roughness) / \
+        np.log(heights[closest][:, None] / roughness)
+    return speeds.values.T[closest] * profile
+
+
+def wind_portfolio(configs, wind_data, scale=True):
+    """Return the wind feed-in (configurations x time) of turbines.
+
+    configs: dataframe with the columns turbine_name and hub_height.
+    """
+    hub_heights, height_row = np.unique(configs["hub_height"].values
+                                        .astype(float), return_inverse=True)
+    speed = hub_wind_speed(wind_data, hub_heights)
+    feedin = np.empty((len(configs), len(wind_data)))
+    for turbine_name, rows in configs.groupby("turbine_name").indices.items():
+        wind_speeds, values, nominal_power = turbine_data(turbine_name)
+        feedin[rows] = np.interp(speed[height_row[rows]], wind_speeds,
+                                 values, left=0, right=0)
+        if scale:
+            feedin[rows] /= nominal_power
+    return feedin
+
+
+def solar_geometry(solar_data, lon, lat):
+    """Return the solar position and irradiance shared by all pv systems.
+
+    solar_data: dataframe in pvlib format (ghi, dhi, temp_air, wind_speed).
+    """
+    times = solar_data.index
+    position = pvlib.solarposition.get_solarposition(times, lat, lon)
+    airmass = pvlib.atmosphere.get_relative_airmass(
+        position["apparent_zenith"].values)
+    # direct normal irradiance limited by the clear sky value, like the
+    # irradiance completion of the pvlib model chain
+    clearsky = pvlib.location.Location(lat, lon).get_clearsky(
+        times, solar_position=position)
+    dni = pvlib.irradiance.dni(solar_data["ghi"], solar_data["dhi"],
+                               position["zenith"], clearsky["dni"]).fillna(0)
+    return {"zenith": position["apparent_zenith"].values,
+            "azimuth": position["azimuth"].values,
+            "airmass": airmass,
+            "airmass_absolute": pvlib.atmosphere.get_absolute_airmass(
+                airmass),
+            "dni_extra": pvlib.irradiance.get_extra_radiation(times).values,
+            "dni": dni.values, "ghi": solar_data["ghi"].values,
+            "dhi": solar_data["dhi"].values,
+            "temp_air": solar_data["temp_air"].values,
+            "wind_speed": solar_data["wind_speed"].values}
+
+
+def pv_portfolio(configs, solar_data, lon, lat, scale=True):
+    """Return the pv feed-in (configurations x time) of pv systems.
+
+    configs: dataframe with the columns module_name, inverter_name,
+    azimuth, tilt and albedo.
+    """
+    sun = solar_geometry(solar_data, lon, lat)
+    modules = sam_library("sandiamod")
+    inverters = sam_library("cecinverter")
+    feedin = np.empty((len(configs), len(solar_data)))
+    groups = configs.groupby(["module_name", "inverter_name"]).indices
+    for (module_name, inverter_name), rows in groups.items():
+        module = modules[module_name]
+        inverter = inverters[inverter_name]
+        # one column per orientation, broadcast against the time steps
+        tilt = configs["tilt"].values[rows, None].astype(float)
+        azimuth = configs["azimuth"].values[rows, None].astype(float)
+        albedo = configs["albedo"].values[rows, None].astype(float)
+        aoi = pvlib.irradiance.aoi(tilt, azimuth, sun["zenith"],
+                                   sun["azimuth"])
+        poa = pvlib.irradiance.get_total_irradiance(
+            tilt, azimuth, sun["zenith"], sun["azimuth"], sun["dni"],
+            sun["ghi"], sun["dhi"], dni_extra=sun["dni_extra"],
+            airmass=sun["airmass"], albedo=albedo, model="haydavies")
+        effective = pvlib.pvsystem.sapm_effective_irradiance(
+            poa["poa_direct"], poa["poa_diffuse"], sun["airmass_absolute"],
+            aoi, module)
+        temp_cell = pvlib.temperature.sapm_cell(
+            poa["poa_global"], sun["temp_air"], sun["wind_speed"],
+            **temperature_model)
+        dc = pvlib.pvsystem.sapm(effective, temp_cell, module)
+        ac = np.asarray(pvlib.inverter.sandia(dc["v_mp"], dc["p_mp"],
+                                              inverter), dtype=float)
+        if scale:
+            ac = ac / (module["Impo"] * module["Vmpo"])
+        feedin[rows] = ac
+    feedin[np.isnan(feedin)] = 0
+    feedin[feedin < 0] = 0
+    return feedin
+
+
+def read_portfolio(path):
+    """Read the plant configurations, missing orientations take feedin.py's."""
+    configs = pd.read_csv(path, index_col="name")
+    for column, value in pv_orientation.items():
+        if column not in configs:
+            configs[column] = value
+        configs[column] = configs[column].fillna(value)
+    return configs
+
+
+def portfolio_feedin(configs, wind_data, solar_data, lon, lat, scale=True):
+    """Return the feed-in (configurations x time) of all plants.
+
+    configs: dataframe indexed by plant name, see read_portfolio.
+    """
+    feedin = np.zeros((len(configs), len(wind_data)))
+    wind = (configs["plant"] == "wind").values
+    pv = (configs["plant"] == "pv").values
+    if wind.any():
+        feedin[wind] = wind_portfolio(configs[wind], wind_data, scale)
+    if pv.any():
+        feedin[pv] = pv_portfolio(configs[pv], solar_data, lon, lat, scale)
+    return pd.DataFrame(feedin, index=configs.index,
+                        columns=pd.DatetimeIndex(wind_data.index,
+                                                 name="time"))
+
+
+if __name__ == "__main__":
+    enable_profile()
+    parser = optparse.OptionParser(usage="%prog [options] lon lat portfolio")
+    (options, args) = parser.parse_args()
+    if len(args) != 3:
+        parser.error("expected lon, lat and the portfolio file")
+    lon, lat = float(args[0]), float(args[1])
+    configs = read_portfolio(args[2])
+
+    solar_data = read_timeseries(os.path.join(weather_dir, "solar_data.csv"),
+                                 utc=True)
+    wind_data = read_timeseries(os.path.join(weather_dir, "wind_data.csv"),
+                                header=[0, 1], utc=True)
+    wind_data.columns = wind_data.columns.set_levels(
+        wind_data.columns.levels[1].astype(int), level=1)
+
+    with span("feedin.portfolio", rows_in=len(configs)) as s:
+        feedin = portfolio_feedin(configs, wind_data, solar_data, lon, lat)
+        path = os.path.join(weather_dir, "feedin_portfolio.csv")
+        feedin.T.to_csv(path)
+        s.rows_out = len(feedin)
+        s.add_output(path)
+    print("INFO: feed-in of {} plants written to {}".format(len(feedin),
+                                                           path))
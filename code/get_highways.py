@@ -1,11 +1,16 @@
 """Get Highway data from lines, polygons and points table in database.
 
-and returns csv files for each.
+and returns csv (or GeoParquet) files for each.
 """
 import pandas as pd
-from db_connect import dbconn_from_args
+from db_connect import db_option_parser, dbconn_from_args
+from highway_io import table_path, table_writer, write_table
+from instrument import enable_profile, span
 import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import numpy as np
 
@@ -26,37 +31,194 @@ else:
                  format("02_urban_output_datas"))
 
 
-def compute_area(dataset, width):
+# width in meters of the highway categories (lines), used if the width
+# catalog file is missing
+default_width = {'living_street': 7.5, 'motorway': 15.5, 'pedestrian': 7.5,
+                 'primary': 10.5, 'secondary': 9.5, 'service': 7.5,
+                 'tertiary': 9.5, 'trunk': 9.5, 'motorway_link': 6.5,
+                 'primary_link': 6.5, 'secondary_link': 6.5,
+                 'tertiary_link': 6.5, 'trunk_link': 6.5}
+width_catalog_file = "../data/01_raw_input_data/highway_width.csv"
+
+
+def load_width_catalog(path=width_catalog_file):
+    """Load the road width catalog and return a dataframe object.
+
+    The catalog has the columns highway, lanes and width (meters). Rows with
+    an empty lanes value hold the default width of a category, rows with a
+    lanes value override it for ways with that number of lanes.
+    """
+    if not Path(path).exists():
+        logging.info("no width catalog {}, using default widths.".format(
+            path))
+        return pd.DataFrame({"highway": list(default_width),
+                             "lanes": np.nan,
+                             "width": list(default_width.values())})
+    return pd.read_csv(path, dtype={"highway": str, "lanes": str,
+                                    "width": float})
+
+
+def compact_dtypes(dataset):
+    """Store highway as categorical, osm_id as int64 and lengths/areas as
+    float32 to cut the memory footprint of large extractions."""
+    dataset["highway"] = dataset["highway"].astype("category")
+    dataset["osm_id"] = dataset["osm_id"].astype("int64")
+    for column in ["length", "area"]:
+        if column in dataset:
+            dataset[column] = dataset[column].astype("float32")
+    return dataset
+
+
+def compute_area(dataset, width, lane_width=None):
     """Compute area for each line feature and return a dataframe object.
 
-    dataset: Dataframe object
+    dataset: Dataframe object, indexed by highway category.
     width: Dictionary, unique highway category as key and the width in meters
     as value.
+    lane_width: Dictionary, (highway category, lanes) as key and the width in
+    meters as value, overrides width for ways with a lanes column.
 
     """
-    #Area = []
-    dataset['area'] = np.nan
-    for key, value in width.items():
-        #area = dataset.loc[key]["length"]*value
-        dataset.loc[key, 'area'] = dataset.loc[key]["length"]*value
-        #Area.append(area)
-    #Area = pd.concat(Area)
-    #dataset["area"] = Area.values
-    dataset_new = dataset.reset_index()
-    return dataset_new
-
-
-def data_to_csv(dataset, name="name"):
-    """Write data to csv file.
-
-    dataset: dataframe object
-    name: str object, name of the output csv file (the table name).
+    dataset = dataset.reset_index()
+    highway = dataset["highway"].astype("category")
+    # one width per category, looked up for all ways at once by their code
+    category_width = pd.Series(width, dtype="float32").reindex(
+        highway.cat.categories).values
+    widths = category_width[highway.cat.codes.values]
+    if lane_width and "lanes" in dataset:
+        keys = pd.MultiIndex.from_arrays([dataset["highway"].astype(str),
+                                          dataset["lanes"].astype(str)])
+        lanes = pd.Series(lane_width, dtype="float32").reindex(keys).values
+        widths = np.where(np.isnan(lanes), widths, lanes)
+    dataset["highway"] = highway
+    dataset["area"] = dataset["length"].values.astype("float32") * widths
+    return dataset
+
+
+def geometry_sql(way="way", wkb=False):
+    """Return the sql expression of the geometry in EPSG:3857.
+
+    way: str object, the geometry column.
+    wkb: bool, binary WKB instead of EWKT text.
     """
-    dataset_new = dataset["geometry"].str.split(";", n=1, expand=True)
-    dataset["polygon"] = dataset_new[1]
-    dataset = dataset.drop(columns=["geometry"])
-    dataset = dataset.rename(columns={"polygon": "geometry"})
-    dataset.to_csv(name, encoding="utf-8")
+    if wkb:
+        return "ST_AsBinary(ST_Transform({}, 3857))".format(way)
+    return "ST_ASEWKT(ST_Transform({}, 3857))".format(way)
+
+
+def stream_to_file(conn, sql, params, columns, features, writer,
+                   itersize=20000):
+    """Stream a query through a server-side cursor into a table writer.
+
+    Only itersize rows are held in memory at a time, so the peak memory does
+    not depend on the size of the planet_osm_* tables.
+
+    conn: database connection
+    sql: str object, query of the highway table.
+    params: sequence of query parameters or None.
+    columns: list, column names of the query result.
+    features: callable, filters a batch and returns it ready to be written.
+    writer: table writer of the output file (see highway_io.table_writer).
+    itersize: int, number of rows fetched from the server per batch.
+    """
+    # a named cursor keeps the result set on the server side
+    cursor_name = "flexigis_" + os.path.splitext(
+        os.path.basename(writer.name))[0]
+    cur = conn.cursor(name=cursor_name)
+    cur.itersize = itersize
+    cur.execute(sql, params)
+
+    rows_written = 0
+    first_batch = True
+    while True:
+        rows = cur.fetchmany(itersize)
+        if not rows and not first_batch:
+            break
+        # the first batch is written even if empty to create the file
+        batch = features(pd.DataFrame(rows, columns=columns).dropna())
+        rows_written += writer.write(batch)
+        first_batch = False
+        if not rows:
+            break
+    cur.close()
+    writer.close()
+    return rows_written
+
+
+def copy_to_file(pool, sql, params, columns, features, writer,
+                 blocksize=100000, wkb=False):
+    """Export a query with COPY TO STDOUT into a table writer.
+
+    The COPY stream is piped from a receiver thread into the csv parser and
+    decoded blocksize rows at a time. Returns the table throughput report.
+
+    pool: database connection pool
+    sql: str object, query of the highway table.
+    params: sequence of query parameters or None.
+    columns: list, column names of the query result.
+    features: callable, filters a block and returns it ready to be written.
+    writer: table writer of the output file (see highway_io.table_writer).
+    blocksize: int, number of rows decoded per block.
+    wkb: bool, the geometry column holds WKB (sent as hex encoded bytea).
+    """
+    start = time.time()
+    conn = pool.getconn()
+    read_fd, write_fd = os.pipe()
+    stream_in = os.fdopen(read_fd, "rb")
+    stream_out = os.fdopen(write_fd, "wb")
+    errors = []
+
+    def receive(cur, copy_sql):
+        try:
+            cur.copy_expert(copy_sql, stream_out)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            stream_out.close()
+
+    rows_read = 0
+    rows_written = 0
+    first_block = True
+    receiver = None
+    try:
+        cur = conn.cursor()
+        copy_sql = "COPY ({}) TO STDOUT WITH (FORMAT csv)".format(
+            cur.mogrify(sql, params).decode("utf-8"))
+        receiver = threading.Thread(target=receive, args=(cur, copy_sql))
+        receiver.start()
+        try:
+            blocks = pd.read_csv(stream_in, names=columns, header=None,
+                                 chunksize=blocksize,
+                                 dtype={"highway": str, "geometry": str,
+                                        "lanes": str})
+            for block in blocks:
+                rows_read += len(block)
+                block = block.dropna()
+                if wkb:
+                    block["geometry"] = block["geometry"].str[2:].map(
+                        bytes.fromhex)
+                rows_written += writer.write(features(block))
+                first_block = False
+        except pd.errors.EmptyDataError:
+            pass
+    finally:
+        stream_in.close()
+        if receiver is None:
+            stream_out.close()
+        else:
+            receiver.join()
+        pool.putconn(conn, close=bool(errors))
+    if errors:
+        raise errors[0]
+    if first_block:
+        # empty result, still write the output file
+        writer.write(features(pd.DataFrame(columns=columns)))
+    writer.close()
+
+    seconds = time.time() - start
+    return {"table": os.path.basename(writer.name), "rows": rows_read,
+            "rows_written": rows_written, "seconds": seconds,
+            "rows_per_s": rows_read / seconds if seconds > 0 else 0.0}
 
 
 class GetLines:
@@ -65,55 +227,136 @@ class GetLines:
     get_line_from_db: returns querried database table as pandas dataframe.
     get_line_features: gets highway categories(lines), calculate thier area and
     returns dataset as csv file.
+    stream_line_features: streams the table in batches to the csv file.
     """
 
-    def get_line_from_db(self, cur, conn):
+    table = "planet_osm_line"
+    ways_column = "highway"
+    columns = ["osm_id", "highway", "length", "geometry"]
+
+    def __init__(self, width_catalog=None):
+        """Set highway categories and widths from the width catalog."""
+        if width_catalog is None:
+            width_catalog = load_width_catalog()
+        default = width_catalog[width_catalog["lanes"].isna()]
+        lanes = width_catalog.dropna(subset=["lanes"])
+        # highway categories and their width in meters, in matching order
+        self.highway_feature = list(default["highway"])
+        self.width = list(default["width"])
+        self.lane_width = {(h, str(n)): w for h, n, w in
+                           lanes[["highway", "lanes", "width"]].values}
+
+    def line_query(self, pushdown=False, wkb=False):
+        """Return sql query, query parameters and columns of the line table.
+
+        pushdown: bool, filter the highway categories and compute the area
+        from the category width in the database.
+        wkb: bool, fetch the geometry as binary WKB instead of EWKT text.
+        """
+        # Convert postgres encoded geometric projection to EPSG:3857 format
+        # EPSG:3857 is a Spherical Mercator projection coordinate system
+        # popularized by web services such as Google and later OpenStreetMap.
+        # https://wiki.openstreetmap.org/wiki/EPSG:3857
+        if not pushdown:
+            columns = list(self.columns)
+            lanes = ""
+            if self.lane_width:
+                # lanes tag of the osm2pgsql hstore column
+                lanes = ", COALESCE(tags -> 'lanes', 'unknown') as n"
+                columns.append("lanes")
+            sql = "SELECT osm_id, highway, ST_Length(ST_Transform(way, 3857)) as l,\
+             {} as p{} FROM planet_osm_line".format(geometry_sql(wkb=wkb),
+                                                    lanes)
+            return sql, None, columns
+
+        # the width table is joined as an unnested (highway, width) list
+        width = "w.width"
+        lanes_join = ""
+        params = [self.highway_feature, self.width]
+        if self.lane_width:
+            width = "COALESCE(wl.width, w.width)"
+            lanes_join = "LEFT JOIN unnest(%s::text[], %s::text[],\
+             %s::float8[]) AS wl(highway, lanes, width)\
+             ON t.highway = wl.highway AND t.tags -> 'lanes' = wl.lanes"
+            keys = list(self.lane_width)
+            params += [[k[0] for k in keys], [k[1] for k in keys],
+                       list(self.lane_width.values())]
+        sql = "SELECT t.osm_id, t.highway,\
+         ST_Length(ST_Transform(t.way, 3857)) as l,\
+         ST_Length(ST_Transform(t.way, 3857)) * {} as a,\
+         {} as p FROM planet_osm_line t\
+         JOIN unnest(%s::text[], %s::float8[]) AS w(highway, width)\
+         ON t.highway = w.highway {} WHERE t.highway = ANY(%s)".format(
+            width, geometry_sql("t.way", wkb), lanes_join)
+        params.append(self.highway_feature)
+        return sql, tuple(params), ["osm_id", "highway", "length", "area",
+                                    "geometry"]
+
+    def get_line_from_db(self, cur, conn, pushdown=False, wkb=False):
         """Query database and return data as dataframe."""
         # fetch high way column from db (line table)
         self.cur = cur
         self.conn = conn
-        self.table = "planet_osm_line"
-        self.ways_column = "highway"
 
         # query database
-        # Convert postgres encoded geometric projection to EPSG:3857 format
-        # EPSG:3857 is a Spherical Mercator projection coordinate system
-        # popularized by web services such as Google and later OpenStreetMap.
-        # https://wiki.openstreetmap.org/wiki/EPSG:3857
-        sql = "SELECT osm_id, highway, ST_Length(ST_Transform(way, 3857)) as l,\
-         ST_ASEWKT(ST_Transform(way, 3857)) as p FROM planet_osm_line"
-
-        self.cur.execute(sql)
+        sql, params, columns = self.line_query(pushdown, wkb)
+        self.cur.execute(sql, params)
         self.rows = self.cur.fetchall()
 
         # save selected columns as pandas dataframe
-        self.df = pd.DataFrame(self.rows, columns=["osm_id", self.ways_column,
-                                                   "length", "geometry"])
+        self.df = pd.DataFrame(self.rows, columns=columns)
         self.data = self.df.dropna().sort_values(by="highway")
         logging.info("line properties for highway extracted from database.")
         return self.data
 
     # get features from dataframe
-    def get_line_features(self, dataset):
-        """Get OSM High way features."""
-        self.highway_feature = {'living_street', 'motorway', 'pedestrian',
-                                'primary', 'secondary', 'service', 'tertiary',
-                                'trunk', 'motorway_link', 'primary_link',
-                                'secondary_link', 'tertiary_link',
-                                'trunk_link'}
-        self.width = [7.5, 15.50, 7.5, 10.5, 9.5, 7.5, 9.5, 9.5, 6.5, 6.5,
-                      6.5, 6.5, 6.5]
+    def line_features(self, dataset):
+        """Filter OSM High way features and compute their area."""
         self.highway_width_ = dict(zip(self.highway_feature, self.width))
         self.dataset = dataset.loc[dataset["highway"].
                                    isin(self.highway_feature)]
-        self.new_data_ = self.dataset.set_index("highway")
-        
-        # compute area and save data to csv
-        check_features_ = set(self.new_data_.index.unique()).intersection(self.highway_feature)
-        width_ = {k: self.highway_width_[k] for k in check_features_}
-        new_data = compute_area(self.new_data_, width_)
-        data_to_csv(new_data, destination+self.table+".csv")
-        logging.info("csv file of line properties generated.")
+        if "area" in self.dataset:
+            # area already computed in the database (pushdown query)
+            new_data = self.dataset.reset_index(drop=True)
+        else:
+            self.new_data_ = self.dataset.set_index("highway")
+            new_data = compute_area(self.new_data_, self.highway_width_,
+                                    self.lane_width)
+        new_data = compact_dtypes(new_data)
+        return new_data[["highway", "osm_id", "length", "geometry", "area"]]
+
+    def get_line_features(self, dataset, output_format="csv"):
+        """Get OSM High way features."""
+        new_data = self.line_features(dataset)
+        write_table(new_data, destination+self.table, output_format)
+        logging.info("{} file of line properties generated.".format(
+            output_format))
+        return len(new_data)
+
+    def stream_line_features(self, conn, itersize=20000, pushdown=False,
+                             output_format="csv"):
+        """Stream line table from database to csv or parquet in batches."""
+        sql, params, columns = self.line_query(
+            pushdown, output_format == "parquet")
+        writer = table_writer(destination+self.table, output_format,
+                              ["highway", "osm_id", "length", "geometry",
+                               "area"])
+        rows = stream_to_file(conn, sql, params, columns, self.line_features,
+                              writer, itersize)
+        logging.info("{} file of line properties streamed ({} rows)."
+                     .format(output_format, rows))
+        return rows
+
+    def copy_line_features(self, pool, blocksize=100000, pushdown=False,
+                           output_format="csv"):
+        """Export line table with COPY TO STDOUT to csv or parquet."""
+        wkb = output_format == "parquet"
+        sql, params, columns = self.line_query(pushdown, wkb)
+        writer = table_writer(destination+self.table, output_format,
+                              ["highway", "osm_id", "length", "geometry",
+                               "area"])
+        return copy_to_file(pool, sql, params, columns, self.line_features,
+                            writer, blocksize, wkb)
 
 
 class GetPolygons:
@@ -121,41 +364,81 @@ class GetPolygons:
 
     get_polygons_from_db: returns querried database table as pandas dataframe.
     get_polygons_features: returns csv file of highway categories(polygons).
+    stream_polygons_features: streams the table in batches to the csv file.
     """
 
-    def get_polygons_from_db(self, cur, conn):
+    table = "planet_osm_polygon"
+    ways_column = "highway"
+    columns = ["osm_id", "highway", "area", "geometry"]
+    highway_feature = ['crossing', 'footway', 'living_street', 'pedestrian',
+                       'platform', 'residential', 'service', 'traffic_island']
+
+    def polygons_query(self, pushdown=False, wkb=False):
+        """Return sql query, query parameters and columns of polygon table.
+
+        pushdown: bool, filter the highway categories in the database.
+        wkb: bool, fetch the geometry as binary WKB instead of EWKT text.
+        """
+        sql = "SELECT osm_id, highway, ST_Area(ST_Transform(way, 3857)) a,\
+         {} as p FROM planet_osm_polygon".format(geometry_sql(wkb=wkb))
+        if not pushdown:
+            return sql, None, self.columns
+        return sql + " WHERE highway = ANY(%s)", (self.highway_feature,), \
+            self.columns
+
+    def get_polygons_from_db(self, cur, conn, pushdown=False, wkb=False):
         """Query database and return data as dataframe."""
-        # fetch high way column from db (line table)
+        # fetch high way column from db (polygon table)
         self.cur = cur
         self.conn = conn
-        self.table = "planet_osm_polygon"
-        self.ways_column = "highway"
-
-        sql = "SELECT osm_id, highway, ST_Area(ST_Transform(way, 3857)) a,\
-         ST_ASEWKT(ST_Transform(way, 3857))as p FROM planet_osm_polygon"
 
-        self.cur.execute(sql)
+        sql, params, columns = self.polygons_query(pushdown, wkb)
+        self.cur.execute(sql, params)
         self.rows = self.cur.fetchall()
 
         # save selected columns as pandas dataframe
-        self.df = pd.DataFrame(self.rows, columns=[
-            "osm_id", self.ways_column,
-            "area", "geometry"])
+        self.df = pd.DataFrame(self.rows, columns=columns)
         self.data = self.df.dropna().sort_values(by="highway")
         logging.info("polygon properties for highway extracted from database.")
         return self.data
-    # get features from dataframe
 
-    def get_polygons_features(self, dataset):
-        """Get OSM High way features."""
-        self.highway_feature = ['crossing', 'footway', 'living_street',
-                                'pedestrian', 'platform', 'residential',
-                                'service', 'traffic_island']
+    # get features from dataframe
+    def polygons_features(self, dataset):
+        """Filter OSM High way features."""
         self.dataset = dataset.loc[dataset["highway"].
                                    isin(self.highway_feature)]
         self.new_data_polygons = self.dataset.set_index(["highway"])
-        data_to_csv(self.new_data_polygons, destination+self.table+".csv")
-        logging.info("csv file for polygons generated.")
+        return self.new_data_polygons
+
+    def get_polygons_features(self, dataset, output_format="csv"):
+        """Get OSM High way features."""
+        new_data = self.polygons_features(dataset)
+        write_table(new_data, destination+self.table, output_format)
+        logging.info("{} file for polygons generated.".format(output_format))
+        return len(new_data)
+
+    def stream_polygons_features(self, conn, itersize=20000, pushdown=False,
+                                 output_format="csv"):
+        """Stream polygon table from database to csv or parquet in batches."""
+        sql, params, columns = self.polygons_query(
+            pushdown, output_format == "parquet")
+        writer = table_writer(destination+self.table, output_format,
+                              ["highway", "osm_id", "area", "geometry"])
+        rows = stream_to_file(conn, sql, params, columns,
+                              self.polygons_features, writer, itersize)
+        logging.info("{} file for polygons streamed ({} rows).".format(
+            output_format, rows))
+        return rows
+
+    def copy_polygons_features(self, pool, blocksize=100000, pushdown=False,
+                               output_format="csv"):
+        """Export polygon table with COPY TO STDOUT to csv or parquet."""
+        wkb = output_format == "parquet"
+        sql, params, columns = self.polygons_query(pushdown, wkb)
+        writer = table_writer(destination+self.table, output_format,
+                              ["highway", "osm_id", "area", "geometry"])
+        return copy_to_file(pool, sql, params, columns,
+                            self.polygons_features, writer, blocksize, wkb)
 
 
 class GetPoints:
@@ -163,63 +446,200 @@ class GetPoints:
 
     get_point_from_db: returns querried database table as pandas dataframe.
     get_point_features: returns csv file of highway categories(points)
+    stream_point_features: streams the table in batches to the csv file.
     """
 
-    def get_point_from_db(self, cur, conn):
+    table = "planet_osm_point"
+    ways_column = "highway"
+    columns = ["osm_id", "highway", "geometry", "Longitude", "Latitude"]
+    highway_feature = ['bus_stop', 'crossing', 'give_way',
+                       'motorway_junction', 'passing_place', 'platform',
+                       'speed_camera', 'stop', 'street_lamp',
+                       'traffic_signals']
+
+    def point_query(self, pushdown=False, wkb=False):
+        """Return sql query, query parameters and columns of point table.
+
+        pushdown: bool, filter the highway categories in the database.
+        wkb: bool, fetch the geometry as binary WKB instead of EWKT text.
+        """
+        sql = "SELECT osm_id, highway, {} as p,\
+         ST_X(ST_Transform (way, 3857)) as Longitude,\
+          ST_Y(ST_Transform(way, 3857)) as Latitude FROM planet_osm_point"\
+            .format(geometry_sql(wkb=wkb))
+        if not pushdown:
+            return sql, None, self.columns
+        return sql + " WHERE highway = ANY(%s)", (self.highway_feature,), \
+            self.columns
+
+    def get_point_from_db(self, cur, conn, pushdown=False, wkb=False):
         """Extract database table."""
-        # fetch high way column from db (line table)
+        # fetch high way column from db (point table)
         self.cur = cur
         self.conn = conn
-        self.table = "planet_osm_point"
-        self.ways_column = "highway"
 
         # query database
-        sql = "SELECT osm_id, highway,ST_ASEWKT(ST_Transform(way, 3857))as p,\
-         ST_X(ST_Transform (way, 3857)) as Longitude,\
-          ST_Y(ST_Transform(way, 3857)) as Latitude FROM planet_osm_point"
-
-        self.cur.execute(sql)
+        sql, params, columns = self.point_query(pushdown, wkb)
+        self.cur.execute(sql, params)
         self.rows = self.cur.fetchall()
 
         # save selected columns as pandas dataframe
-        self.df = pd.DataFrame(self.rows, columns=[
-            "osm_id", self.ways_column, "geometry", "Longitude", "Latitude"])
+        self.df = pd.DataFrame(self.rows, columns=columns)
         self.data = self.df.dropna().sort_values(by="highway")
         logging.info("node properties for highway extracted from database.")
         return self.data
-    # get features from dataframe
 
-    def get_point_features(self, dataset):
-        """Get OSM High way features."""
-        self.highway_feature = ['bus_stop', 'crossing', 'give_way',
-                                'motorway_junction', 'passing_place',
-                                'platform', 'speed_camera', 'stop',
-                                'street_lamp', 'traffic_signals']
+    # get features from dataframe
+    def point_features(self, dataset):
+        """Filter OSM High way features."""
         self.dataset = dataset.loc[dataset["highway"].
                                    isin(self.highway_feature)]
         self.new_data_points = self.dataset.set_index(["highway"])
-        data_to_csv(self.new_data_points, destination+self.table+".csv")
-        logging.info("csv file for points generated.")
+        return self.new_data_points
+
+    def get_point_features(self, dataset, output_format="csv"):
+        """Get OSM High way features."""
+        new_data = self.point_features(dataset)
+        write_table(new_data, destination+self.table, output_format)
+        logging.info("{} file for points generated.".format(output_format))
+        return len(new_data)
+
+    def stream_point_features(self, conn, itersize=20000, pushdown=False,
+                              output_format="csv"):
+        """Stream point table from database to csv or parquet in batches."""
+        sql, params, columns = self.point_query(
+            pushdown, output_format == "parquet")
+        writer = table_writer(destination+self.table, output_format,
+                              ["highway", "osm_id", "geometry", "Longitude",
+                               "Latitude"])
+        rows = stream_to_file(conn, sql, params, columns, self.point_features,
+                              writer, itersize)
+        logging.info("{} file for points streamed ({} rows).".format(
+            output_format, rows))
+        return rows
+
+    def copy_point_features(self, pool, blocksize=100000, pushdown=False,
+                            output_format="csv"):
+        """Export point table with COPY TO STDOUT to csv or parquet."""
+        wkb = output_format == "parquet"
+        sql, params, columns = self.point_query(pushdown, wkb)
+        writer = table_writer(destination+self.table, output_format,
+                              ["highway", "osm_id", "geometry", "Longitude",
+                               "Latitude"])
+        return copy_to_file(pool, sql, params, columns, self.point_features,
+                            writer, blocksize, wkb)
+
+
+def copy_tables(pool, jobs=3, blocksize=100000, pushdown=False,
+                output_format="csv"):
+    """Export lines, polygons and points concurrently over a pool.
+
+    Each table runs its own COPY on a connection of the pool, so the export
+    takes about as long as the slowest table. Returns the table reports.
+    """
+    exports = [GetLines().copy_line_features,
+               GetPolygons().copy_polygons_features,
+               GetPoints().copy_point_features]
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(export, pool, blocksize, pushdown,
+                                   output_format) for export in exports]
+        reports = [future.result() for future in futures]
+    for report in reports:
+        print("INFO: {table}: {rows} rows in {seconds:.1f} s "
+              "({rows_per_s:.0f} rows/s), {rows_written} written"
+              .format(**report))
+        logging.info("bulk export {table}: {rows} rows, {seconds:.2f} s, "
+                     "{rows_per_s:.0f} rows/s".format(**report))
+    print("INFO: bulk export of all tables took {:.1f} s".format(
+        time.time() - start))
+    return reports
 
 
 if __name__ == "__main__":
-    conn = dbconn_from_args()
-    cur = conn.cursor()
-
-    # get higways from lines
-    print("  === HIGHWAY LINES ====")
-    lines = GetLines()
-    data_line = lines.get_line_from_db(cur, conn)
-    lines.get_line_features(data_line)
-
-    # get highway polygons
-    print("  === HIGHWAY SHAPES ====")
-    squares = GetPolygons()
-    data_square = squares.get_polygons_from_db(cur, conn)
-    squares.get_polygons_features(data_square)
-
-    # get highway points
-    print("  === HIGHWAY POINTS ====")
-    points = GetPoints()
-    data_point = points.get_point_from_db(cur, conn)
-    points.get_point_features(data_point)
+    enable_profile()
+    parser = db_option_parser()
+    parser.add_option("-S", "--stream", action="store_true", dest="stream",
+                      default=False,
+                      help="stream tables through server-side cursors")
+    parser.add_option("-I", "--itersize", action="store", dest="itersize",
+                      type="int", default=20000,
+                      help="rows per batch when streaming or bulk exporting")
+    parser.add_option("-W", "--pushdown", action="store_true",
+                      dest="pushdown", default=False,
+                      help="filter categories and compute areas in sql")
+    parser.add_option("-F", "--format", action="store", dest="output_format",
+                      type="choice", choices=["csv", "parquet"],
+                      default="csv", help="output format, csv or parquet")
+    parser.add_option("-C", "--copy", action="store_true", dest="copy",
+                      default=False,
+                      help="bulk export tables in parallel with COPY")
+    parser.add_option("-J", "--jobs", action="store", dest="jobs",
+                      type="int", default=3,
+                      help="connections used by the bulk export")
+    (options, args) = parser.parse_args()
+    pushdown = options.pushdown
+    output_format = options.output_format
+    wkb = output_format == "parquet"
+    tables = [GetLines.table, GetPolygons.table, GetPoints.table]
+
+    if options.copy:
+        print("  === HIGHWAY LINES, SHAPES AND POINTS ====")
+        pool = dbconn_from_args(parser=parser, maxconn=options.jobs)
+        with span("get_highways.copy") as s:
+            reports = copy_tables(pool, options.jobs, options.itersize,
+                                  pushdown, output_format)
+            s.rows_in = sum(r["rows"] for r in reports)
+            s.rows_out = sum(r["rows_written"] for r in reports)
+            for table in tables:
+                s.add_output(table_path(destination, table,
+                                        output_format))
+        pool.closeall()
+    elif options.stream:
+        conn = dbconn_from_args(parser=parser)
+        streams = [GetLines().stream_line_features,
+                   GetPolygons().stream_polygons_features,
+                   GetPoints().stream_point_features]
+        for table, stream, title in zip(tables, streams,
+                                        ["LINES", "SHAPES", "POINTS"]):
+            print("  === HIGHWAY {} ====".format(title))
+            with span("get_highways.stream." + table) as s:
+                s.rows_out = stream(conn, options.itersize, pushdown,
+                                    output_format)
+                s.add_output(table_path(destination, table,
+                                        output_format))
+    else:
+        conn = dbconn_from_args(parser=parser)
+        cur = conn.cursor()
+
+        # get higways from lines
+        print("  === HIGHWAY LINES ====")
+        lines = GetLines()
+        with span("get_highways." + lines.table) as s:
+            data_line = lines.get_line_from_db(cur, conn, pushdown, wkb)
+            s.rows_in = len(data_line)
+            s.rows_out = lines.get_line_features(data_line, output_format)
+            s.add_output(table_path(destination, lines.table,
+                                    output_format))
+
+        # get highway polygons
+        print("  === HIGHWAY SHAPES ====")
+        squares = GetPolygons()
+        with span("get_highways." + squares.table) as s:
+            data_square = squares.get_polygons_from_db(cur, conn, pushdown,
+                                                       wkb)
+            s.rows_in = len(data_square)
+            s.rows_out = squares.get_polygons_features(data_square,
+                                                       output_format)
+            s.add_output(table_path(destination, squares.table,
+                                    output_format))
+
+        # get highway points
+        print("  === HIGHWAY POINTS ====")
+        points = GetPoints()
+        with span("get_highways." + points.table) as s:
+            data_point = points.get_point_from_db(cur, conn, pushdown, wkb)
+            s.rows_in = len(data_point)
+            s.rows_out = points.get_point_features(data_point, output_format)
+            s.add_output(table_path(destination, points.table,
+                                    output_format))
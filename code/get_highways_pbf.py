@@ -0,0 +1,318 @@
+"""Get Highway data directly from the filtered OSM pbf file.
+
+Alternative to the osm2pgsql import and get_highways.py: the pbf file is read
+in one streaming pass and the planet_osm_line, planet_osm_polygon and
+planet_osm_point outputs are written without a database. Node coordinates
+are collected in flat arrays, projected to EPSG:3857 and turned into
+lengths, areas and geometries batch by batch with numpy and pygeos.
+"""
+import logging
+import optparse
+from array import array
+import numpy as np
+import osmium
+import pandas as pd
+import pygeos
+from get_highways import GetLines, GetPolygons, GetPoints, destination
+from highway_io import table_path, table_writer
+from instrument import enable_profile, span
+
+# Spherical Mercator (EPSG:3857) earth radius and latitude limit
+earth_radius = 6378137.0
+max_latitude = 85.0511287798
+
+
+def web_mercator(lon, lat):
+    """Project longitude and latitude arrays (EPSG:4326) to EPSG:3857."""
+    lat = np.clip(lat, -max_latitude, max_latitude)
+    x = earth_radius * np.radians(lon)
+    y = earth_radius * np.log(np.tan(np.pi / 4 + np.radians(lat) / 2))
+    return x, y
+
+
+def part_index(counts):
+    """Return the part number of every coordinate of consecutive parts."""
+    return np.repeat(np.arange(len(counts)), counts)
+
+
+def line_lengths(x, y, counts):
+    """Return the length of each line of the flat coordinate arrays.
+
+    x, y: arrays of the coordinates of all lines one after the other.
+    counts: array, number of coordinates of each line.
+    """
+    index = part_index(counts)
+    segment = np.hypot(np.diff(x), np.diff(y))
+    # drop the segments joining the end of a line to the next line
+    same = index[1:] == index[:-1]
+    return np.bincount(index[1:][same], weights=segment[same],
+                       minlength=len(counts))
+
+
+def ring_areas(x, y, counts):
+    """Return the unsigned area of each closed ring (shoelace formula)."""
+    index = part_index(counts)
+    cross = x[:-1] * y[1:] - x[1:] * y[:-1]
+    same = index[1:] == index[:-1]
+    signed = np.bincount(index[1:][same], weights=cross[same],
+                         minlength=len(counts))
+    return np.abs(signed) / 2
+
+
+def geometry_column(geometries, wkb=False):
+    """Return geometries as WKB bytes or EWKT text like the database."""
+    if wkb:
+        return pygeos.to_wkb(geometries)
+    return "SRID=3857;" + pd.Series(pygeos.to_wkt(
+        geometries, rounding_precision=6, trim=True), dtype=object)
+
+
+class HighwayHandler(osmium.SimpleHandler):
+    """Collect highway nodes, ways and areas while the pbf file is read.
+
+    The coordinates are kept as flat arrays with one count per line or ring,
+    every batch_size features the collected features are written to the
+    output files.
+    """
+
+    def __init__(self, lines, squares, points, writers, batch_size=50000,
+                 wkb=False):
+        super().__init__()
+        self.features = {"line": lines.line_features,
+                         "polygon": squares.polygons_features,
+                         "point": points.point_features}
+        self.line_feature = set(lines.highway_feature)
+        self.polygon_feature = set(squares.highway_feature)
+        self.point_feature = set(points.highway_feature)
+        self.lanes = bool(lines.lane_width)
+        self.writers = writers
+        self.batch_size = batch_size
+        self.wkb = wkb
+        self.rows = {"line": 0, "polygon": 0, "point": 0}
+        self.first_batch = {"line": True, "polygon": True, "point": True}
+        self.reset_lines()
+        self.reset_polygons()
+        self.reset_points()
+
+    def reset_lines(self):
+        self.line_ids, self.line_highway, self.line_lanes = [], [], []
+        self.line_lon, self.line_lat = array("d"), array("d")
+        self.line_counts = array("q")
+
+    def reset_polygons(self):
+        self.polygon_ids, self.polygon_highway = [], []
+        # rings of all polygons, each ring with its polygon and outer flag
+        self.ring_lon, self.ring_lat = array("d"), array("d")
+        self.ring_counts = array("q")
+        self.ring_polygon = array("q")
+        self.ring_outer = array("b")
+
+    def reset_points(self):
+        self.point_ids, self.point_highway = [], []
+        self.point_lon, self.point_lat = array("d"), array("d")
+
+    def node(self, n):
+        highway = n.tags.get("highway")
+        if highway not in self.point_feature or not n.location.valid():
+            return
+        self.point_ids.append(n.id)
+        self.point_highway.append(highway)
+        self.point_lon.append(n.location.lon)
+        self.point_lat.append(n.location.lat)
+        if len(self.point_ids) >= self.batch_size:
+            self.flush_points()
+
+    def way(self, w):
+        highway = w.tags.get("highway")
+        if highway not in self.line_feature:
+            return
+        # osm2pgsql puts closed highway ways tagged area=yes into the
+        # polygon table only
+        if w.is_closed() and w.tags.get("area") == "yes":
+            return
+        count = 0
+        for node in w.nodes:
+            if node.location.valid():
+                self.line_lon.append(node.location.lon)
+                self.line_lat.append(node.location.lat)
+                count += 1
+        if count < 2:
+            del self.line_lon[len(self.line_lon) - count:]
+            del self.line_lat[len(self.line_lat) - count:]
+            return
+        self.line_ids.append(w.id)
+        self.line_highway.append(highway)
+        self.line_lanes.append(w.tags.get("lanes", "unknown"))
+        self.line_counts.append(count)
+        if len(self.line_ids) >= self.batch_size:
+            self.flush_lines()
+
+    def area(self, a):
+        highway = a.tags.get("highway")
+        if highway not in self.polygon_feature:
+            return
+        if a.from_way() and a.tags.get("area") != "yes":
+            return
+        polygon = len(self.polygon_ids)
+        for outer in a.outer_rings():
+            self.add_ring(outer, polygon, True)
+            for inner in a.inner_rings(outer):
+                self.add_ring(inner, polygon, False)
+        if len(self.ring_polygon) == 0 or self.ring_polygon[-1] != polygon:
+            return
+        # osm2pgsql stores relations with negative ids
+        self.polygon_ids.append(a.orig_id() if a.from_way()
+                                else -a.orig_id())
+        self.polygon_highway.append(highway)
+        if len(self.polygon_ids) >= self.batch_size:
+            self.flush_polygons()
+
+    def add_ring(self, ring, polygon, outer):
+        count = 0
+        for node in ring:
+            self.ring_lon.append(node.lon)
+            self.ring_lat.append(node.lat)
+            count += 1
+        self.ring_counts.append(count)
+        self.ring_polygon.append(polygon)
+        self.ring_outer.append(outer)
+
+    def write(self, kind, dataset):
+        """Write a batch through the feature method of the extractor."""
+        if len(dataset) or self.first_batch[kind]:
+            self.rows[kind] += self.writers[kind].write(
+                self.features[kind](dataset))
+            self.first_batch[kind] = False
+
+    def flush_lines(self):
+        counts = np.frombuffer(self.line_counts, dtype=np.int64)
+        x, y = web_mercator(np.frombuffer(self.line_lon),
+                            np.frombuffer(self.line_lat))
+        geometries = pygeos.linestrings(np.column_stack([x, y]),
+                                        indices=part_index(counts))
+        dataset = pd.DataFrame({"osm_id": self.line_ids,
+                                "highway": self.line_highway,
+                                "length": line_lengths(x, y, counts),
+                                "geometry": geometry_column(geometries,
+                                                            self.wkb)})
+        if self.lanes:
+            dataset["lanes"] = self.line_lanes
+        self.write("line", dataset)
+        self.reset_lines()
+
+    def flush_polygons(self):
+        counts = np.frombuffer(self.ring_counts, dtype=np.int64)
+        ring_polygon = np.frombuffer(self.ring_polygon, dtype=np.int64)
+        outer = np.frombuffer(self.ring_outer, dtype=np.int8).astype(bool)
+        x, y = web_mercator(np.frombuffer(self.ring_lon),
+                            np.frombuffer(self.ring_lat))
+        # polygon area is the area of its outer rings minus its holes
+        areas = ring_areas(x, y, counts) * np.where(outer, 1.0, -1.0)
+        area = np.bincount(ring_polygon, weights=areas,
+                           minlength=len(self.polygon_ids))
+        rings = pygeos.linearrings(np.column_stack([x, y]),
+                                   indices=part_index(counts))
+
+        # group the rings of each polygon into (multi)polygons
+        geometries = []
+        start = 0
+        ends = np.r_[np.flatnonzero(np.diff(ring_polygon)) + 1,
+                     len(ring_polygon)] if len(ring_polygon) else []
+        for end in ends:
+            parts = []
+            for i in range(start, end):
+                if outer[i]:
+                    parts.append([rings[i]])
+                else:
+                    parts[-1].append(rings[i])
+            parts = [pygeos.polygons(p[0], holes=p[1:] or None)
+                     for p in parts]
+            geometries.append(parts[0] if len(parts) == 1
+                              else pygeos.multipolygons(parts))
+            start = end
+        dataset = pd.DataFrame({"osm_id": self.polygon_ids,
+                                "highway": self.polygon_highway,
+                                "area": area,
+                                "geometry": geometry_column(
+                                    np.array(geometries, dtype=object),
+                                    self.wkb)})
+        self.write("polygon", dataset)
+        self.reset_polygons()
+
+    def flush_points(self):
+        x, y = web_mercator(np.frombuffer(self.point_lon),
+                            np.frombuffer(self.point_lat))
+        dataset = pd.DataFrame({"osm_id": self.point_ids,
+                                "highway": self.point_highway,
+                                "geometry": geometry_column(
+                                    pygeos.points(x, y), self.wkb),
+                                "Longitude": x, "Latitude": y})
+        self.write("point", dataset)
+        self.reset_points()
+
+    def close(self):
+        """Write the remaining features and close the output files."""
+        self.flush_lines()
+        self.flush_polygons()
+        self.flush_points()
+        for writer in self.writers.values():
+            writer.close()
+
+
+def extract_pbf(pbf_file, output_format="csv", batch_size=50000,
+                index="flex_mem", destination=destination):
+    """Extract highway lines, polygons and points from a pbf file.
+
+    pbf_file: str object, path of the filtered osm pbf file.
+    output_format: str object, "csv" or "parquet".
+    batch_size: int, number of features projected and written per batch.
+    index: str object, osmium node location index, e.g. "flex_mem" or
+    "sparse_file_array" for regions that do not fit into memory.
+    destination: str object, output folder of the tables.
+    returns: number of rows written per table.
+    """
+    lines, squares, points = GetLines(), GetPolygons(), GetPoints()
+    writers = {
+        "line": table_writer(destination+lines.table, output_format,
+                             ["highway", "osm_id", "length", "geometry",
+                              "area"]),
+        "polygon": table_writer(destination+squares.table, output_format,
+                                ["highway", "osm_id", "area", "geometry"]),
+        "point": table_writer(destination+points.table, output_format,
+                              ["highway", "osm_id", "geometry", "Longitude",
+                               "Latitude"])}
+    handler = HighwayHandler(lines, squares, points, writers, batch_size,
+                             output_format == "parquet")
+    handler.apply_file(pbf_file, locations=True, idx=index)
+    handler.close()
+    logging.info("{} files of lines, polygons and points extracted from {}."
+                 .format(output_format, pbf_file))
+    return handler.rows
+
+
+if __name__ == "__main__":
+    enable_profile()
+    parser = optparse.OptionParser(usage="%prog [options] pbf_file")
+    parser.add_option("-F", "--format", action="store", dest="output_format",
+                      type="choice", choices=["csv", "parquet"],
+                      default="csv", help="output format, csv or parquet")
+    parser.add_option("-B", "--batch-size", action="store",
+                      dest="batch_size", type="int", default=50000,
+                      help="features projected and written per batch")
+    parser.add_option("-N", "--index", action="store", dest="index",
+                      default="flex_mem",
+                      help="osmium node location index")
+    (options, args) = parser.parse_args()
+    if len(args) != 1:
+        parser.error("the pbf file is missing")
+
+    print("  === HIGHWAY LINES, SHAPES AND POINTS FROM PBF ====")
+    with span("get_highways_pbf") as s:
+        rows = extract_pbf(args[0], options.output_format,
+                           options.batch_size, options.index)
+        s.rows_out = sum(rows.values())
+        for kind in rows:
+            s.add_output(table_path(destination, "planet_osm_" + kind,
+                                    options.output_format))
+    for kind in ["line", "polygon", "point"]:
+        print("INFO: planet_osm_{}: {} rows written".format(kind, rows[kind]))
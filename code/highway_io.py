@@ -0,0 +1,185 @@
+"""Write and read the highway tables of the 02_urban_output_data stage.
+
+The tables are written either as csv (geometry as WKT text) or as GeoParquet
+(geometry as binary WKB, CRS stored in the file metadata). Readers load only
+the columns they need and decode the geometry column in one vectorized call.
+"""
+import json
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from geopandas import GeoDataFrame, GeoSeries, read_parquet
+from pyproj import CRS
+
+# all highway geometries are extracted in Spherical Mercator
+crs = "EPSG:3857"
+output_formats = {"csv": ".csv", "parquet": ".parquet"}
+
+# column types of the GeoParquet files, the geometry is WKB
+column_types = {"highway": pa.string(), "osm_id": pa.int64(),
+                "length": pa.float64(), "area": pa.float64(),
+                "Longitude": pa.float64(), "Latitude": pa.float64(),
+                "geometry": pa.binary()}
+
+geometry_types = {"planet_osm_line": ["LineString"],
+                  "planet_osm_polygon": ["Polygon", "MultiPolygon"],
+                  "planet_osm_point": ["Point"]}
+
+
+def data_to_csv(dataset, name="name", mode="w", header=True):
+    """Write data to csv file.
+
+    dataset: dataframe object
+    name: str object, name of the output csv file (the table name).
+    mode: str object, "w" to overwrite or "a" to append to the csv file.
+    header: bool, write the column names.
+    """
+    # strip the SRID=3857; prefix of the EWKT geometry
+    dataset["polygon"] = dataset["geometry"].str.replace(
+        r"^SRID=\d+;", "", regex=True)
+    dataset = dataset.drop(columns=["geometry"])
+    dataset = dataset.rename(columns={"polygon": "geometry"})
+    dataset.to_csv(name, encoding="utf-8", mode=mode, header=header)
+
+
+def geo_metadata(table):
+    """Return the GeoParquet file metadata of a highway table."""
+    metadata = {"version": "0.1.0",
+                "primary_column": "geometry",
+                "columns": {"geometry": {
+                    "encoding": "WKB",
+                    "crs": CRS.from_user_input(crs).to_wkt(),
+                    "geometry_type": geometry_types.get(table, [])}}}
+    return {b"geo": json.dumps(metadata).encode("utf-8")}
+
+
+class CsvWriter:
+    """Write a highway table batch by batch to a csv file."""
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.first_batch = True
+
+    def write(self, dataset):
+        """Append dataset to the csv file, the first call writes the header."""
+        # keep a running row number for frames without a highway index
+        if dataset.index.name is None:
+            dataset.index = dataset.index + self.rows
+        data_to_csv(dataset, self.name, mode="w" if self.first_batch else "a",
+                    header=self.first_batch)
+        self.first_batch = False
+        self.rows += len(dataset)
+        return len(dataset)
+
+    def close(self):
+        """Nothing to flush, every batch is written on arrival."""
+
+
+class ParquetWriter:
+    """Write a highway table batch by batch to a GeoParquet file.
+
+    Every batch becomes one row group, geometries are stored as the WKB
+    received from the database without decoding them.
+    """
+
+    def __init__(self, name, columns):
+        self.name = name
+        self.table = os.path.splitext(os.path.basename(name))[0]
+        fields = [(c, column_types[c]) for c in columns]
+        self.schema = pa.schema(fields).with_metadata(geo_metadata(self.table))
+        self.writer = pq.ParquetWriter(name, self.schema)
+
+    def write(self, dataset):
+        """Append dataset as a row group to the parquet file."""
+        if dataset.index.name is not None:
+            dataset = dataset.reset_index()
+        dataset = dataset.assign(geometry=dataset["geometry"].map(bytes))
+        for column in dataset.select_dtypes("category"):
+            dataset[column] = dataset[column].astype(str)
+        batch = pa.Table.from_pandas(dataset[self.schema.names],
+                                     schema=self.schema, preserve_index=False)
+        self.writer.write_table(batch)
+        return len(dataset)
+
+    def close(self):
+        """Write the parquet footer."""
+        self.writer.close()
+
+
+def table_writer(name, output_format="csv", columns=None):
+    """Return a batch writer of a highway table.
+
+    name: str object, output file name without extension.
+    output_format: str object, "csv" or "parquet".
+    columns: list, output columns in order (parquet only).
+    """
+    if output_format == "parquet":
+        return ParquetWriter(name + ".parquet", columns)
+    return CsvWriter(name + ".csv")
+
+
+def write_table(dataset, name, output_format="csv"):
+    """Write a complete highway table to csv or GeoParquet."""
+    columns = list(dataset.columns)
+    if dataset.index.name is not None:
+        columns = [dataset.index.name] + columns
+    writer = table_writer(name, output_format, columns)
+    writer.write(dataset)
+    writer.close()
+
+
+def table_path(folder, table, output_format=None):
+    """Return the file of a highway table.
+
+    output_format: str object, "csv" or "parquet", None for the most
+    recently written file of either format.
+    """
+    extensions = output_formats.values() if output_format is None \
+        else [output_formats[output_format]]
+    paths = [os.path.join(folder, table + ext) for ext in extensions]
+    paths = [p for p in paths if os.path.exists(p)]
+    if not paths:
+        raise FileNotFoundError("no output file of {} in {}".format(
+            table, folder))
+    return max(paths, key=os.path.getmtime)
+
+
+def read_table(folder, table, output_format=None):
+    """Read a highway table as written, geometries stay WKT text or WKB."""
+    path = table_path(folder, table, output_format)
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    dataset = pd.read_csv(path)
+    if "Unnamed: 0" in dataset:
+        dataset = dataset.drop(columns=["Unnamed: 0"])
+    return dataset
+
+
+def read_highways(folder, table, columns=None):
+    """Read a highway table from csv or GeoParquet.
+
+    Only the given columns are loaded. With a geometry column the result is
+    a GeoDataFrame in EPSG:3857, else a plain dataframe.
+
+    folder: str object, the 02_urban_output_data directory.
+    table: str object, table name e.g. "planet_osm_line".
+    columns: list, columns to load, None loads all columns.
+    """
+    path = table_path(folder, table)
+    with_geometry = columns is None or "geometry" in columns
+
+    if path.endswith(".parquet"):
+        if with_geometry:
+            return read_parquet(path, columns=columns)
+        return pd.read_parquet(path, columns=columns)
+
+    dataset = pd.read_csv(path, usecols=columns)
+    if "Unnamed: 0" in dataset:
+        dataset = dataset.drop(columns=["Unnamed: 0"])
+    if not with_geometry:
+        return dataset
+    geometry = GeoSeries.from_wkt(dataset["geometry"], crs=crs)
+    return GeoDataFrame(dataset.drop(columns=["geometry"]),
+                        geometry=geometry, crs=crs)
@@ -0,0 +1,211 @@
+"""Per-stage timing, memory and row-count records of the FlexiGIS scripts.
+
+A span measures one stage of a script and appends a json record with its
+duration, memory, rows in and out and the bytes of its output files to
+log/stages.jsonl. The memory is the peak resident set size of the process
+so far at the end of the span (peak_rss_mb, ru_maxrss only grows) and the
+increase of that peak during the span (peak_rss_increase_mb). With
+--profile (or FLEXIGIS_PROFILE=1) the cProfile stats of every span are
+dumped to log/profile/. make sets FLEXIGIS_RUN once per run, a script run
+outside make is a run of its own. Running this script prints the summary
+report of the last run.
+"""
+import cProfile
+import functools
+import json
+import logging
+import optparse
+import os
+import pstats
+import resource
+import sys
+import time
+from datetime import datetime
+
+span_file = "../code/log/stages.jsonl"
+profile_dir = "../code/log/profile/"
+summary_file = "../code/log/stages_summary.json"
+run_id = os.environ.get("FLEXIGIS_RUN") or "{:%Y%m%dT%H%M%S}-{}".format(
+    datetime.now(), os.getpid())
+profile = os.environ.get("FLEXIGIS_PROFILE") == "1"
+# cProfile allows one active profiler, nested spans use the outer one
+active_profiler = None
+
+
+def enable_profile(argv=sys.argv):
+    """Remove --profile from argv and switch on profiling if it was given.
+
+    Call before the options of the script are parsed.
+    """
+    global profile
+    if "--profile" in argv:
+        argv.remove("--profile")
+        profile = True
+    return profile
+
+
+def peak_rss_mb():
+    """Return the peak resident set size of this process so far in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def output_bytes(paths):
+    """Return the total size of output files and directories."""
+    total = 0
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                total += sum(os.path.getsize(os.path.join(root, f))
+                             for f in files)
+        elif os.path.exists(path):
+            total += os.path.getsize(path)
+    return total
+
+
+class Span:
+    """Context manager measuring one stage.
+
+    rows_in, rows_out: int, set before the end of the span.
+    add_output: register an output file or directory of the stage.
+    """
+
+    def __init__(self, stage, rows_in=None):
+        self.stage = stage
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.outputs = []
+        self.profiler = None
+
+    def add_output(self, path):
+        """Count the bytes of path as written by the stage."""
+        self.outputs.append(path)
+
+    def __enter__(self):
+        global active_profiler
+        if profile and active_profiler is None:
+            self.profiler = active_profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.rss_start = peak_rss_mb()
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.time() - self.start
+        if self.profiler is not None:
+            self.dump_profile()
+        peak = peak_rss_mb()
+        record = {"run": run_id, "stage": self.stage,
+                  "start": datetime.fromtimestamp(self.start).isoformat(),
+                  "seconds": round(seconds, 4),
+                  "peak_rss_mb": round(peak, 1),
+                  "peak_rss_increase_mb": round(peak - self.rss_start, 1),
+                  "rows_in": self.rows_in, "rows_out": self.rows_out,
+                  "bytes_written": output_bytes(self.outputs),
+                  "status": "ok" if exc_type is None else "error"}
+        write_record(record)
+        return False
+
+    def dump_profile(self):
+        """Write the cProfile stats of the span to the profile folder."""
+        global active_profiler
+        self.profiler.disable()
+        active_profiler = None
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, self.stage)
+        self.profiler.dump_stats(path + ".prof")
+        with open(path + ".txt", "w") as f:
+            stats = pstats.Stats(self.profiler, stream=f)
+            stats.sort_stats("cumulative").print_stats(30)
+
+
+def span(stage, rows_in=None):
+    """Return a span of a stage, use as with span("stage") as s: ..."""
+    return Span(stage, rows_in)
+
+
+def timed(stage):
+    """Decorate a function to run it in a span of the given stage."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with Span(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def write_record(record):
+    """Append a stage record to the span file and the script log."""
+    os.makedirs(os.path.dirname(span_file), exist_ok=True)
+    with open(span_file, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    logging.info("stage {}".format(json.dumps(record)))
+
+
+def read_records(path=span_file, run=None):
+    """Read the stage records of a run, by default the last run."""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if run is None and records:
+        run = records[-1]["run"]
+    return [r for r in records if r["run"] == run]
+
+
+def summary(records):
+    """Aggregate the records per stage in order of their first start."""
+    stages = {}
+    for record in records:
+        total = stages.setdefault(record["stage"], {
+            "stage": record["stage"], "calls": 0, "seconds": 0.0,
+            "peak_rss_mb": 0.0, "peak_rss_increase_mb": 0.0, "rows_in": 0,
+            "rows_out": 0, "bytes_written": 0, "errors": 0})
+        total["calls"] += 1
+        total["seconds"] += record["seconds"]
+        total["peak_rss_mb"] = max(total["peak_rss_mb"],
+                                   record["peak_rss_mb"])
+        total["peak_rss_increase_mb"] = max(
+            total["peak_rss_increase_mb"],
+            record.get("peak_rss_increase_mb", 0.0))
+        total["rows_in"] += record["rows_in"] or 0
+        total["rows_out"] += record["rows_out"] or 0
+        total["bytes_written"] += record["bytes_written"]
+        total["errors"] += record["status"] != "ok"
+    return list(stages.values())
+
+
+def print_summary(stages, run):
+    """Print the summary report of a run."""
+    print("==========================================================================")
+    print("INFO: stage summary of run {}".format(run))
+    print("INFO: proc. MB is the peak memory of the process up to the end "
+          "of the stage,")
+    print("      stage MB the increase of that peak during the stage")
+    print("{:<32} {:>9} {:>9} {:>9} {:>11} {:>11} {:>12}".format(
+        "stage", "seconds", "proc. MB", "stage MB", "rows in", "rows out",
+        "bytes"))
+    for s in stages:
+        print("{stage:<32} {seconds:>9.2f} {peak_rss_mb:>9.0f} "
+              "{peak_rss_increase_mb:>9.0f} {rows_in:>11} {rows_out:>11} "
+              "{bytes_written:>12}".format(**s))
+    print("{:<32} {:>9.2f}".format("total",
+                                   sum(s["seconds"] for s in stages)))
+    print("==========================================================================")
+
+
+if __name__ == "__main__":
+    parser = optparse.OptionParser()
+    parser.add_option("-r", "--run", action="store", dest="run",
+                      default=None, help="run id, default is the last run")
+    (options, args) = parser.parse_args()
+
+    records = read_records(run=options.run)
+    if not records:
+        print("INFO: no stage records in {}".format(span_file))
+        sys.exit(0)
+    run = records[0]["run"]
+    stages = summary(records)
+    print_summary(stages, run)
+    with open(summary_file, "w") as f:
+        json.dump({"run": run, "stages": stages}, f, indent=1)
@@ -8,6 +8,7 @@ github repository. The optimization settings are described below by the followin
 See link here: `oemof-example`_
 '''
 import pandas as pd
+from datetime import datetime
 import os
 import pprint as pp
 import matplotlib.pyplot as plt
@@ -19,6 +20,9 @@ from oemof.outputlib import processing, views
 import oemof.outputlib as outputlib
 import oemof_visio as oev
 from utils import shape_legend
+from instrument import enable_profile, span
+from result_store import write_results
+from optimize_data import capacities, get_commodities, storage_parameters
 
 
 # logging.basicConfig(format='%(asctime)s: %(levelname)s: %(message)s',
@@ -26,25 +30,17 @@ from utils import shape_legend
 #                     level=logging.DEBUG)
 
 
-# load demand and supply data
-def get_commodities(data_path,
-                    filename='optimization-commodities.csv'):
-    """Import simulated urban electricty demand and feedin data.
-
-    :pandas dataframe:  data: with hourly resolution as index
-    """
-    data = pd.read_csv(os.path.join(data_path, filename),
-                       index_col='time', parse_dates=True)
-    return data
-
-
 # Create oemof energy system
-def oemof_power_system(data, dir_path):
+def oemof_power_system(data, dir_path, demand='demand_Mode3',
+                       capacities=capacities):
     """Creates an oemof energy system model and optimizes the investment of
     flexibilty technology.
 
     :dataframe: data: demand, normalized pv and windpower timeseries
     :string: dir_path_2: directory path, to temporary dump optimization results
+    :string: demand: column of the demand timeseries in data, demand_Mode1,
+    demand_Mode2 or demand_Mode3 of street_scenarios.py
+    :dict: capacities: nominal values of wind, pv and storage
     """
     # create an energy system using setting defualt economic parameters
     number_timesteps = len(data.index)
@@ -67,15 +63,17 @@ def oemof_power_system(data, dir_path):
 
     # create fixed source object representing wind power plants
     energysystem.add(solph.Source(label='wind', outputs={bel: solph.Flow(
-        actual_value=data['wind'], nominal_value=50000, fixed=True)}))
+        actual_value=data['wind'], nominal_value=capacities['wind'],
+        fixed=True)}))
 
     # create fixed source object representing pv power plants
     energysystem.add(solph.Source(label='pv', outputs={bel: solph.Flow(
-        actual_value=data['pv'], nominal_value=40000, fixed=True)}))
+        actual_value=data['pv'], nominal_value=capacities['pv'],
+        fixed=True)}))
 
     # create simple sink object representing the electrical demand
     energysystem.add(solph.Sink(label='demand', inputs={bel: solph.Flow(
-        actual_value=data['demand_SB2_SB1'], fixed=True, nominal_value=1)}))
+        actual_value=data[demand], fixed=True, nominal_value=1)}))
 
     # create simple transformer object representing a gas power plant
     # pp_gas = solph.Transformer(
@@ -85,14 +83,20 @@ def oemof_power_system(data, dir_path):
     #     conversion_factors={bel: 0.58})
 
     # create storage object representing a battery
+    c_rate = storage_parameters['c_rate']
     storage = solph.components.GenericStorage(
-        nominal_storage_capacity=10077997,
+        nominal_storage_capacity=capacities['storage'],
         label='storage',
-        inputs={bel: solph.Flow(nominal_value=10077997/6)},
+        inputs={bel: solph.Flow(nominal_value=capacities['storage']/c_rate)},
         outputs={bel: solph.Flow(
-            nominal_value=10077997/6, variable_costs=0.001)},
-        loss_rate=0.00, initial_storage_level=None,
-        inflow_conversion_factor=1, outflow_conversion_factor=0.8,
+            nominal_value=capacities['storage']/c_rate,
+            variable_costs=storage_parameters['variable_costs'])},
+        loss_rate=storage_parameters['loss_rate'],
+        initial_storage_level=None,
+        inflow_conversion_factor=storage_parameters[
+            'inflow_conversion_factor'],
+        outflow_conversion_factor=storage_parameters[
+            'outflow_conversion_factor'],
     )
 
     energysystem.add(storage)
@@ -100,14 +104,29 @@ def oemof_power_system(data, dir_path):
 
 
 # Optimise the energy system
-def optimize(energysystem, data_path, fname='om_data'):
-    """linear optimization of the energy system."""
-    om = solph.Model(energysystem)
-    om.solve(solver='cbc', solve_kwargs={'tee': False})
-    # Dump results in disc for future analysis
+def optimize(energysystem, data_path, fname='om_data',
+             objective_weighting=None, threads=None, dump=True):
+    """linear optimization of the energy system.
+
+    :list: objective_weighting: weight of every timestep in the objective,
+    e.g. the number of days a typical day stands for (aggregate_periods.py)
+    :int: threads: solver threads, None leaves it to cbc
+    :bool: dump: write the results to the folder data_path/fname, see
+    result_store.py
+    """
+    if objective_weighting is None:
+        om = solph.Model(energysystem)
+    else:
+        om = solph.Model(energysystem,
+                         objective_weighting=objective_weighting)
+    cmdline_options = {'threads': threads} if threads else {}
+    om.solve(solver='cbc', solve_kwargs={'tee': False},
+             cmdline_options=cmdline_options)
+    # Store results in disc for future analysis
     energysystem.results['main'] = outputlib.processing.results(om)
     energysystem.results['meta'] = outputlib.processing.meta_results(om)
-    energysystem.dump(dpath=data_path, filename=fname)
+    if dump:
+        write_results(energysystem, os.path.join(data_path, fname))
     energysystem_data = energysystem
     return energysystem_data
 
@@ -119,10 +138,9 @@ def check_results_dataframe(energysystem_data):
     :dict: results
     :dataframe: elect_bus
     """
-    # Restore dumped result for - later Processing *
-    # energysystem = solph.EnergySystem()
-    # energysystem.restore(
-    #     dpath='../data/03_urban_energy_requirements/', filename='om_data')
+    # Stored results are read per node - later Processing *
+    # result_store.read_sequences(
+    #     '../data/03_urban_energy_requirements/om_data', node='storage')
     results = energysystem_data.results['main']
     electricity_bus = views.node(results, 'electricity')
     custom_storage = views.node(results, 'storage')
@@ -156,7 +174,7 @@ def plot(energysystem_data, year):
     fig = plt.figure(figsize=(14, 8))
     electricity_seq = views.node(results, 'electricity')['sequences']
     plot_slice = oev.plot.slice_df(electricity_seq[str(year)+'-03-01':str(year)+'-03-20'],
-                                   date_from=pd.datetime(year, 1, 1))
+                                   date_from=datetime(year, 1, 1))
     my_plot = oev.plot.io_plot('electricity', plot_slice, cdict=cdict,
                                inorder=inorder, ax=fig.add_subplot(1, 1, 1),
                                smooth=True)
@@ -173,12 +191,18 @@ def plot(energysystem_data, year):
 
 
 if __name__ == '__main__':
+    enable_profile()
     data_path_1 = '../data/03_urban_energy_requirements/'
     dir_path_2 = '../data/01_raw_input_data/'
-    data = get_commodities(
-        data_path_1, filename='optimization-commodities.csv')
+    with span("optimize.commodities") as s:
+        data = get_commodities(
+            data_path_1, filename='optimization-commodities.csv')
+        s.rows_out = len(data)
     year = data.index.year[10]
-    energysystem = oemof_power_system(data, dir_path_2)
-    energysystem_data = optimize(energysystem, data_path_1)
+    with span("optimize.build", rows_in=len(data)):
+        energysystem = oemof_power_system(data, dir_path_2)
+    with span("optimize.solve", rows_in=len(data)) as s:
+        energysystem_data = optimize(energysystem, data_path_1)
+        s.add_output(os.path.join(data_path_1, 'om_data'))
     check_results_dataframe(energysystem_data)
     plot(energysystem_data, year)
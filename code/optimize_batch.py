@@ -0,0 +1,178 @@
+"""Solve a grid of optimization scenarios in a process pool.
+
+A scenario is one demand mode (demand_Mode1, demand_Mode2, demand_Mode3 of
+optimization-commodities.csv) and one set of wind, pv and storage
+capacities. Every worker reads the commodities once and builds and solves
+the LPs of its scenarios with a given number of cbc threads. The main
+results (energy of every flow, maximum storage content) and the meta
+results (objective, problem size, solver status and time) of all
+scenarios are collected into one table indexed by the scenario
+parameters, optimization-scenarios.csv. With --store the results of every
+scenario are also written to the result store (result_store.py) folder
+optimization-scenarios/<demand>_<wind>_<pv>_<storage>. With --backend
+highs the LPs are assembled and solved in process (optimize_lp.py) instead
+of oemof and cbc.
+"""
+import itertools
+import logging
+import optparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from instrument import enable_profile, span
+
+data_dir = "../data/03_urban_energy_requirements/"
+input_dir = "../data/01_raw_input_data/"
+scenario_columns = ["demand", "wind", "pv", "storage"]
+store_dir = os.path.join(data_dir, "optimization-scenarios")
+
+# commodities of a worker process, set by load_commodities
+commodities = {}
+
+
+def load_commodities(data_path=data_dir):
+    """Initialize a worker with the commodities of all its scenarios."""
+    from optimize_data import get_commodities
+    commodities["data"] = get_commodities(data_path)
+
+
+def scenario_grid(demands, wind, pv, storage):
+    """Return all combinations of demand modes and capacities."""
+    return [dict(zip(scenario_columns, values)) for values in
+            itertools.product(demands, wind, pv, storage)]
+
+
+def scenario_results(energysystem):
+    """Return the main and meta results of a solved system as one row."""
+    results = energysystem.results['main']
+    meta = energysystem.results['meta']
+    row = {"objective": meta.get('objective')}
+    for name in ["Number of constraints", "Number of variables"]:
+        row[name.lower().replace(" ", "_")] = meta['problem'].get(name)
+    row["solver_status"] = str(meta['solver'].get('Status'))
+    row["termination"] = str(meta['solver'].get('Termination condition'))
+    row["solver_time"] = meta['solver'].get('Time')
+    for (source, target), result in results.items():
+        sequences = result['sequences']
+        if 'flow' in sequences:
+            row["flow_{}_{}".format(source, target)] = \
+                sequences['flow'].sum()
+        if 'storage_content' in sequences:
+            row["storage_content_max"] = sequences['storage_content'].max()
+    return row
+
+
+def scenario_folder(scenario, folder=store_dir):
+    """Return the result store folder of a scenario."""
+    return os.path.join(folder, "_".join(str(scenario[name]) for name in
+                                         scenario_columns))
+
+
+def solve_scenario(scenario, threads=1, input_path=input_dir, store=False,
+                   backend="oemof"):
+    """Build and solve the LP of one scenario.
+
+    Runs in a worker process initialized by load_commodities.
+    store: bool, write the results to scenario_folder(scenario).
+    backend: str object, oemof (oemof and cbc) or highs (optimize_lp.py).
+    returns: dictionary of the scenario, status, duration and results.
+    """
+    start = time.time()
+    row = dict(scenario)
+    try:
+        capacities = {name: scenario[name] for name in ["wind", "pv",
+                                                        "storage"]}
+        if backend == "highs":
+            from optimize_lp import optimize_lp
+            energysystem = optimize_lp(commodities["data"],
+                                       scenario["demand"], capacities)
+            if not energysystem.results['main']:
+                raise ValueError(energysystem.results['meta']['solver']
+                                 ['Termination condition'])
+        else:
+            from optimize import oemof_power_system, optimize
+            energysystem = oemof_power_system(
+                commodities["data"], input_path, scenario["demand"],
+                capacities)
+            energysystem = optimize(energysystem, None, threads=threads,
+                                    dump=False)
+        row.update(scenario_results(energysystem))
+        if store:
+            from result_store import write_results
+            write_results(energysystem, scenario_folder(scenario))
+        row["status"] = "ok"
+    except Exception as e:
+        logging.exception("scenario {} failed.".format(scenario))
+        row["status"] = "error: {}".format(e)
+    row["seconds"] = time.time() - start
+    return row
+
+
+def run_scenarios(scenarios, jobs=4, threads=1, data_path=data_dir,
+                  store=False, backend="oemof"):
+    """Solve all scenarios in a process pool.
+
+    returns: dataframe of the results indexed by the scenario parameters.
+    """
+    with ProcessPoolExecutor(max_workers=jobs, initializer=load_commodities,
+                             initargs=(data_path,)) as executor:
+        futures = [executor.submit(solve_scenario, scenario, threads,
+                                   input_dir, store, backend)
+                   for scenario in scenarios]
+        rows = [future.result() for future in futures]
+    return pd.DataFrame(rows).set_index(scenario_columns)
+
+
+def parse_values(text, kind=float):
+    """Return the values of a comma separated list."""
+    return [kind(v) for v in text.split(",") if v.strip()]
+
+
+if __name__ == '__main__':
+    enable_profile()
+    from optimize_data import capacities
+    parser = optparse.OptionParser()
+    parser.add_option("-d", "--demands", action="store", dest="demands",
+                      default="demand_Mode1,demand_Mode2,demand_Mode3",
+                      help="comma separated demand columns")
+    parser.add_option("-w", "--wind", action="store", dest="wind",
+                      default=str(capacities['wind']),
+                      help="comma separated wind capacities")
+    parser.add_option("-p", "--pv", action="store", dest="pv",
+                      default=str(capacities['pv']),
+                      help="comma separated pv capacities")
+    parser.add_option("-s", "--storage", action="store", dest="storage",
+                      default=str(capacities['storage']),
+                      help="comma separated storage capacities")
+    parser.add_option("-J", "--jobs", action="store", dest="jobs",
+                      type="int", default=4, help="worker processes")
+    parser.add_option("-t", "--threads", action="store", dest="threads",
+                      type="int", default=1, help="cbc threads per worker")
+    parser.add_option("-S", "--store", action="store_true", dest="store",
+                      default=False,
+                      help="write the results of every scenario to the "
+                      "result store")
+    parser.add_option("-b", "--backend", action="store", dest="backend",
+                      type="choice", choices=["oemof", "highs"],
+                      default="oemof",
+                      help="oemof and cbc or the in process HiGHS LP")
+    (options, args) = parser.parse_args()
+
+    scenarios = scenario_grid(parse_values(options.demands, str),
+                              parse_values(options.wind),
+                              parse_values(options.pv),
+                              parse_values(options.storage))
+    print("  === {} OPTIMIZATION SCENARIOS ON {} WORKERS ====".format(
+        len(scenarios), options.jobs))
+    with span("optimize.batch", rows_in=len(scenarios)) as s:
+        results = run_scenarios(scenarios, options.jobs, options.threads,
+                                store=options.store,
+                                backend=options.backend)
+        path = os.path.join(data_dir, 'optimization-scenarios.csv')
+        results.to_csv(path)
+        s.rows_out = len(results)
+        s.add_output(path)
+    failed = results[results["status"] != "ok"]
+    print("INFO: {} of {} scenarios solved, results in {}".format(
+        len(results) - len(failed), len(results), path))
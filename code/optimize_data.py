@@ -0,0 +1,29 @@
+"""Capacities, storage parameters and commodities of the optimization.
+
+Shared by the oemof model (optimize.py, optimize_persistent.py) and the
+HiGHS backend (optimize_lp.py) without importing oemof, pyomo or
+matplotlib, so the HiGHS backend runs without the oemof stack.
+"""
+import os
+from timeseries_store import read_timeseries
+
+# installed wind and pv capacity and storage capacity of the energy system
+capacities = {'wind': 50000, 'pv': 40000, 'storage': 10077997}
+
+# battery storage, its input and output flows are limited to the capacity
+# divided by c_rate
+storage_parameters = {'loss_rate': 0.00, 'inflow_conversion_factor': 1,
+                      'outflow_conversion_factor': 0.8, 'c_rate': 6,
+                      'variable_costs': 0.001}
+
+
+# load demand and supply data
+def get_commodities(data_path,
+                    filename='optimization-commodities.csv'):
+    """Import simulated urban electricty demand and feedin data.
+
+    :pandas dataframe:  data: with hourly resolution as index
+    """
+    data = read_timeseries(os.path.join(data_path, filename),
+                           index_col='time')
+    return data
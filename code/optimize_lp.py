@@ -0,0 +1,214 @@
+"""Storage and supply dispatch as one sparse LP solved by HiGHS.
+
+The energy system of optimize.oemof_power_system (electricity bus, fixed
+wind, pv and demand, excess sink and one GenericStorage) is assembled
+directly as sparse scipy matrices with the constraints of oemof.solph 0.3
+and solved in process by the HiGHS solver of scipy.optimize.linprog,
+without pyomo, an lp file and cbc. Per time step t the variables are the
+excess, the storage charge and discharge and the storage content, plus one
+initial storage content:
+
+    bus      wind + pv + discharge = demand + excess + charge
+    storage  content[t] = content[t-1] * (1 - loss_rate)
+                          + charge * inflow_conversion_factor
+                          - discharge / outflow_conversion_factor
+             with content[-1] the initial content
+    balanced content[T-1] = initial content
+    bounds   charge, discharge <= storage / c_rate,
+             content, initial content <= storage
+    minimize sum of weight[t] * variable_costs * discharge
+
+The results have the same form as results['main'] and results['meta'] of
+oemof.outputlib, so they can be written with result_store.write_results
+and summarised with optimize_batch.scenario_results.
+"""
+import logging
+import optparse
+import os
+import time
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.optimize import OptimizeResult, linprog
+from instrument import enable_profile, span
+from optimize_data import capacities, storage_parameters
+
+
+class LPResults:
+    """Results of an LP solve, like the results of an oemof energy system."""
+
+    def __init__(self, results):
+        self.results = results
+
+
+def dispatch_matrices(data, demand='demand_Mode3', capacities=capacities,
+                      objective_weighting=None):
+    """Assemble the objective, constraints and bounds of the dispatch LP.
+
+    data: dataframe, commodities with the columns wind, pv and demand.
+    returns: cost vector, sparse equality matrix, its right hand side and
+    the bounds (variables x 2) of the variables [excess, charge, discharge,
+    content] (each one per time step) and the initial content.
+    """
+    n = len(data)
+    supply = data['wind'].values * capacities['wind'] + \
+        data['pv'].values * capacities['pv']
+    eta_in = storage_parameters['inflow_conversion_factor']
+    eta_out = storage_parameters['outflow_conversion_factor']
+    retain = 1 - storage_parameters['loss_rate']
+    eye = sp.identity(n, format='csr')
+    zero = sp.csr_matrix((n, n))
+    # content[t-1] of every t, the first row takes the initial content
+    previous = sp.eye(n, k=-1, format='csr')
+    first = sp.csr_matrix(([1.0], ([0], [0])), shape=(n, 1))
+    last = sp.csr_matrix(([1.0, -1.0], ([0, 0], [n - 1, n])),
+                         shape=(1, n + 1))
+    bus = sp.hstack([-eye, -eye, eye, zero, sp.csr_matrix((n, 1))])
+    storage = sp.hstack([zero, -eta_in * eye, eye / eta_out,
+                         eye - retain * previous, -retain * first])
+    balanced = sp.hstack([sp.csr_matrix((1, 3 * n)), last])
+    a_eq = sp.vstack([bus, storage, balanced], format='csr')
+    b_eq = np.concatenate([data[demand].values - supply, np.zeros(n + 1)])
+
+    weights = np.ones(n) if objective_weighting is None else \
+        np.asarray(objective_weighting, dtype=float)
+    costs = np.zeros(4 * n + 1)
+    costs[2 * n:3 * n] = storage_parameters['variable_costs'] * weights
+    flow_limit = capacities['storage'] / storage_parameters['c_rate']
+    upper = np.concatenate([np.full(n, np.inf), np.full(2 * n, flow_limit),
+                            np.full(n + 1, capacities['storage'])])
+    bounds = np.column_stack([np.zeros(4 * n + 1), upper])
+    return costs, a_eq, b_eq, bounds
+
+
+def shortfall(deficit):
+    """Return the energy the storage can not supply in any dispatch.
+
+    deficit: array, demand minus the wind and pv feed-in per time step.
+    The storage can at most discharge the surplus times the inflow and
+    outflow conversion factors, a positive shortfall makes the LP
+    infeasible.
+    """
+    stored = np.clip(-deficit, 0, None).sum() * \
+        storage_parameters['inflow_conversion_factor'] * \
+        storage_parameters['outflow_conversion_factor']
+    return np.clip(deficit, 0, None).sum() - stored
+
+
+def dispatch_results(data, demand, capacities, solution, meta):
+    """Return the flows and storage content in the form of results['main']."""
+    n = len(data)
+    index = data.index
+    empty = pd.Series(dtype=float)
+
+    def flow(values):
+        return {'sequences': pd.DataFrame({'flow': values}, index=index),
+                'scalars': empty}
+
+    x = solution
+    return {
+        'main': {
+            ('wind', 'electricity'): flow(data['wind'].values *
+                                          capacities['wind']),
+            ('pv', 'electricity'): flow(data['pv'].values * capacities['pv']),
+            ('electricity', 'demand'): flow(data[demand].values),
+            ('electricity', 'excess_bel'): flow(x[:n]),
+            ('electricity', 'storage'): flow(x[n:2 * n]),
+            ('storage', 'electricity'): flow(x[2 * n:3 * n]),
+            ('storage', None): {
+                'sequences': pd.DataFrame({'storage_content': x[3 * n:4 * n]},
+                                          index=index),
+                'scalars': pd.Series({'init_content': x[4 * n]})}},
+        'meta': meta}
+
+
+def optimize_lp(data, demand='demand_Mode3', capacities=capacities,
+                objective_weighting=None):
+    """Solve the dispatch LP of data with HiGHS.
+
+    returns: LPResults with results['main'] and results['meta'].
+    """
+    start = time.time()
+    costs, a_eq, b_eq, bounds = dispatch_matrices(
+        data, demand, capacities, objective_weighting)
+    if shortfall(b_eq[:len(data)]) > 0:
+        # proving infeasibility takes HiGHS much longer than a solve
+        solved = OptimizeResult(success=False, fun=None, message=(
+            "infeasible, the demand exceeds the supply and the storage"))
+    else:
+        solved = linprog(costs, A_eq=a_eq, b_eq=b_eq, bounds=bounds,
+                         method='highs')
+    meta = {'objective': solved.fun,
+            'problem': {'Number of constraints': a_eq.shape[0],
+                        'Number of variables': a_eq.shape[1],
+                        'Number of nonzeros': a_eq.nnz},
+            'solver': {'Status': 'ok' if solved.success else 'error',
+                       'Termination condition': 'optimal' if solved.success
+                       else solved.message,
+                       'Time': time.time() - start}}
+    if not solved.success:
+        logging.warning("dispatch LP not solved: {}".format(solved.message))
+        return LPResults({'main': {}, 'meta': meta})
+    return LPResults(dispatch_results(data, demand, capacities, solved.x,
+                                      meta))
+
+
+def compare_oemof(data, input_path, demand='demand_Mode3',
+                  capacities=capacities):
+    """Solve data with oemof and cbc and with HiGHS and compare the results.
+
+    The LP has many optimal dispatches, so the objectives and the energy of
+    every flow are compared, not the single time steps.
+    returns: dataframe of the oemof and HiGHS energy and their relative
+    difference per flow, plus the objective.
+    """
+    from optimize import oemof_power_system, optimize
+    energysystem = oemof_power_system(data, input_path, demand, capacities)
+    energysystem = optimize(energysystem, None, dump=False)
+    lp = optimize_lp(data, demand, capacities).results
+    rows = {'objective': (energysystem.results['meta']['objective'],
+                          lp['meta']['objective'])}
+    for (source, target), result in energysystem.results['main'].items():
+        key = (str(source), str(target) if target is not None else None)
+        for variable, values in result['sequences'].items():
+            rows['{}|{}|{}'.format(key[0], key[1], variable)] = (
+                values.sum(), lp['main'][key]['sequences'][variable].sum())
+    report = pd.DataFrame.from_dict(rows, orient='index',
+                                    columns=['oemof', 'highs'])
+    report['difference'] = (report['highs'] - report['oemof']) / \
+        report['oemof'].abs().replace(0, 1)
+    return report
+
+
+if __name__ == '__main__':
+    enable_profile()
+    parser = optparse.OptionParser()
+    parser.add_option("-d", "--demand", action="store", dest="demand",
+                      default="demand_Mode3",
+                      help="demand column of the optimization")
+    parser.add_option("-c", "--check", action="store_true", dest="check",
+                      default=False,
+                      help="also solve with oemof and cbc and compare")
+    (options, args) = parser.parse_args()
+
+    from optimize_data import get_commodities
+    from result_store import write_results
+    data_path = '../data/03_urban_energy_requirements/'
+    data = get_commodities(data_path)
+    with span("optimize.lp", rows_in=len(data)) as s:
+        lp = optimize_lp(data, options.demand)
+        path = os.path.join(data_path, 'om_data_lp')
+        if lp.results['main']:
+            write_results(lp, path)
+            s.add_output(path)
+    meta = lp.results['meta']
+    print("INFO: {} in {:.2f} s, objective {}".format(
+        meta['solver']['Termination condition'], meta['solver']['Time'],
+        meta['objective']))
+    if options.check:
+        with span("optimize.lp_check", rows_in=len(data)):
+            report = compare_oemof(data, '../data/01_raw_input_data/',
+                                   options.demand)
+        print(report.to_string())
+        report.to_csv(os.path.join(data_path, 'optimization-lp-check.csv'))
+    logging.info("dispatch LP results written to {}".format(path))
@@ -0,0 +1,168 @@
+"""Build the oemof model of the energy system once and solve it many times.
+
+oemof_power_system and solph.Model are built once. The capacities, the
+variable costs and the demand and feed-in series are then changed in the
+pyomo model directly: the fixed wind, pv and demand flows are fixed pyomo
+variables whose values are set again, and the storage capacity and the
+storage flow limits are variable bounds. Variable costs only enter the
+objective, which is rebuilt from the flows. Sensitivity runs update
+values and solve again instead of building a new model for every run.
+"""
+import logging
+import optparse
+import os
+import time
+import pandas as pd
+import oemof.outputlib as outputlib
+from oemof.solph.plumbing import sequence
+import oemof.solph as solph
+from instrument import enable_profile, span
+from optimize import oemof_power_system
+from optimize_data import capacities, get_commodities, storage_parameters
+
+
+class PowerSystemModel:
+    """Energy system and its solph model, built once.
+
+    data: dataframe, commodities with the columns wind, pv and demand.
+    dir_path: str object, input data directory of oemof_power_system.
+    demand: str object, demand column of data.
+    capacities: dict, nominal values of wind, pv and storage.
+    """
+
+    def __init__(self, data, dir_path, demand='demand_Mode3',
+                 capacities=capacities, objective_weighting=None):
+        self.capacities = dict(capacities)
+        self.energysystem = oemof_power_system(data, dir_path, demand,
+                                               self.capacities)
+        self.nodes = {node.label: node for node in self.energysystem.nodes}
+        if objective_weighting is None:
+            self.om = solph.Model(self.energysystem)
+        else:
+            self.om = solph.Model(self.energysystem,
+                                  objective_weighting=objective_weighting)
+        self.solved = False
+
+    def flow(self, source, target):
+        """Return the Flow object between two nodes given by label."""
+        return self.om.flows[self.nodes[source], self.nodes[target]]
+
+    def fix_flow(self, source, target, actual_value=None,
+                 nominal_value=None):
+        """Fix a flow to new actual values or a new nominal value."""
+        flow = self.flow(source, target)
+        if actual_value is not None:
+            flow.actual_value = sequence(list(actual_value))
+        if nominal_value is not None:
+            flow.nominal_value = nominal_value
+        o, i = self.nodes[source], self.nodes[target]
+        for t in self.om.TIMESTEPS:
+            self.om.flow[o, i, t].fix(flow.actual_value[t] *
+                                      flow.nominal_value)
+
+    def set_series(self, wind=None, pv=None, demand=None):
+        """Replace the normalized wind and pv feed-in or the demand."""
+        for label, values in [('wind', wind), ('pv', pv)]:
+            if values is not None:
+                self.fix_flow(label, 'electricity', actual_value=values)
+        if demand is not None:
+            self.fix_flow('electricity', 'demand', actual_value=demand)
+
+    def set_capacities(self, wind=None, pv=None, storage=None):
+        """Change the nominal values of wind, pv and the storage."""
+        for label, value in [('wind', wind), ('pv', pv)]:
+            if value is not None:
+                self.fix_flow(label, 'electricity', nominal_value=value)
+                self.capacities[label] = value
+        if storage is None:
+            return
+        node = self.nodes['storage']
+        node.nominal_storage_capacity = storage
+        block = self.om.GenericStorageBlock
+        for t in self.om.TIMESTEPS:
+            block.storage_content[node, t].setlb(
+                storage * node.min_storage_level[t])
+            block.storage_content[node, t].setub(
+                storage * node.max_storage_level[t])
+        if hasattr(block, 'init_content'):
+            block.init_content[node].setub(storage)
+        for source, target in [('electricity', 'storage'),
+                               ('storage', 'electricity')]:
+            flow = self.flow(source, target)
+            flow.nominal_value = storage / storage_parameters['c_rate']
+            o, i = self.nodes[source], self.nodes[target]
+            for t in self.om.TIMESTEPS:
+                self.om.flow[o, i, t].setub(flow.max[t] *
+                                            flow.nominal_value)
+        self.capacities['storage'] = storage
+
+    def set_variable_costs(self, source, target, costs):
+        """Change the variable costs of a flow and rebuild the objective."""
+        self.flow(source, target).variable_costs = sequence(costs)
+        self.om._add_objective(update=True)
+
+    def solve(self, threads=None, warmstart=False):
+        """Solve the model, warmstart starts from the last solution.
+
+        returns: main and meta results of the solve.
+        """
+        solve_kwargs = {'tee': False}
+        if warmstart and self.solved:
+            solve_kwargs['warmstart'] = True
+        cmdline_options = {'threads': threads} if threads else {}
+        self.om.solve(solver='cbc', solve_kwargs=solve_kwargs,
+                      cmdline_options=cmdline_options)
+        self.solved = True
+        self.energysystem.results['main'] = \
+            outputlib.processing.results(self.om)
+        self.energysystem.results['meta'] = \
+            outputlib.processing.meta_results(self.om)
+        return self.energysystem.results
+
+
+def sensitivity(model, factors, parameter='storage', warmstart=True):
+    """Solve the model for the capacity of parameter scaled by factors.
+
+    returns: dataframe of the objective and solve time per factor.
+    """
+    base = model.capacities[parameter]
+    rows = []
+    for factor in factors:
+        start = time.time()
+        model.set_capacities(**{parameter: base * factor})
+        results = model.solve(warmstart=warmstart)
+        rows.append({parameter: base * factor, "factor": factor,
+                     "objective": results['meta']['objective'],
+                     "seconds": time.time() - start})
+    model.set_capacities(**{parameter: base})
+    return pd.DataFrame(rows).set_index("factor")
+
+
+if __name__ == '__main__':
+    enable_profile()
+    parser = optparse.OptionParser()
+    parser.add_option("-P", "--parameter", action="store", dest="parameter",
+                      type="choice", choices=["wind", "pv", "storage"],
+                      default="storage", help="capacity to vary")
+    parser.add_option("-f", "--factors", action="store", dest="factors",
+                      default="0.5,0.75,1,1.25,1.5",
+                      help="comma separated factors of the capacity")
+    parser.add_option("-d", "--demand", action="store", dest="demand",
+                      default="demand_Mode3",
+                      help="demand column of the optimization")
+    (options, args) = parser.parse_args()
+
+    data_path = '../data/03_urban_energy_requirements/'
+    data = get_commodities(data_path)
+    with span("optimize.persistent_build", rows_in=len(data)):
+        model = PowerSystemModel(data, '../data/01_raw_input_data/',
+                                 options.demand)
+    factors = [float(f) for f in options.factors.split(",") if f.strip()]
+    with span("optimize.sensitivity", rows_in=len(factors)) as s:
+        result = sensitivity(model, factors, options.parameter)
+        path = os.path.join(data_path, 'optimization-sensitivity.csv')
+        result.to_csv(path)
+        s.add_output(path)
+    print(result.to_string())
+    logging.info("sensitivity of {} written to {}".format(options.parameter,
+                                                          path))
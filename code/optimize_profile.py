@@ -0,0 +1,289 @@
+"""Phase profile of the oemof optimization of storage and supply.
+
+profile_optimize runs the steps of optimize.oemof_power_system and
+optimize.optimize one at a time and measures every phase:
+
+    build          oemof_power_system, the energy system
+    model          solph.Model, the pyomo model
+    lp_size        variables, constraints and nonzeros of the pyomo model
+    pyomo_solve    the pyomo solve, made up of
+      write_lp       writing the lp file
+      solve          cbc
+      read_solution  reading the solution file
+    results        outputlib.processing.results and meta_results
+    views          outputlib.views.node of the electricity bus and storage
+    store          result_store.write_results
+
+Every phase has its duration, the peak resident memory of the process at
+its end and the increase of the peak during the phase (the peak only
+grows, so a phase below an earlier peak shows no increase). The peak
+memory of cbc is the one of the child processes. The cbc log is written
+to a file and parsed for the problem size, presolve, iterations, objective
+and solver time; the report keeps the pattern and line of every parsed
+value and lists the values not found. The report is written as json next
+to the results and appended to optimization_profiles.jsonl, whose runs
+--history compares by the number of time steps.
+"""
+import contextlib
+import functools
+import json
+import optparse
+import os
+import re
+import resource
+import time
+from datetime import datetime
+import pandas as pd
+from instrument import enable_profile, peak_rss_mb, run_id, span
+
+data_dir = "../data/03_urban_energy_requirements/"
+input_dir = "../data/01_raw_input_data/"
+history_file = os.path.join(data_dir, "optimization_profiles.jsonl")
+
+# patterns of the cbc log, the first match of every value is kept
+log_patterns = [
+    r"Presolve (?P<presolve_rows>\d+) \(-?\d+\) rows, "
+    r"(?P<presolve_columns>\d+) \(-?\d+\) columns and "
+    r"(?P<presolve_elements>\d+) \(-?\d+\) elements",
+    r"(?P<rows>\d+) rows, (?P<columns>\d+) columns (?:\([^)]*\) )?and "
+    r"(?P<elements>\d+) elements",
+    r"Optimal objective\s+(?P<objective>\S+) - (?P<iterations>\d+) "
+    r"iterations time (?P<clp_seconds>[\d.]+)",
+    r"Result - (?P<result>.+)",
+    r"^(?P<result>[A-Z][\w ]*?) - objective value",
+    r"Objective value:\s+(?P<objective>\S+)",
+    r"Enumerated nodes:\s+(?P<nodes>\d+)",
+    r"Total iterations:\s+(?P<iterations>\d+)",
+    r"[Tt]ime \(CPU seconds\):\s+(?P<cpu_seconds>[\d.]+)",
+    r"\(Wallclock seconds\):\s+(?P<wallclock_seconds>[\d.]+)",
+]
+log_values = ["rows", "columns", "elements", "presolve_rows",
+              "presolve_columns", "presolve_elements", "result", "objective",
+              "iterations", "nodes", "clp_seconds", "cpu_seconds",
+              "wallclock_seconds"]
+
+
+def child_peak_rss_mb():
+    """Return the peak resident set size of the child processes in MB."""
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+
+def log_value(text):
+    """Return a value of the solver log as int, float or str object."""
+    for kind in (int, float):
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    return text.strip()
+
+
+def parse_solver_log(path):
+    """Parse the values of log_patterns from a cbc log file.
+
+    returns: dictionary with the log file, the parsed values with the
+    pattern, line number and text they were found in, and the missing
+    values.
+    """
+    parsed = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for number, line in enumerate(f, 1):
+                for pattern in log_patterns:
+                    match = re.search(pattern, line)
+                    if match is None:
+                        continue
+                    for name, value in match.groupdict().items():
+                        parsed.setdefault(name, {
+                            "value": log_value(value), "line": number,
+                            "text": line.strip(), "pattern": pattern})
+    return {"file": path, "parsed": parsed,
+            "missing": [name for name in log_values if name not in parsed]}
+
+
+def lp_size(om):
+    """Return the constraints, variables and nonzeros of a pyomo model.
+
+    Fixed variables are constants of the lp and are not counted.
+    """
+    from pyomo.core import Constraint, Var
+    from pyomo.core.expr.current import identify_variables
+    constraints = nonzeros = 0
+    for constraint in om.component_data_objects(Constraint, active=True):
+        constraints += 1
+        nonzeros += sum(1 for v in identify_variables(constraint.body,
+                                                      include_fixed=False))
+    variables = sum(1 for v in om.component_data_objects(Var)
+                    if not v.fixed)
+    fixed = sum(1 for v in om.component_data_objects(Var) if v.fixed)
+    return {"constraints": constraints, "variables": variables,
+            "fixed_variables": fixed, "nonzeros": nonzeros}
+
+
+class OptimizationProfile:
+    """Report of the phases of one optimization run."""
+
+    def __init__(self, timesteps, demand):
+        self.report = {"run": run_id, "start": datetime.now().isoformat(),
+                       "timesteps": timesteps, "demand": demand,
+                       "phases": []}
+
+    @contextlib.contextmanager
+    def phase(self, name, within=None):
+        """Measure a phase, within names the phase it is part of."""
+        rss_start = peak_rss_mb()
+        start = time.time()
+        with span("optimize." + name, rows_in=self.report["timesteps"]):
+            yield
+        peak = peak_rss_mb()
+        self.report["phases"].append({
+            "phase": name, "within": within,
+            "seconds": round(time.time() - start, 4),
+            "peak_rss_mb": round(peak, 1),
+            "peak_rss_increase_mb": round(peak - rss_start, 1)})
+
+    def timed(self, name, function, within=None):
+        """Return function measured as a phase on every call."""
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with self.phase(name, within):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def seconds(self):
+        """Return the seconds of every phase by name."""
+        return {p["phase"]: p["seconds"] for p in self.report["phases"]}
+
+
+def profile_optimize(data, demand='demand_Mode3', data_path=data_dir,
+                     input_path=input_dir, fname='om_data', threads=None):
+    """Build, solve and store the energy system of data phase by phase.
+
+    returns: the solved energy system and the profile report.
+    """
+    from pyomo.opt import SolverFactory
+    import oemof.solph as solph
+    from oemof.outputlib import processing, views
+    from optimize import oemof_power_system
+    from result_store import write_results
+    profile = OptimizationProfile(len(data), demand)
+    log_path = os.path.join(data_path, fname + '_solver.log')
+    with profile.phase("build"):
+        energysystem = oemof_power_system(data, input_path, demand)
+    with profile.phase("model"):
+        om = solph.Model(energysystem)
+    with profile.phase("lp_size"):
+        profile.report["lp"] = lp_size(om)
+
+    # the phases of the pyomo system call solver
+    opt = SolverFactory('cbc', solver_io='lp')
+    if threads:
+        opt.options['threads'] = threads
+    for name, method in [("write_lp", "_presolve"),
+                         ("solve", "_apply_solver"),
+                         ("read_solution", "_postsolve")]:
+        setattr(opt, method, profile.timed(name, getattr(opt, method),
+                                           within="pyomo_solve"))
+    with profile.phase("pyomo_solve"):
+        energysystem.results = opt.solve(om, tee=False, logfile=log_path)
+    profile.report["solver_peak_rss_mb"] = round(child_peak_rss_mb(), 1)
+
+    with profile.phase("results"):
+        energysystem.results['main'] = processing.results(om)
+        energysystem.results['meta'] = processing.meta_results(om)
+    with profile.phase("views"):
+        for node in ['electricity', 'storage']:
+            views.node(energysystem.results['main'], node)
+    path = os.path.join(data_path, fname)
+    with profile.phase("store"):
+        write_results(energysystem, path)
+
+    meta = energysystem.results['meta']
+    total = sum(p["seconds"] for p in profile.report["phases"]
+                if p["within"] is None)
+    profile.report.update({
+        "objective": meta['objective'],
+        "solver": {k: str(v) for k, v in meta['solver'].items()},
+        "solver_problem": {k: str(v) for k, v in meta['problem'].items()},
+        "solver_log": parse_solver_log(log_path),
+        "seconds": total,
+        # share of cbc in the run, the rest is oemof, pyomo and file io
+        "solve_share": profile.seconds()["solve"] / (total or 1),
+        "results": path})
+    return energysystem, profile.report
+
+
+def write_report(report, path):
+    """Write the report as json and append it to the history file."""
+    with open(path, "w") as f:
+        json.dump(report, f, indent=1, default=str)
+    with open(history_file, "a") as f:
+        f.write(json.dumps(report, default=str) + "\n")
+
+
+def read_history(path=history_file):
+    """Read the reports of all profiled runs."""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def history_table(reports):
+    """Return the phase seconds of the runs by time steps.
+
+    The microseconds per time step of every run show a phase that does not
+    scale linearly with the time horizon.
+    """
+    rows = []
+    for report in reports:
+        row = {"start": report["start"], "run": report["run"],
+               "timesteps": report["timesteps"],
+               "constraints": report["lp"]["constraints"],
+               "nonzeros": report["lp"]["nonzeros"],
+               "iterations": report["solver_log"]["parsed"].get(
+                   "iterations", {}).get("value")}
+        row.update({p["phase"]: p["seconds"] for p in report["phases"]})
+        row["seconds"] = report["seconds"]
+        row["us_per_timestep"] = 1e6 * report["seconds"] / \
+            report["timesteps"]
+        rows.append(row)
+    return pd.DataFrame(rows).sort_values(["timesteps", "start"])
+
+
+if __name__ == '__main__':
+    enable_profile()
+    parser = optparse.OptionParser()
+    parser.add_option("-d", "--demand", action="store", dest="demand",
+                      default="demand_Mode3",
+                      help="demand column of the optimization")
+    parser.add_option("-n", "--horizons", action="store", dest="horizons",
+                      default="0",
+                      help="comma separated numbers of time steps to "
+                      "profile, 0 is the full time series")
+    parser.add_option("-t", "--threads", action="store", dest="threads",
+                      type="int", default=None, help="cbc threads")
+    parser.add_option("-H", "--history", action="store_true",
+                      dest="history", default=False,
+                      help="only print the history of profiled runs")
+    (options, args) = parser.parse_args()
+
+    if not options.history:
+        from optimize_data import get_commodities
+        data = get_commodities(data_dir)
+        horizons = [int(n) for n in options.horizons.split(",") if n.strip()]
+        for n in sorted(horizons, key=lambda n: n or len(data)):
+            horizon = data.iloc[:n] if n else data
+            fname = 'om_data' if n == 0 else 'om_data_{}'.format(n)
+            energysystem, report = profile_optimize(
+                horizon, options.demand, fname=fname,
+                threads=options.threads)
+            path = os.path.join(data_dir, fname + '_profile.json')
+            write_report(report, path)
+            print("INFO: {} time steps in {:.2f} s, profile in {}".format(
+                len(horizon), report["seconds"], path))
+    reports = read_history()
+    if reports:
+        print(history_table(reports).to_string(index=False))
+    else:
+        print("INFO: no profiled runs in {}".format(history_file))
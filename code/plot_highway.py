@@ -1,17 +1,24 @@
-"""Read csv files and plot data using geopandas."""
-from shapely import wkt
+"""Read csv or GeoParquet files and plot data using geopandas.
+
+With --renderer raster the maps are rasterized per highway category
+(raster_map.py) instead of drawing every geometry, and --tiles-max-zoom
+also writes a web map tile pyramid of the roads.
+"""
+import optparse
 import pandas as pd
-from geopandas import GeoDataFrame
+from geopandas import GeoDataFrame, GeoSeries
 import matplotlib.pyplot as plt
 import seaborn as sns
+from highway_io import read_highways
+from instrument import enable_profile, span
 
 
 def highway_to_geodata(df):
     """Convert data from dataframe to geodatframe."""
-    df["polygon"] = df["geometry"].apply(wkt.loads)
-    df = GeoDataFrame(df, geometry='polygon')
-    df = df.drop(columns=["geometry"])
-    return df
+    if isinstance(df, GeoDataFrame):
+        return df
+    geometry = GeoSeries.from_wkt(df["geometry"])
+    return GeoDataFrame(df.drop(columns=["geometry"]), geometry=geometry)
 
 
 def plot_line_polygon(_data_, destination, legend_box, font_size,
@@ -88,17 +95,36 @@ def plot_polygon(df_polygon, destination, legend_box, font_size,
 
 
 if __name__ == "__main__":
+    enable_profile()
+    parser = optparse.OptionParser()
+    parser.add_option("-r", "--renderer", action="store", dest="renderer",
+                      type="choice", choices=["vector", "raster"],
+                      default="vector",
+                      help="draw every geometry or rasterize per category")
+    parser.add_option("-w", "--width", action="store", dest="width",
+                      type="int", default=2400,
+                      help="pixels of the raster maps")
+    parser.add_option("-z", "--tiles-max-zoom", action="store",
+                      dest="max_zoom", type="int", default=0,
+                      help="highest zoom of the road tiles, 0 writes none")
+    parser.add_option("-Z", "--tiles-min-zoom", action="store",
+                      dest="min_zoom", type="int", default=10,
+                      help="lowest zoom of the road tiles")
+    (options, args) = parser.parse_args()
     # input and output directories
     destination = "../data/04_Visualisation/"
     input_destination = "../data/02_urban_output_data/"
-    line_csv = input_destination+"planet_osm_line.csv"
-    point_csv = input_destination+"planet_osm_point.csv"
-    polygon_csv = input_destination+"planet_osm_polygon.csv"
-
-    # read csv files
-    df_line = pd.read_csv(line_csv, index_col=None)
-    df_point = pd.read_csv(point_csv, index_col=None)
-    df_polygon = pd.read_csv(polygon_csv, index_col=None)
+    columns = ["highway", "geometry"]
+
+    # read csv or parquet files
+    with span("plot_highway.read") as s:
+        df_line = read_highways(input_destination, "planet_osm_line",
+                                columns)
+        df_point = read_highways(input_destination, "planet_osm_point",
+                                 columns)
+        df_polygon = read_highways(input_destination, "planet_osm_polygon",
+                                   columns)
+        s.rows_out = len(df_line) + len(df_point) + len(df_polygon)
 
     # Merge all csv files
     # _data_all = pd.concat([df_line.loc[:, ["highway", "polygon"]],
@@ -106,8 +132,8 @@ if __name__ == "__main__":
     #                        df_polygon.loc[:, ["highway", "polygon"]]])
 
     # Merge line and polygon data
-    _data_ = pd.concat([df_line.loc[:, ["highway", "geometry"]],
-                        df_polygon.loc[:, ["highway", "geometry"]]])
+    _data_ = GeoDataFrame(pd.concat([df_line, df_polygon]),
+                          geometry="geometry", crs=df_line.crs)
 
     sns.set_style("dark")
     sns.set_context("notebook", font_scale=0.8, rc={"lines.linewidth": 1.5})
@@ -115,8 +141,36 @@ if __name__ == "__main__":
     font_size = 15
     fig_size = (8, 5)
     face_color = "whitesmoke"
-
-    plot_point(df_point, destination, legend_box, font_size,
-               fig_size, face_color)
-    plot_line_polygon(_data_, destination, legend_box, font_size,
-                      fig_size, face_color)
+    if options.renderer == "raster" or options.max_zoom:
+        # pygeos is only needed for the raster maps and the tiles
+        from raster_map import TilePyramid, render_map
+
+    with span("plot_highway.points", rows_in=len(df_point)) as s:
+        if options.renderer == "raster":
+            render_map(df_point, destination+"points.png",
+                       "Street light infrastructure in Berlin", legend_box,
+                       font_size, fig_size, face_color, "Accent",
+                       options.width)
+        else:
+            plot_point(df_point, destination, legend_box, font_size,
+                       fig_size, face_color)
+        s.add_output(destination+"points.png")
+    with span("plot_highway.roads", rows_in=len(_data_)) as s:
+        if options.renderer == "raster":
+            render_map(_data_, destination+"roads.png",
+                       "Road infrastructure in Berlin", legend_box,
+                       font_size, fig_size, face_color, "tab20",
+                       options.width)
+        else:
+            plot_line_polygon(_data_, destination, legend_box, font_size,
+                              fig_size, face_color)
+        s.add_output(destination+"roads.png")
+    if options.max_zoom:
+        with span("plot_highway.tiles", rows_in=len(_data_)) as s:
+            tiles = TilePyramid(_data_, destination+"tiles/",
+                                options.min_zoom, options.max_zoom,
+                                face_color=face_color)
+            s.rows_out = tiles.build()
+            s.add_output(destination+"tiles/")
+        print("INFO: {} road tiles of zoom {} to {} in {}tiles/".format(
+            tiles.written, options.min_zoom, options.max_zoom, destination))
@@ -0,0 +1,378 @@
+"""Raster rendering of the highway maps and their tile pyramid.
+
+Instead of one matplotlib artist per geometry, the geometries of every
+highway category are counted straight into a pixel grid (numpy bincount):
+lines and polygon outlines are sampled at one point per pixel along each
+segment, polygons are filled by scanlines through the pixel centres and
+points count at their pixel. The geometries are
+simplified to half a pixel before, so the work grows with the drawn pixels
+and not with the vertices. Every pixel takes the colour of its most
+frequent category, shaded by its total count.
+
+The tile pyramid uses the web map tiles (z/x/y.png, 256 pixels, EPSG:3857
+like the highway tables). Only the tiles of the highest zoom level are
+rasterized, every lower tile sums the category counts of its four children
+in 2x2 blocks, so all levels are rendered in one pass over the highest
+level.
+"""
+import json
+import os
+import numpy as np
+import pandas as pd
+import pygeos
+import matplotlib.pyplot as plt
+from matplotlib.colors import to_rgb
+from matplotlib.patches import Patch
+
+# half width of the EPSG:3857 world and pixels of a web map tile
+world = 20037508.342789244
+tile_pixels = 256
+
+
+class Canvas:
+    """Pixel grid of a map extent, row 0 at the top.
+
+    bounds: tuple (minx, miny, maxx, maxy) in the units of the geometries.
+    pixel: float, pixel size in the units of the geometries.
+    """
+
+    def __init__(self, bounds, pixel):
+        self.minx, self.miny, self.maxx, self.maxy = bounds
+        self.pixel = pixel
+        # a whole number of pixels, whatever the rounding of the bounds
+        self.width = max(int(np.ceil((self.maxx - self.minx) / pixel -
+                                     1e-6)), 1)
+        self.height = max(int(np.ceil((self.maxy - self.miny) / pixel -
+                                      1e-6)), 1)
+
+    @classmethod
+    def from_width(cls, bounds, width):
+        """Return the canvas of bounds that is width pixels wide."""
+        size = max(bounds[2] - bounds[0], bounds[3] - bounds[1], 1e-9)
+        return cls(bounds, size / width)
+
+    def box(self):
+        """Return the extent of the canvas as a pygeos polygon."""
+        return pygeos.box(self.minx, self.miny, self.maxx, self.maxy)
+
+    def pixel_index(self, xy):
+        """Return the flat pixel index of coordinates inside the canvas."""
+        col = np.floor((xy[:, 0] - self.minx) / self.pixel).astype(np.int64)
+        row = np.floor((self.maxy - xy[:, 1]) / self.pixel).astype(np.int64)
+        inside = (col >= 0) & (col < self.width) & (row >= 0) & \
+            (row < self.height)
+        return row[inside] * self.width + col[inside]
+
+
+def geometry_array(geometry):
+    """Return the geometries of a GeoSeries as pygeos array."""
+    return pygeos.from_wkb(np.asarray(geometry.to_wkb()))
+
+
+def line_pixels(lines, canvas):
+    """Return the pixels of lines, one sample per pixel along each segment.
+
+    lines: pygeos array of (multi)linestrings.
+    """
+    parts = pygeos.get_parts(lines)
+    coords = pygeos.get_coordinates(parts)
+    if len(coords) < 2:
+        return np.empty(0, dtype=np.int64)
+    part = np.repeat(np.arange(len(parts)),
+                     pygeos.get_num_coordinates(parts))
+    same = part[1:] == part[:-1]
+    start = coords[:-1][same]
+    delta = coords[1:][same] - start
+    steps = np.ceil(np.abs(delta).max(axis=1) / canvas.pixel).astype(
+        np.int64) + 1
+    segment = np.repeat(np.arange(len(start)), steps)
+    first = np.repeat(np.cumsum(steps) - steps, steps)
+    fraction = (np.arange(len(segment)) - first) / \
+        np.repeat(np.maximum(steps - 1, 1), steps)
+    return canvas.pixel_index(start[segment] +
+                              delta[segment] * fraction[:, None])
+
+
+def polygon_pixels(polygons, canvas):
+    """Return the pixels of the outline and the filled inside of polygons.
+
+    The inside is filled by scanlines through the pixel centres of every
+    row: the crossings of a row with the rings of a polygon are sorted and
+    the pixels between every pair of crossings (even-odd rule, so holes
+    stay empty) are filled, for all polygons at once.
+    """
+    boundaries = pygeos.boundary(polygons)
+    rings = pygeos.get_parts(boundaries)
+    polygon = np.repeat(np.arange(len(polygons)),
+                        pygeos.get_num_geometries(boundaries))
+    coords = pygeos.get_coordinates(rings)
+    pixels = line_pixels(rings, canvas)
+    if len(coords) < 2:
+        return pixels
+    ring = np.repeat(np.arange(len(rings)), pygeos.get_num_coordinates(rings))
+    same = ring[1:] == ring[:-1]
+    # edges in pixel units, y is the row and grows downwards
+    x = (coords[:, 0] - canvas.minx) / canvas.pixel
+    y = (canvas.maxy - coords[:, 1]) / canvas.pixel
+    x0, y0, x1, y1 = x[:-1][same], y[:-1][same], x[1:][same], y[1:][same]
+    owner = polygon[ring[:-1][same]]
+    # rows whose centre is in [min y, max y) of the edge
+    first = np.clip(np.ceil(np.minimum(y0, y1) - 0.5), 0, canvas.height)
+    last = np.clip(np.ceil(np.maximum(y0, y1) - 0.5), 0, canvas.height)
+    rows = (last - first).astype(np.int64)
+    edge = np.repeat(np.arange(len(x0)), rows)
+    row = first[edge] + np.arange(len(edge)) - \
+        np.repeat(np.cumsum(rows) - rows, rows)
+    cross = x0[edge] + (row + 0.5 - y0[edge]) * (x1 - x0)[edge] / \
+        (y1 - y0)[edge]
+    order = np.lexsort((cross, row, owner[edge]))
+    row, cross = row[order], cross[order]
+    # sorted crossings pair up within every polygon and row
+    start = np.clip(np.ceil(cross[0::2] - 0.5), 0, canvas.width)
+    end = np.clip(np.ceil(cross[1::2] - 0.5), 0, canvas.width)
+    width = (end - start).astype(np.int64)
+    span = np.repeat(np.arange(len(start)), width)
+    col = start[span] + np.arange(len(span)) - \
+        np.repeat(np.cumsum(width) - width, width)
+    fill = row[0::2][span].astype(np.int64) * canvas.width + \
+        col.astype(np.int64)
+    return np.concatenate([pixels, fill])
+
+
+def geometry_pixels(geometries, canvas):
+    """Return the pixels of points, lines and polygons of any type."""
+    kind = pygeos.get_type_id(geometries)
+    if (kind == 7).any():
+        # geometry collections, e.g. of clipping, are drawn by their parts
+        geometries = np.concatenate([geometries[kind != 7], pygeos.get_parts(
+            geometries[kind == 7])])
+        kind = pygeos.get_type_id(geometries)
+    # 0 point, 4 multipoint; 1, 2 and 5 lines; 3 and 6 polygons
+    pixels = [canvas.pixel_index(pygeos.get_coordinates(
+                  geometries[(kind == 0) | (kind == 4)])),
+              line_pixels(geometries[(kind == 1) | (kind == 2) |
+                                     (kind == 5)], canvas),
+              polygon_pixels(geometries[(kind == 3) | (kind == 6)], canvas)]
+    return np.concatenate(pixels)
+
+
+def simplify(geometries, codes, pixel):
+    """Simplify geometries to half a pixel, empty results are dropped.
+
+    returns: the simplified geometries and their category codes.
+    """
+    simple = pygeos.simplify(geometries, pixel / 2)
+    keep = ~pygeos.is_empty(simple)
+    return simple[keep], codes[keep]
+
+
+def total_bounds(geometries):
+    """Return the bounds (minx, miny, maxx, maxy) of all geometries."""
+    bounds = pygeos.bounds(geometries)
+    return (np.nanmin(bounds[:, 0]), np.nanmin(bounds[:, 1]),
+            np.nanmax(bounds[:, 2]), np.nanmax(bounds[:, 3]))
+
+
+def category_counts(codes, geometries, canvas, n_categories):
+    """Count the geometries of every category per pixel.
+
+    codes: array, category of every geometry.
+    returns: array (categories x height x width) of counts.
+    """
+    counts = np.zeros((n_categories, canvas.height * canvas.width),
+                      dtype=np.uint32)
+    for code in np.unique(codes):
+        pixels = geometry_pixels(geometries[codes == code], canvas)
+        counts[code] = np.bincount(pixels, minlength=counts.shape[1])
+    return counts.reshape(n_categories, canvas.height, canvas.width)
+
+
+def dominant_category(codes, geometries, canvas):
+    """Return the most frequent category and total count of every pixel.
+
+    The categories are counted one at a time, so only three pixel arrays
+    are held whatever the number of categories.
+    """
+    size = canvas.height * canvas.width
+    best = np.full(size, -1, dtype=np.int16)
+    best_count = np.zeros(size, dtype=np.uint32)
+    total = np.zeros(size, dtype=np.uint32)
+    for code in np.unique(codes):
+        count = np.bincount(geometry_pixels(geometries[codes == code],
+                                            canvas), minlength=size)
+        more = count > best_count
+        best[more] = code
+        best_count[more] = count[more]
+        total += count.astype(np.uint32)
+    shape = (canvas.height, canvas.width)
+    return best.reshape(shape), total.reshape(shape)
+
+
+def colorize(best, total, colors, face_color):
+    """Return the rgba image of the dominant categories on face_color.
+
+    Pixels are shaded from the face colour to the category colour by the
+    logarithm of their total count.
+    """
+    image = np.empty(best.shape + (4,))
+    image[:] = to_rgb(face_color) + (1,)
+    drawn = best >= 0
+    shade = np.log1p(total[drawn]) / np.log1p(max(total.max(), 1))
+    shade = (0.4 + 0.6 * shade)[:, None]
+    image[drawn, :3] = shade * colors[best[drawn]] + \
+        (1 - shade) * image[drawn, :3]
+    return image
+
+
+def category_colors(categories, cmap):
+    """Return the rgb colour of every category from a colormap."""
+    colormap = plt.get_cmap(cmap)
+    return np.array([colormap(i % colormap.N)[:3]
+                     for i in range(len(categories))])
+
+
+def categories_of(geodata, column="highway"):
+    """Return the sorted categories and the category code of every row."""
+    codes, categories = pd.factorize(geodata[column].fillna("unknown"),
+                                     sort=True)
+    return list(categories), codes
+
+
+def render_map(geodata, path, title, legend_box, font_size, fig_size,
+               face_color, cmap="tab20", width=2400, column="highway"):
+    """Render the geometries of geodata by category as one raster image.
+
+    width: int, pixels of the raster along the longer side of the extent.
+    """
+    categories, codes = categories_of(geodata, column)
+    geometries = geometry_array(geodata.geometry)
+    canvas = Canvas.from_width(total_bounds(geometries), width)
+    geometries, codes = simplify(geometries, codes, canvas.pixel)
+    best, total = dominant_category(codes, geometries, canvas)
+    colors = category_colors(categories, cmap)
+
+    fig, ax = plt.subplots(1, figsize=fig_size, facecolor=face_color)
+    ax.imshow(colorize(best, total, colors, face_color),
+              extent=(canvas.minx, canvas.minx + canvas.width * canvas.pixel,
+                      canvas.maxy - canvas.height * canvas.pixel,
+                      canvas.maxy), interpolation="nearest")
+    handles = [Patch(color=colors[i], label=c)
+               for i, c in enumerate(categories)]
+    leg = ax.legend(handles=handles, title=column)
+    leg.set_bbox_to_anchor(legend_box)
+    plt.title(title, fontsize=font_size)
+    plt.axis("off")
+    # one image pixel per raster pixel
+    plt.savefig(path, facecolor=fig.get_facecolor(),
+                dpi=max(width / fig_size[0], 72))
+    plt.close(fig)
+    return canvas
+
+
+def tile_bounds(z, x, y):
+    """Return the EPSG:3857 bounds of the web map tile z/x/y."""
+    size = 2 * world / 2 ** z
+    return (-world + x * size, world - (y + 1) * size,
+            -world + (x + 1) * size, world - y * size)
+
+
+def tile_range(bounds, z):
+    """Return the x and y range of the tiles of zoom z covering bounds."""
+    size = 2 * world / 2 ** z
+    last = 2 ** z - 1
+
+    def index(value):
+        return min(max(int(np.floor(value / size)), 0), last)
+    return (range(index(bounds[0] + world), index(bounds[2] + world) + 1),
+            range(index(world - bounds[3]), index(world - bounds[1]) + 1))
+
+
+class TilePyramid:
+    """Tiles of the geometries of a geodataframe from min to max zoom.
+
+    folder: str object, tiles are written to folder/z/x/y.png.
+    """
+
+    def __init__(self, geodata, folder, min_zoom, max_zoom, cmap="tab20",
+                 face_color="whitesmoke", column="highway"):
+        self.folder = folder
+        self.min_zoom, self.max_zoom = min_zoom, max_zoom
+        self.face_color = face_color
+        self.categories, codes = categories_of(geodata, column)
+        self.colors = category_colors(self.categories, cmap)
+        geometries = geometry_array(geodata.geometry)
+        self.bounds = total_bounds(geometries)
+        # simplified once to half a pixel of the highest zoom
+        self.geometries, self.codes = simplify(
+            geometries, codes, 2 * world / 2 ** max_zoom / tile_pixels)
+        self.tree = pygeos.STRtree(self.geometries)
+        self.written = 0
+
+    def rasterize(self, z, x, y):
+        """Return the category counts of a tile of the highest zoom."""
+        canvas = Canvas(tile_bounds(z, x, y),
+                        2 * world / 2 ** z / tile_pixels)
+        rows = self.tree.query(canvas.box())
+        if len(rows) == 0:
+            return None
+        # a pixel of margin, so clipped lines end outside the tile
+        margin = pygeos.box(canvas.minx - canvas.pixel,
+                            canvas.miny - canvas.pixel,
+                            canvas.maxx + canvas.pixel,
+                            canvas.maxy + canvas.pixel)
+        geometries = pygeos.intersection(self.geometries[rows], margin)
+        keep = ~pygeos.is_empty(geometries)
+        return category_counts(self.codes[rows][keep], geometries[keep],
+                               canvas, len(self.categories))
+
+    def render(self, z, x, y):
+        """Write tile z/x/y and its children, return its category counts."""
+        if z == self.max_zoom:
+            counts = self.rasterize(z, x, y)
+        elif len(self.tree.query(pygeos.box(*tile_bounds(z, x, y)))) == 0:
+            counts = None
+        else:
+            half = tile_pixels // 2
+            counts = np.zeros((len(self.categories), tile_pixels,
+                               tile_pixels), dtype=np.uint32)
+            for dx in (0, 1):
+                for dy in (0, 1):
+                    child = self.render(z + 1, 2 * x + dx, 2 * y + dy)
+                    if child is None:
+                        continue
+                    # sum of 2x2 blocks of the child pixels
+                    counts[:, dy * half:(dy + 1) * half,
+                           dx * half:(dx + 1) * half] = child.reshape(
+                        len(self.categories), half, 2, half, 2).sum(
+                        axis=(2, 4))
+        if counts is None or not counts.any():
+            return None
+        self.write(z, x, y, counts)
+        return counts
+
+    def write(self, z, x, y, counts):
+        """Write the png of a tile from its category counts."""
+        total = counts.sum(axis=0)
+        best = np.where(total > 0, counts.argmax(axis=0), -1)
+        image = colorize(best, total, self.colors, self.face_color)
+        image[best < 0, 3] = 0
+        folder = os.path.join(self.folder, str(z), str(x))
+        os.makedirs(folder, exist_ok=True)
+        plt.imsave(os.path.join(folder, "{}.png".format(y)), image)
+        self.written += 1
+
+    def build(self):
+        """Render all tiles covering the geometries, returns the count."""
+        xs, ys = tile_range(self.bounds, self.min_zoom)
+        for x in xs:
+            for y in ys:
+                self.render(self.min_zoom, x, y)
+        with open(os.path.join(self.folder, "tiles.json"), "w") as f:
+            json.dump({"tiles": "{z}/{x}/{y}.png",
+                       "minzoom": self.min_zoom, "maxzoom": self.max_zoom,
+                       "bounds": [float(b) for b in self.bounds],
+                       "crs": "EPSG:3857",
+                       "legend": {c: [float(v) for v in self.colors[i]]
+                                  for i, c in enumerate(self.categories)}},
+                      f, indent=1)
+        return self.written
@@ -0,0 +1,152 @@
+"""Columnar store of the optimization results.
+
+The results of a solved energy system are written to a folder instead of
+pickling the whole energy system:
+
+    sequences.parquet  time and one float64 column per sequence, named
+                       source|target|variable (flow, storage_content, ...)
+    scalars.parquet    source, target, variable and value of the scalar
+                       results (e.g. invest)
+    meta.json          results['meta'], objective, problem and solver
+
+The sequences are written in row groups of a month of hourly steps, so a
+reader only reads the columns of one node or variable and only the row
+groups of a time slice. The time is stored as naive UTC, so the stores of
+the oemof and HiGHS backends (tz-aware index of the commodities) are
+alike. Nodal results (storage_content) have the target None, like the
+string keys of oemof.outputlib.
+"""
+import json
+import os
+import shutil
+import tempfile
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+separator = "|"
+row_group_size = 744
+
+
+def label(node):
+    """Return the string label of a node of a result key."""
+    return str(getattr(node, "label", node))
+
+
+def column_name(key):
+    """Return the column of a (source, target, variable) key."""
+    return separator.join(key)
+
+
+def result_frames(results):
+    """Return the sequences and scalars of results['main'] as two frames.
+
+    results: dict, results['main'] of oemof.outputlib.processing.results.
+    returns: sequences (time x source|target|variable) and the scalars
+    (source, target, variable, value).
+    """
+    sequences = {}
+    scalars = []
+    for (source, target), result in results.items():
+        node = (label(source), label(target))
+        for variable, values in result["sequences"].items():
+            sequences[column_name(node + (str(variable),))] = values
+        for variable, value in result["scalars"].items():
+            scalars.append(node + (str(variable), float(value)))
+    sequences = pd.DataFrame(sequences).astype(float)
+    scalars = pd.DataFrame(scalars, columns=["source", "target", "variable",
+                                             "value"])
+    return sequences, scalars
+
+
+def write_results(energysystem, folder):
+    """Write the main and meta results of a solved energy system to folder.
+
+    The files are written to a temporary folder next to folder and renamed
+    at once, an existing folder is replaced.
+    """
+    parent = os.path.dirname(os.path.normpath(folder)) or "."
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent)
+    sequences, scalars = result_frames(energysystem.results["main"])
+    index = pd.DatetimeIndex(sequences.index, name="time")
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    sequences.index = index
+    pq.write_table(pa.Table.from_pandas(sequences.reset_index(),
+                                        preserve_index=False),
+                   os.path.join(tmp, "sequences.parquet"),
+                   row_group_size=row_group_size)
+    pq.write_table(pa.Table.from_pandas(scalars, preserve_index=False),
+                   os.path.join(tmp, "scalars.parquet"))
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(energysystem.results["meta"], f, indent=1, default=str)
+    if os.path.exists(folder):
+        shutil.rmtree(folder)
+    os.rename(tmp, folder)
+
+
+def read_meta(folder):
+    """Return the meta results (objective, problem, solver) of folder."""
+    with open(os.path.join(folder, "meta.json")) as f:
+        return json.load(f)
+
+
+def sequence_keys(folder):
+    """Return the (source, target, variable) of every stored sequence.
+
+    Only the parquet schema is read.
+    """
+    names = pq.read_schema(os.path.join(folder, "sequences.parquet")).names
+    return [tuple(name.split(separator)) for name in names if name != "time"]
+
+
+def time_bound(value, tz):
+    """Return value as timestamp comparable with a time column of tz.
+
+    tz: str object, time zone of the stored time column, None for naive.
+    """
+    value = pd.Timestamp(value)
+    if tz is not None and value.tz is None:
+        return value.tz_localize(tz)
+    if tz is None and value.tz is not None:
+        return value.tz_convert("UTC").tz_localize(None)
+    return value
+
+
+def read_sequences(folder, node=None, variable=None, start=None, end=None):
+    """Read the sequences of one node, variable or time slice.
+
+    node: str object, label of the source or target of the sequences.
+    variable: str object, e.g. flow or storage_content.
+    start, end: first and last time step, both included.
+    returns: dataframe indexed by time with the columns source, target and
+    variable.
+    """
+    keys = [key for key in sequence_keys(folder)
+            if (node is None or node in key[:2]) and
+            (variable is None or key[2] == variable)]
+    path = os.path.join(folder, "sequences.parquet")
+    tz = pq.read_schema(path).field("time").type.tz
+    filters = []
+    if start is not None:
+        filters.append(("time", ">=", time_bound(start, tz)))
+    if end is not None:
+        filters.append(("time", "<=", time_bound(end, tz)))
+    table = pq.read_table(path, columns=["time"] + [column_name(key)
+                                                    for key in keys],
+                          filters=filters or None)
+    frame = table.to_pandas().set_index("time")
+    frame.columns = pd.MultiIndex.from_tuples(
+        keys, names=["source", "target", "variable"])
+    return frame
+
+
+def read_scalars(folder, node=None):
+    """Read the scalar results, optionally only those of one node."""
+    scalars = pq.read_table(os.path.join(folder, "scalars.parquet"))
+    scalars = scalars.to_pandas()
+    if node is not None:
+        scalars = scalars[(scalars["source"] == node) |
+                          (scalars["target"] == node)]
+    return scalars.set_index(["source", "target", "variable"])["value"]
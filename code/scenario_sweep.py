@@ -0,0 +1,200 @@
+"""Sweep of street light scenarios as one batched matrix product.
+
+The street light load is linear in road area x profile, so every scenario is
+fully described by the area operated with SB1 and with SB2. A scenario is
+a combination of an electricity usage index, an assignment of the road
+categories to the profiles (SB1, SB2 or off) and a dimming factor of each
+category. The road areas are summed per category once, the effective
+(variants x 2) area matrix of all combinations is one einsum and the loads
+of all variants are one matrix product with the (2 x timesteps) profiles,
+computed in blocks of variants. Annual energy and peak load are returned
+per variant, full profiles only for the requested variants.
+"""
+import logging
+import optparse
+import os
+import numpy as np
+import pandas as pd
+from highway_io import read_highways
+from instrument import enable_profile, span
+from street_scenarios import main_roads, simulateStreetLight
+
+# profile names of an assignment, the rows of simulateStreetLight.profiles
+profile_names = ["SB1", "SB2"]
+# category of the highway polygons (squares)
+squares = "squares"
+
+
+def category_areas(input_path2="../data/02_urban_output_data/"):
+    """Return the road area in m2 per highway category.
+
+    The lines are summed by their highway tag, all polygons form the
+    category squares like in simulateStreetLight.simulateLoadAllRoad.
+    """
+    lines = read_highways(input_path2, "planet_osm_line",
+                          columns=["highway", "area"])
+    polygons = read_highways(input_path2, "planet_osm_polygon",
+                             columns=["area"])
+    areas = lines.groupby("highway")["area"].sum()
+    areas[squares] = polygons["area"].sum()
+    return areas
+
+
+def mode_assignments(categories):
+    """Return the category to profile assignments of Mode1, Mode2, Mode3."""
+    mode3 = {c: "SB2" if c in main_roads or c == squares else "SB1"
+             for c in categories}
+    return pd.DataFrame({"Mode1": {c: "SB2" for c in categories},
+                         "Mode2": {c: "SB1" for c in categories},
+                         "Mode3": mode3}).T[list(categories)]
+
+
+def assignment_matrix(assignments):
+    """Return the one-hot (assignments x categories x profiles) array.
+
+    assignments: dataframe (assignments x categories) of profile names,
+    "off" or a missing value switches the category off.
+    """
+    values = assignments.fillna("off").values
+    unknown = set(values.ravel()) - set(profile_names) - {"off"}
+    if unknown:
+        raise ValueError("unknown profiles {}".format(sorted(unknown)))
+    return np.stack([values == name for name in profile_names],
+                    axis=-1).astype(float)
+
+
+def effective_areas(areas, assignments, dimming):
+    """Return the area operated with each profile in every variant.
+
+    areas: series, area per category.
+    assignments: dataframe (assignments x categories) of profile names.
+    dimming: array (dimmings,) of factors of all categories or array
+    (dimmings x categories) of factors per category.
+    returns: array (assignments x dimmings x profiles).
+    """
+    onehot = assignment_matrix(assignments[list(areas.index)])
+    dimming = np.asarray(dimming, dtype=float)
+    if dimming.ndim == 1:
+        dimming = np.repeat(dimming[:, None], len(areas), axis=1)
+    weights = dimming * areas.values
+    return np.einsum("acp,dc->adp", onehot, weights)
+
+
+def sweep(areas, profiles, timestamp, x_sl, assignments, dimming=(1.0,),
+          block=4096):
+    """Evaluate all combinations of usage index, assignment and dimming.
+
+    areas: series, area per category, see category_areas.
+    profiles: array (2 x timesteps), SB1 and SB2 profiles in KW.
+    timestamp: datetime index of the profiles.
+    x_sl: array of electricity usage indices.
+    assignments: dataframe (assignments x categories) of profile names.
+    dimming: array of dimming factors, see effective_areas, the result
+    holds the factor or, for factors per category, the row of dimming.
+    block: int, variants per matrix product.
+    returns: dataframe with one row per variant and its annual energy
+    (KWh), peak load (KW) and time of the peak.
+    """
+    x_sl = np.asarray(x_sl, dtype=float)
+    dimming = np.asarray(dimming, dtype=float)
+    area = effective_areas(areas, assignments, dimming).reshape(-1, 2)
+    # the usage index only scales the load, so the product is computed
+    # once per assignment and dimming
+    energy = np.empty(len(area))
+    peak = np.empty(len(area))
+    peak_index = np.empty(len(area), dtype=int)
+    for first in range(0, len(area), block):
+        load = area[first:first + block] @ profiles
+        energy[first:first + block] = load.sum(axis=1)
+        peak_index[first:first + block] = load.argmax(axis=1)
+        peak[first:first + block] = load.max(axis=1)
+
+    n_dimming = len(dimming)
+    x, a, d = (i.ravel() for i in np.indices(
+        (len(x_sl), len(assignments), n_dimming)))
+    variant = a * n_dimming + d
+    return pd.DataFrame({
+        "x_sl": x_sl[x],
+        "assignment": np.asarray(assignments.index)[a],
+        "dimming": dimming[d] if dimming.ndim == 1 else d,
+        "area_SB1": area[variant, 0], "area_SB2": area[variant, 1],
+        "energy": x_sl[x] * energy[variant],
+        "peak": x_sl[x] * peak[variant],
+        "peak_time": np.asarray(timestamp)[peak_index[variant]]})
+
+
+def sweep_profiles(result, profiles, timestamp, variants):
+    """Return the full load profiles (timesteps x variants) in KW.
+
+    result: dataframe of sweep.
+    variants: list of row labels of result.
+    """
+    rows = result.loc[variants]
+    load = rows[["area_SB1", "area_SB2"]].values @ profiles * \
+        rows["x_sl"].values[:, None]
+    return pd.DataFrame(load.T, index=pd.DatetimeIndex(timestamp,
+                                                       name="TIME"),
+                        columns=list(variants))
+
+
+def read_assignments(path, categories):
+    """Read assignments (one row per assignment, one column per category).
+
+    Categories missing in the file follow SB1.
+    """
+    assignments = pd.read_csv(path, index_col=0)
+    for category in categories:
+        if category not in assignments:
+            assignments[category] = "SB1"
+    return assignments
+
+
+def parse_values(text):
+    """Return the floats of a comma separated list."""
+    return [float(v) for v in text.split(",") if v.strip()]
+
+
+if __name__ == "__main__":
+    enable_profile()
+    parser = optparse.OptionParser()
+    parser.add_option("-x", "--x-sl", action="store", dest="x_sl",
+                      default="0.01464",
+                      help="comma separated electricity usage indices")
+    parser.add_option("-a", "--assignments", action="store",
+                      dest="assignments", default=None,
+                      help="csv of category to profile assignments, "
+                      "default Mode1, Mode2 and Mode3")
+    parser.add_option("-D", "--dimming", action="store", dest="dimming",
+                      default="1.0", help="comma separated dimming factors")
+    parser.add_option("-p", "--profiles", action="store", dest="profiles",
+                      type="int", default=0,
+                      help="write the profiles of the n highest peaks")
+    (options, args) = parser.parse_args()
+
+    simulation = simulateStreetLight()
+    simulation.config()
+    logging.info("scenario sweep.")
+    with span("scenario_sweep") as s:
+        simulation.get_standardLoad()
+        simulation.electricityUsageIndex()
+        areas = category_areas(simulation.input_path2)
+        if options.assignments:
+            assignments = read_assignments(options.assignments, areas.index)
+        else:
+            assignments = mode_assignments(areas.index)
+        result = sweep(areas, simulation.profiles, simulation.timestamp,
+                       parse_values(options.x_sl), assignments,
+                       parse_values(options.dimming))
+        path = os.path.join(simulation.output_path, "scenario_sweep.csv")
+        result.to_csv(path, index_label="variant")
+        s.rows_out = len(result)
+        s.add_output(path)
+        if options.profiles:
+            variants = result["peak"].nlargest(options.profiles).index
+            profiles_path = os.path.join(simulation.output_path,
+                                         "scenario_sweep_profiles.csv")
+            sweep_profiles(result, simulation.profiles,
+                           simulation.timestamp, variants).to_csv(
+                               profiles_path, sep=";")
+            s.add_output(profiles_path)
+    print("INFO: {} scenarios written to {}".format(len(result), path))
@@ -0,0 +1,236 @@
+"""Street light load of every road segment as a chunked array store.
+
+The load of each osm_id of the line and polygon tables is its area times the
+electricity usage index times the SB1 or SB2 profile of its lighting mode.
+The (segments x timesteps) matrix is computed chunk by chunk and written to
+a compressed zarr store next to streetlight_load.csv, together with the
+osm_id, table, highway category, district and area of every segment.
+Aggregations by category, district or time window read the store chunk by
+chunk, so the dense matrix is never held in memory.
+"""
+import logging
+import optparse
+import os
+import numpy as np
+import pandas as pd
+import zarr
+from numcodecs import Blosc
+from highway_io import read_highways
+from instrument import enable_profile, span
+from street_scenarios import main_roads, simulateStreetLight
+
+store_name = "segment_load.zarr"
+tables = ["planet_osm_line", "planet_osm_polygon"]
+# profile row of the lighting modes, 0 = SB1 and 1 = SB2
+SB1, SB2 = 0, 1
+
+
+def segment_profiles(segments, mode="Mode3"):
+    """Return the profile row (SB1 or SB2) of every segment in a mode.
+
+    Mode1 runs all segments on SB2, Mode2 on SB1, Mode3 runs the main roads
+    and the squares (polygons) on SB2 and the other lines on SB1, like
+    simulateStreetLight.simulateLoadAllRoad.
+    """
+    if mode == "Mode1":
+        return np.full(len(segments), SB2, dtype=np.int8)
+    if mode == "Mode2":
+        return np.full(len(segments), SB1, dtype=np.int8)
+    if mode == "Mode3":
+        all_night = (segments["table"] == "planet_osm_polygon") | \
+            segments["highway"].isin(main_roads)
+        return np.where(all_night, SB2, SB1).astype(np.int8)
+    raise ValueError("unknown lighting mode {}".format(mode))
+
+
+def read_segments(folder, districts=None, district_column="name"):
+    """Read osm_id, table, highway category and area of all segments.
+
+    districts: str object, optional file of district polygons, each segment
+    is assigned to the district containing its representative point.
+    district_column: str object, district name column of the file.
+    """
+    columns = ["highway", "osm_id", "area"]
+    if districts:
+        columns.append("geometry")
+    frames = []
+    for table in tables:
+        frame = read_highways(folder, table, columns)
+        if frame.index.name is not None:
+            frame = frame.reset_index()
+        frames.append(frame.assign(table=table))
+    segments = pd.concat(frames, ignore_index=True)
+    segments["district"] = "all"
+    if districts:
+        import geopandas as gpd
+        areas = gpd.read_file(districts).to_crs(frames[0].crs)
+        points = gpd.GeoSeries(segments["geometry"],
+                               crs=areas.crs).representative_point()
+        segments["district"] = "outside"
+        for name, polygon in zip(areas[district_column], areas.geometry):
+            segments.loc[points.within(polygon).values, "district"] = \
+                str(name)
+        segments = segments.drop(columns=["geometry"])
+    return segments
+
+
+def build_segment_load(input_path2="../data/02_urban_output_data/",
+                       output_path="../data/03_urban_energy_requirements/",
+                       mode="Mode3", chunk_segments=2000, chunk_time=744,
+                       districts=None, district_column="name"):
+    """Compute the per-segment load chunk by chunk and write the store.
+
+    Only chunk_segments rows of the load matrix are held in memory.
+    returns: path of the zarr store.
+    """
+    simulation = simulateStreetLight()
+    simulation.config(input_path2=input_path2, output_path=output_path)
+    simulation.get_standardLoad()
+    simulation.electricityUsageIndex()
+    profiles = simulation.profiles.astype(np.float32)
+
+    segments = read_segments(input_path2, districts, district_column)
+    profile = segment_profiles(segments, mode)
+    weight = (segments["area"].values * simulation.x_sl).astype(np.float32)
+    n_segments, n_time = len(segments), profiles.shape[1]
+
+    path = os.path.join(output_path, store_name)
+    root = zarr.open_group(path, mode="w")
+    compressor = Blosc(cname="zstd", clevel=3, shuffle=Blosc.BITSHUFFLE)
+    load = root.create_dataset(
+        "load", shape=(n_segments, n_time), dtype="f4",
+        chunks=(chunk_segments, min(chunk_time, n_time)),
+        compressor=compressor)
+    root["time"] = simulation.timestamp.values.astype("datetime64[ns]") \
+        .view(np.int64)
+    root["osm_id"] = segments["osm_id"].values.astype(np.int64)
+    root["area"] = segments["area"].values.astype(np.float32)
+    root["profile"] = profile
+    # categorical columns as codes, the labels are kept in the attributes
+    for column in ["table", "highway", "district"]:
+        codes, labels = pd.factorize(segments[column].astype(str))
+        root[column] = codes.astype(np.int32)
+        root.attrs[column] = list(labels)
+    root.attrs.update({"mode": mode, "x_sl": simulation.x_sl,
+                       "unit": "KW"})
+
+    for start in range(0, n_segments, chunk_segments):
+        end = min(start + chunk_segments, n_segments)
+        load[start:end] = weight[start:end, None] * \
+            profiles[profile[start:end]]
+    logging.info("per segment load of {} segments written to {}.".format(
+        n_segments, path))
+    return path
+
+
+def time_slice(root, start=None, end=None):
+    """Return the time index and the column slice of a time window."""
+    time = pd.DatetimeIndex(root["time"][:].view("datetime64[ns]"))
+    first = 0 if start is None else time.searchsorted(pd.Timestamp(start))
+    last = len(time) if end is None else time.searchsorted(
+        pd.Timestamp(end), side="right")
+    return time[first:last], slice(first, last)
+
+
+def aggregate(path, by="highway", start=None, end=None):
+    """Sum the load of the segments by category, district or table.
+
+    by: str object, "highway", "district" or "table".
+    start, end: time window, e.g. "2014-01-01" and "2014-01-31 23:00".
+    returns: dataframe (timesteps x groups) of the summed load in KW.
+    """
+    root = zarr.open_group(path, mode="r")
+    time, columns = time_slice(root, start, end)
+    codes = root[by][:]
+    labels = root.attrs[by]
+    load = root["load"]
+    chunk = load.chunks[0]
+    total = np.zeros((len(labels), len(time)))
+    for first in range(0, load.shape[0], chunk):
+        block = load[first:first + chunk, columns]
+        # one-hot (groups x segments) times the block sums each group
+        onehot = np.zeros((len(labels), len(block)), dtype=np.float32)
+        onehot[codes[first:first + chunk], np.arange(len(block))] = 1.0
+        total += onehot @ block
+    return pd.DataFrame(total.T, index=time, columns=labels)
+
+
+def segment_energy(path, start=None, end=None, hours=None):
+    """Return the energy (KWh) of every segment in a time window.
+
+    hours: list of hours of the day, e.g. [17, 18, 19, 20, 21] for the
+    evening peak, None takes all hours.
+    """
+    root = zarr.open_group(path, mode="r")
+    time, columns = time_slice(root, start, end)
+    mask = np.ones(len(time), dtype=bool) if hours is None else \
+        np.isin(time.hour, hours)
+    load = root["load"]
+    chunk = load.chunks[0]
+    energy = np.zeros(load.shape[0])
+    for first in range(0, load.shape[0], chunk):
+        energy[first:first + chunk] = load[first:first + chunk,
+                                           columns][:, mask].sum(axis=1)
+    return pd.DataFrame({
+        "osm_id": root["osm_id"][:],
+        "table": np.array(root.attrs["table"])[root["table"][:]],
+        "highway": np.array(root.attrs["highway"])[root["highway"][:]],
+        "district": np.array(root.attrs["district"])[root["district"][:]],
+        "energy": energy})
+
+
+if __name__ == "__main__":
+    enable_profile()
+    parser = optparse.OptionParser(
+        usage="%prog [options] build|aggregate|top")
+    parser.add_option("-m", "--mode", action="store", dest="mode",
+                      default="Mode3", help="lighting mode, Mode1-3")
+    parser.add_option("-c", "--chunk", action="store", dest="chunk",
+                      type="int", default=2000,
+                      help="segments per chunk of the store")
+    parser.add_option("-d", "--districts", action="store", dest="districts",
+                      default=None, help="file of district polygons")
+    parser.add_option("-n", "--district-column", action="store",
+                      dest="district_column", default="name",
+                      help="district name column of the district file")
+    parser.add_option("-b", "--by", action="store", dest="by",
+                      type="choice", choices=["highway", "district", "table"],
+                      default="highway", help="aggregation of the segments")
+    parser.add_option("-s", "--start", action="store", dest="start",
+                      default=None, help="start of the time window")
+    parser.add_option("-e", "--end", action="store", dest="end",
+                      default=None, help="end of the time window")
+    parser.add_option("-H", "--hours", action="store", dest="hours",
+                      default=None, help="hours of the day, e.g. 17-21")
+    parser.add_option("-t", "--top", action="store", dest="top", type="int",
+                      default=20, help="number of segments listed by top")
+    (options, args) = parser.parse_args()
+    command = args[0] if args else "build"
+    output_path = "../data/03_urban_energy_requirements/"
+    path = os.path.join(output_path, store_name)
+
+    if command == "build":
+        with span("segment_load.build") as s:
+            build_segment_load(mode=options.mode,
+                               chunk_segments=options.chunk,
+                               districts=options.districts,
+                               district_column=options.district_column)
+            s.add_output(path)
+        print("INFO: per segment load written to {}".format(path))
+    elif command == "aggregate":
+        with span("segment_load.aggregate") as s:
+            result = aggregate(path, options.by, options.start, options.end)
+            name = os.path.join(output_path,
+                                "segment_load_by_{}.csv".format(options.by))
+            result.to_csv(name, index_label="TIME")
+            s.add_output(name)
+        print("INFO: load by {} written to {}".format(options.by, name))
+    elif command == "top":
+        hours = None
+        if options.hours:
+            first, last = options.hours.split("-")
+            hours = list(range(int(first), int(last) + 1))
+        energy = segment_energy(path, options.start, options.end, hours)
+        print(energy.nlargest(options.top, "energy").to_string(index=False))
+    else:
+        parser.error("unknown command {}".format(command))
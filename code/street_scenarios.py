@@ -1,20 +1,53 @@
 """Generate street light loads timeseries for the aggregated area."""
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import logging
 import os
 from pathlib import Path
+from highway_io import read_highways
+from instrument import enable_profile, span
+from timeseries_store import read_timeseries
+
+# main roads are illuminated all night (SB2) in scenario Mode3, the other
+# line categories follow SB1
+main_roads = ['living_street', 'motorway', 'pedestrian', 'primary',
+              'secondary', 'service', 'tertiary', 'trunk']
+
+
+def street_light_load(areas, profiles, x_sl):
+    """Return the street light load of all modes in one broadcast.
+
+    areas: array (modes x 2), area in m2 operated with the SB1 and with the
+    SB2 profile in each mode.
+    profiles: array (2 x timesteps), normalised SB1 and SB2 profiles in KW.
+    x_sl: float, electricity usage index.
+    returns: array (modes x timesteps), load in KW.
+    """
+    return np.asarray(areas, dtype=float) @ np.asarray(profiles) * x_sl
+
+
+def write_load(load, path):
+    """Write the load of all modes with one bulk write (TIME;mode...)."""
+    load.to_csv(path, sep=";", index_label="TIME")
 
 
 class simulateStreetLight:
     """Simulate street light Electricity demand."""
 
-    def config(self):
-        """Generate street light load time series."""
-        self.input_path = "../data/01_raw_input_data/"
-        self.input_path2 = "../data/02_urban_output_data/"
-        self.output_path = "../data/03_urban_energy_requirements/"
-        self.output_path_fig = "../data/04_Visualisation/"
+    def config(self, input_path="../data/01_raw_input_data/",
+               input_path2="../data/02_urban_output_data/",
+               output_path="../data/03_urban_energy_requirements/",
+               output_path_fig="../data/04_Visualisation/"):
+        """Generate street light load time series.
+
+        The paths default to the single region layout of the makefile, the
+        batch runner passes the folders of each region.
+        """
+        self.input_path = input_path
+        self.input_path2 = input_path2
+        self.output_path = output_path
+        self.output_path_fig = output_path_fig
 
         logging.basicConfig(format='%(asctime)s: %(levelname)s: %(message)s',
                             filename="../code/log/street_lightload.log",
@@ -29,11 +62,18 @@ class simulateStreetLight:
             logging.info("directory {} succesfully created!.".
                          format("03_urban_energy_requirements"))
 
-    def get_standardLoad(self):
-        """Get standard load profile."""
+    def get_standardLoad(self, standardLoad=None):
+        """Get standard load profile.
+
+        standardLoad: dataframe object with the columns SB1 and SB2 indexed
+        by time, read from SLP_hourly.csv if None.
+        """
         print('INFO: Normalise Standard Load Profiles')
-        self.standardLoad = pd.read_csv(
-            os.path.join(self.input_path, 'SLP_hourly.csv'))
+        if standardLoad is None:
+            standardLoad = read_timeseries(
+                os.path.join(self.input_path, 'SLP_hourly.csv'),
+                index_col='Zeitstempel')
+        self.standardLoad = standardLoad
 
         # SL1: All urban lights are operated as
         # - evening (16:15) - midnight (00:00) => 'On'
@@ -43,23 +83,31 @@ class simulateStreetLight:
 
         # All urban roads are illuminated all night
         self.SL2 = self.standardLoad['SB2'] / 1000  # KW
+        # both profiles as one (2 x timesteps) array
+        self.profiles = np.vstack([self.SL1.values, self.SL2.values])
 
         logging.info("Read and normalise Standard Load Profiles.")
 
-    def electricityUsageIndex(self):
-        """Calculate electricity Usage Index."""
-        self.x_sl = 0.01464
-        self.timestamp = self.standardLoad['Zeitstempel']
+    def electricityUsageIndex(self, x_sl=0.01464):
+        """Calculate electricity Usage Index.
+
+        x_sl: float, electricity usage index, scenario_sweep.py evaluates
+        many values at once.
+        """
+        self.x_sl = x_sl
+        self.timestamp = self.standardLoad.index
         print("INFO: Electricity Usage Index {}".format(self.x_sl))
 
     def simulateLoadAllRoad(self):
         """Simulate street lightning demand for different scenarios."""
         print('INFO: Simulate Street Light load')
         # get planet OSM data for highway (line and polygon)
-        self.osmLines = pd.read_csv(os.path.join(
-            self.input_path2, 'planet_osm_line.csv'))
-        self.osmSquares = pd.read_csv(os.path.join(
-            self.input_path2, 'planet_osm_polygon.csv'))
+        # only the highway category and area are needed, no geometries
+        self.osmLines = read_highways(self.input_path2, 'planet_osm_line',
+                                      columns=["highway", "area"])
+        self.osmSquares = read_highways(self.input_path2,
+                                        'planet_osm_polygon',
+                                        columns=["highway", "area"])
         self.osmData = pd.concat([self.osmLines.loc[:, ["highway", "area"]],
                                   self.osmSquares.loc[:, ["highway", "area"]]],
                                  ignore_index=True)
@@ -67,11 +115,8 @@ class simulateStreetLight:
         self.osmArea = self.osmData["area"].sum()
         print('osmArea_all: {}'.format(self.osmArea))
         # scenario 3 => main roads only for all night
-        mainRoads = ['living_street', 'motorway', 'pedestrian', 'primary',
-                     'secondary', 'service', 'tertiary', 'trunk']
-
         self.mainRoadsArea = self.osmLines[self.osmLines["highway"].
-                                           isin(mainRoads)]["area"].sum()
+                                           isin(main_roads)]["area"].sum()
         print('INFO: mainRoadsArea: {}'.format(self.mainRoadsArea))
         self.squaresArea = self.osmSquares["area"].sum()
         print('INFO: squaresArea: {}'.format(self.squaresArea))
@@ -81,38 +126,40 @@ class simulateStreetLight:
         # scenario 4 => minus the selected main roads
         # operated using SL1 (on and off)
         self.secondaryRoadsArea = self.osmLines[~self.osmLines["highway"].
-                                                isin(mainRoads)]["area"].sum()
+                                                isin(main_roads)]["area"].sum()
         print('INFO: secondaryRoadsArea: {}'.format(self.secondaryRoadsArea))
 
-# write calculated street-light load in KW of different scenarios and write to csv
-        _streetLoad_ = []
-        fname = open(os.path.join(self.output_path,
-                                  "streetlight_load.csv"), 'w')
-        fname.write('TIME;Mode2;Mode1;Mode3\n')
-        for i, row in self.standardLoad.iterrows():
-            row = str(self.timestamp[i]) + ';' + \
-                str(self.osmArea*self.SL1[i]*self.x_sl) + ';' +\
-                str(self.osmArea*self.SL2[i]*self.x_sl) + ';' +\
-                str((self.mainRoadandsquareArea*self.SL2[i]*self.x_sl) + (
-                    self.secondaryRoadsArea*self.SL1[i]*self.x_sl)) + '\n'
-            _streetLoad_.append(row)
-        fname.writelines(_streetLoad_)
-        fname.close()
-
-    def get_feedInData(self):
-        """Get solar data."""
+        # area operated with the SB1 and with the SB2 profile in each mode
+        self.modes = {
+            "Mode2": (self.osmArea, 0.0),
+            "Mode1": (0.0, self.osmArea),
+            "Mode3": (self.secondaryRoadsArea, self.mainRoadandsquareArea)}
+
+        # street-light load in KW of all modes, kept for get_feedInData and
+        # plotLoadScenario and written to csv at once
+        load = street_light_load(list(self.modes.values()), self.profiles,
+                                 self.x_sl)
+        self.load = pd.DataFrame(load.T, index=pd.DatetimeIndex(
+            self.timestamp, name="TIME"), columns=list(self.modes))
+        write_load(self.load, os.path.join(self.output_path,
+                                           "streetlight_load.csv"))
+
+    def get_feedInData(self, feedin=None):
+        """Get solar data.
+
+        feedin: dataframe object with the columns wind and pv indexed by
+        time, read from wind_power.csv and pv_power.csv if None.
+        """
         # demand and supply
-        pv = pd.read_csv(os.path.join(
-            self.input_path, 'pv_power.csv'), parse_dates=True)
-        wind = pd.read_csv(os.path.join(
-            self.input_path, 'wind_power.csv'), parse_dates=True)
-
-        wind['pv'] = pv['pv']
-        self.feedin = wind
-
-        self.df6 = pd.read_csv(os.path.join(self.output_path, "streetlight_load.csv"),
-                               delimiter=";", index_col='TIME', parse_dates=True)
-        self.df6 = self.df6.iloc[0:len(wind.index)]  # TODO: fix index
+        if feedin is None:
+            pv = read_timeseries(os.path.join(self.input_path,
+                                              'pv_power.csv'))
+            feedin = read_timeseries(os.path.join(
+                self.input_path, 'wind_power.csv')).assign(
+                    pv=pv['pv'].values)
+        self.feedin = feedin[["wind", "pv"]].reset_index()
+
+        self.df6 = self.load.iloc[0:len(self.feedin.index)]  # TODO: fix index
         self.feedin['demand_Mode2'] = self.df6['Mode2'].values
         self.feedin['demand_Mode1'] = self.df6['Mode1'].values
         # + \self. df6['SB1_rest']
@@ -157,6 +204,7 @@ class simulateStreetLight:
         plt.savefig(self.output_path_fig +
                     "load_streetlight_planet_osm_line.png",
                     facecolor=fig.get_facecolor(), dpi=300)
+        plt.close(fig)
 
         logging.info("Street. quarter hourly ERs simulated.")
 
@@ -164,13 +212,28 @@ class simulateStreetLight:
                              sl=True):
         """Trigger all methods for street light simulation."""
         self.config()
-        self.get_standardLoad()
-        self.electricityUsageIndex()
-        self.simulateLoadAllRoad()
-        self.get_feedInData()
-        self.plotLoadScenario()
+        with span("street_light.standard_load") as s:
+            self.get_standardLoad()
+            self.electricityUsageIndex()
+            s.rows_out = len(self.standardLoad)
+        with span("street_light.simulate") as s:
+            self.simulateLoadAllRoad()
+            s.rows_in = len(self.osmData)
+            s.rows_out = len(self.standardLoad)
+            s.add_output(os.path.join(self.output_path,
+                                      "streetlight_load.csv"))
+        with span("street_light.commodities") as s:
+            self.get_feedInData()
+            s.rows_out = len(self.feedin)
+            s.add_output(os.path.join(self.output_path,
+                                      "optimization-commodities.csv"))
+        with span("street_light.plot") as s:
+            self.plotLoadScenario()
+            s.add_output(self.output_path_fig +
+                         "load_streetlight_planet_osm_line.png")
 
 
 if __name__ == "__main__":
+    enable_profile()
     streelight_simulation = simulateStreetLight()
     streelight_simulation.simulate_StreetLight()
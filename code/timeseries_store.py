@@ -0,0 +1,140 @@
+"""Binary cache of the csv time series inputs.
+
+The first read of a csv time series (SLP_hourly.csv, pv_power.csv,
+wind_power.csv, solar_data.csv, wind_data.csv,
+optimization-commodities.csv) parses it once and stores the datetime index
+as int64 nanoseconds and the columns as float64 .npy arrays, keyed by the
+hash of the file content and the read options. Later reads map the arrays
+copy-on-write into a dataframe without parsing or copying them.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+cache_dir = "../data/timeseries_cache/"
+catalog_file = os.path.join(cache_dir, "catalog.json")
+
+
+def file_hash(path, options):
+    """Return the sha1 of the file content and the read options."""
+    sha = hashlib.sha1(json.dumps(options, sort_keys=True).encode("utf-8"))
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def read_catalog():
+    """Return the cached hash, size and mtime of every source file."""
+    if not os.path.exists(catalog_file):
+        return {}
+    with open(catalog_file) as f:
+        return json.load(f)
+
+
+def write_catalog(catalog):
+    """Replace the catalog file atomically."""
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".json")
+    with os.fdopen(fd, "w") as f:
+        json.dump(catalog, f, indent=1)
+    os.replace(tmp, catalog_file)
+
+
+def source_key(path, options):
+    """Return the cache key of a source file.
+
+    The content is only hashed again if the size or mtime of the file
+    changed since the last read.
+    """
+    stat = os.stat(path)
+    entry_id = os.path.abspath(path) + "|" + json.dumps(options,
+                                                         sort_keys=True)
+    catalog = read_catalog()
+    entry = catalog.get(entry_id)
+    if entry and entry["size"] == stat.st_size and \
+            entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry["hash"]
+    key = file_hash(path, options)
+    stale = entry["hash"] if entry and entry["hash"] != key else None
+    catalog[entry_id] = {"hash": key, "size": stat.st_size,
+                         "mtime_ns": stat.st_mtime_ns}
+    os.makedirs(cache_dir, exist_ok=True)
+    write_catalog(catalog)
+    if stale and stale not in [e["hash"] for e in catalog.values()]:
+        shutil.rmtree(os.path.join(cache_dir, stale), ignore_errors=True)
+    return key
+
+
+def store_frame(frame, folder):
+    """Write the index, values and column metadata of a frame to folder.
+
+    The files are written to a temporary folder next to folder and renamed
+    at once, so readers never see a partly written frame.
+    """
+    tmp = tempfile.mkdtemp(dir=os.path.dirname(os.path.normpath(folder)))
+    index = frame.index
+    tz = str(index.tz) if index.tz is not None else None
+    if tz:
+        index = index.tz_convert("UTC").tz_localize(None)
+    np.save(os.path.join(tmp, "index.npy"),
+            index.values.astype("datetime64[ns]").view(np.int64))
+    # one row per column, so each column is contiguous in the file
+    np.save(os.path.join(tmp, "values.npy"),
+            np.ascontiguousarray(frame.values.T, dtype=np.float64))
+    columns = frame.columns
+    meta = {"columns": [list(c) if isinstance(c, tuple) else c
+                        for c in columns],
+            "column_names": list(columns.names),
+            "multiindex": isinstance(columns, pd.MultiIndex),
+            "index_name": frame.index.name, "tz": tz}
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    try:
+        os.rename(tmp, folder)
+    except OSError:
+        # written by another process in the meantime
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def load_frame(folder):
+    """Map a stored frame copy-on-write, the arrays are not read."""
+    with open(os.path.join(folder, "meta.json")) as f:
+        meta = json.load(f)
+    index = np.load(os.path.join(folder, "index.npy"), mmap_mode="c")
+    values = np.load(os.path.join(folder, "values.npy"), mmap_mode="c")
+    index = pd.DatetimeIndex(index.view("datetime64[ns]"),
+                             name=meta["index_name"])
+    if meta["tz"]:
+        index = index.tz_localize("UTC").tz_convert(meta["tz"])
+    if meta["multiindex"]:
+        columns = pd.MultiIndex.from_tuples(
+            [tuple(c) for c in meta["columns"]], names=meta["column_names"])
+    else:
+        columns = pd.Index(meta["columns"], name=meta["column_names"][0])
+    return pd.DataFrame(values.T, index=index, columns=columns, copy=False)
+
+
+def read_timeseries(path, index_col=0, header=0, utc=False):
+    """Read a csv time series through the binary cache.
+
+    path: str object, csv file with a datetime column and float columns.
+    index_col: int or str object, the datetime column.
+    header: int or list, header rows of the csv file (e.g. [0, 1] for the
+    two level columns of wind_data.csv).
+    utc: bool, convert the datetimes to UTC in one vectorized call.
+    returns: dataframe with a DatetimeIndex and float64 columns.
+    """
+    options = {"index_col": index_col, "header": header, "utc": utc}
+    key = source_key(path, options)
+    folder = os.path.join(cache_dir, key)
+    if not os.path.exists(os.path.join(folder, "meta.json")):
+        frame = pd.read_csv(path, index_col=index_col, header=header)
+        index_name = frame.index.name
+        frame.index = pd.DatetimeIndex(pd.to_datetime(frame.index, utc=utc),
+                                       name=index_name)
+        store_frame(frame.astype(np.float64), folder)
+    return load_frame(folder)
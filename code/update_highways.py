@@ -0,0 +1,214 @@
+"""Incrementally update the highway tables from a changed database.
+
+A manifest with the osm_id and a content hash of every extracted way is kept
+next to the outputs of get_highways.py. Each run only queries the hashes,
+fetches the ways that were inserted, modified or deleted since the last run
+(e.g. after applying a change file with osm2pgsql --append) and merges them
+into the existing csv or parquet files. The aggregated area of each highway
+category is updated by the delta of the changed ways. The csv and parquet
+outputs are updated independently, each with its own manifest
+(manifest/<table>.<format>.parquet) and area summary
+(manifest/area_summary.<format>.csv).
+"""
+import logging
+import os
+from pathlib import Path
+import pandas as pd
+from db_connect import db_option_parser, dbconn_from_args
+from get_highways import GetLines, GetPolygons, GetPoints, destination
+from highway_io import read_table, write_table
+
+manifest_dir = os.path.join(destination, "manifest/")
+summary_file = os.path.join(manifest_dir, "area_summary.{}.csv")
+
+
+def hash_query(table, highway_feature, lanes=False):
+    """Return sql query and parameters of the osm_id content hashes.
+
+    osm2pgsql splits long ways into several rows with the same osm_id, the
+    hash covers all rows of an osm_id. With lanes the lanes tag is hashed
+    too, it selects the width of a line from the width catalog.
+    """
+    content = "highway || md5(ST_AsEWKB(way))"
+    if lanes:
+        content += " || coalesce(tags -> 'lanes', '')"
+    sql = "SELECT osm_id, md5(string_agg({0}, ',' ORDER BY {0})) FROM {1}\
+     WHERE highway = ANY(%s) GROUP BY osm_id".format(content, table)
+    return sql, (list(highway_feature),)
+
+
+def get_hashes(cur, table, highway_feature, lanes=False):
+    """Query the content hash of every way of a table."""
+    cur.execute(*hash_query(table, highway_feature, lanes))
+    return pd.DataFrame(cur.fetchall(), columns=["osm_id", "hash"])
+
+
+def manifest_path(table, output_format):
+    """Return the manifest file of the output of a table in a format."""
+    return os.path.join(manifest_dir, "{}.{}.parquet".format(table,
+                                                             output_format))
+
+
+def read_manifest(table, output_format="csv"):
+    """Return the manifest of a table or None before the first run."""
+    path = manifest_path(table, output_format)
+    if not Path(path).exists():
+        return None
+    return pd.read_parquet(path)
+
+
+def write_manifest(table, output_format, hashes, dataset):
+    """Write osm_id, hash, highway and area of the extracted ways."""
+    areas = area_by_id(dataset)
+    manifest = hashes.merge(areas, on="osm_id", how="left")
+    manifest["area"] = manifest["area"].fillna(0.0)
+    manifest.to_parquet(manifest_path(table, output_format))
+
+
+def area_by_id(dataset):
+    """Return highway category and summed area of each osm_id."""
+    flat = dataset.reset_index() if dataset.index.name else dataset
+    if "area" not in flat:
+        flat = flat.assign(area=0.0)
+    return flat.groupby("osm_id", as_index=False).agg(
+        {"highway": "first", "area": "sum"})
+
+
+def diff_manifest(old, new):
+    """Compare old and new hashes.
+
+    returns: inserted, modified and deleted osm_id values
+    """
+    merged = old[["osm_id", "hash"]].merge(new, on="osm_id", how="outer",
+                                           suffixes=("_old", "_new"),
+                                           indicator=True)
+    inserted = merged.loc[merged["_merge"] == "right_only", "osm_id"]
+    deleted = merged.loc[merged["_merge"] == "left_only", "osm_id"]
+    both = merged[merged["_merge"] == "both"]
+    modified = both.loc[both["hash_old"] != both["hash_new"], "osm_id"]
+    return inserted.values, modified.values, deleted.values
+
+
+def update_summary(table, output_format, removed, added):
+    """Update the aggregated area per highway category by a delta.
+
+    removed: dataframe of highway and area of the replaced/deleted ways.
+    added: dataframe of highway and area of the inserted/modified ways.
+    """
+    path = summary_file.format(output_format)
+    if Path(path).exists():
+        summary = pd.read_csv(path)
+    else:
+        summary = pd.DataFrame(columns=["table", "highway", "area"])
+    delta = pd.concat([added[["highway", "area"]],
+                       removed[["highway", "area"]].assign(
+                           area=lambda df: -df["area"])])
+    delta = delta.groupby("highway", as_index=False)["area"].sum()
+    delta["table"] = table
+
+    summary = pd.concat([summary, delta], ignore_index=True)
+    summary["area"] = summary["area"].astype(float)
+    summary = summary.groupby(["table", "highway"], as_index=False)[
+        "area"].sum()
+    summary.to_csv(path, index=False)
+
+
+def update_table(cur, extractor, query, features, output_format="csv",
+                 pushdown=False):
+    """Merge the changed ways of one table into its output file.
+
+    extractor: GetLines, GetPolygons or GetPoints object.
+    query: bound query method of the extractor (e.g. GetLines.line_query).
+    features: bound feature method of the extractor.
+    returns: number of inserted, modified and deleted osm_id values.
+    """
+    table = extractor.table
+    wkb = output_format == "parquet"
+    # lane widths make the area of a line depend on its lanes tag
+    lanes = bool(getattr(extractor, "lane_width", None))
+    hashes = get_hashes(cur, table, extractor.highway_feature, lanes)
+    old = read_manifest(table, output_format)
+    sql, params, columns = query(pushdown, wkb)
+
+    # only the file of the requested format, the geometries of the other
+    # format are WKT text instead of WKB or the reverse
+    try:
+        existing = read_table(destination, table, output_format)
+    except FileNotFoundError:
+        existing = None
+    if old is None or existing is None:
+        # first run or first run in this format, extract the whole table
+        if old is not None:
+            logging.info("no {} output of {}, extracting the whole table."
+                         .format(output_format, table))
+        cur.execute(sql, params)
+        new_data = features(pd.DataFrame(cur.fetchall(),
+                                         columns=columns).dropna())
+        write_table(new_data, destination+table, output_format)
+        write_manifest(table, output_format, hashes, new_data)
+        # the areas of the last manifest are in the summary, replace them
+        removed = old if old is not None else \
+            pd.DataFrame(columns=["highway", "area"])
+        update_summary(table, output_format, removed, area_by_id(new_data))
+        return len(hashes), 0, 0
+
+    inserted, modified, deleted = diff_manifest(old, hashes)
+    changed = list(inserted) + list(modified)
+
+    # fetch only the changed ways
+    new_rows = pd.DataFrame(columns=columns)
+    if changed:
+        cur.execute("SELECT * FROM ({}) q WHERE q.osm_id = ANY(%s)".format(
+            sql), tuple(params or ()) + ([int(i) for i in changed],))
+        new_rows = pd.DataFrame(cur.fetchall(), columns=columns).dropna()
+    new_data = features(new_rows)
+    keyed = new_data.index.name is not None
+    if keyed:
+        new_data = new_data.reset_index()
+    if wkb:
+        new_data["geometry"] = new_data["geometry"].map(bytes)
+
+    # merge into the existing output
+    replaced = set(modified) | set(deleted)
+    kept = existing[~existing["osm_id"].isin(replaced)]
+    merged = pd.concat([kept, new_data], ignore_index=True, sort=False)
+    merged = merged[new_data.columns]
+    if keyed:
+        merged = merged.set_index("highway")
+    write_table(merged, destination+table, output_format)
+
+    # delta of the aggregated areas
+    removed = old[old["osm_id"].isin(replaced)]
+    update_summary(table, output_format, removed, area_by_id(new_data))
+    write_manifest(table, output_format, hashes, merged)
+    return len(inserted), len(modified), len(deleted)
+
+
+def update_highways(cur, output_format="csv", pushdown=False):
+    """Incrementally update lines, polygons and points."""
+    Path(manifest_dir).mkdir(parents=True, exist_ok=True)
+    lines, squares, points = GetLines(), GetPolygons(), GetPoints()
+    extractors = [(lines, lines.line_query, lines.line_features),
+                  (squares, squares.polygons_query,
+                   squares.polygons_features),
+                  (points, points.point_query, points.point_features)]
+    for extractor, query, features in extractors:
+        inserted, modified, deleted = update_table(
+            cur, extractor, query, features, output_format, pushdown)
+        print("INFO: {}: {} inserted, {} modified, {} deleted".format(
+            extractor.table, inserted, modified, deleted))
+        logging.info("{} updated: {} inserted, {} modified, {} deleted."
+                     .format(extractor.table, inserted, modified, deleted))
+
+
+if __name__ == "__main__":
+    parser = db_option_parser()
+    parser.add_option("-W", "--pushdown", action="store_true",
+                      dest="pushdown", default=False,
+                      help="filter categories and compute areas in sql")
+    parser.add_option("-F", "--format", action="store", dest="output_format",
+                      type="choice", choices=["csv", "parquet"],
+                      default="csv", help="output format, csv or parquet")
+    (options, args) = parser.parse_args()
+    conn = dbconn_from_args(parser=parser)
+    update_highways(conn.cursor(), options.output_format, options.pushdown)
@@ -13,8 +13,8 @@ lat : Latitutude of data point (float / list)
 see https://github.com/oemof/feedinlib/tree/dev/example for an example implementation of feedinlib.
 """
 from feedinlib import era5
-import xarray as xr
 import sys
+from weather_store import open_era5
 
 
 def get_data(start_date, end_date, lat, lon, target_file, region=1):
@@ -38,8 +38,9 @@ def get_data(start_date, end_date, lat, lon, target_file, region=1):
                                                  longitude=lon,
                                                  target_file=target_file)
 
-    data_meta = xr.open_dataset(target_file)
-    print(data_meta)
+    # lazy, only the metadata is read
+    with open_era5(target_file) as data_meta:
+        print(data_meta)
     print("Info: Weather data download completed.")
 
 
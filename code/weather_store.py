@@ -0,0 +1,100 @@
+"""Lazy access to the ERA5 weather data in feedinlib format.
+
+The ERA5 netcdf file is opened once, lazily and in chunks along time. Only
+the requested grid points and the variables needed by pvlib and
+windpowerlib are read, in one pass for both formats. For repeated point
+extraction the file can be converted to a zarr store chunked by grid
+point, reading a point then touches one chunk per variable instead of the
+whole file.
+"""
+import optparse
+import numpy as np
+import xarray as xr
+from feedinlib import era5
+
+# variables of the pvlib and windpowerlib formats of feedinlib
+era5_variables = ["u10", "v10", "u100", "v100", "sp", "t2m", "fsr", "fdir",
+                  "ssrd"]
+time_chunk = 8760
+
+
+def open_era5(target_file, chunks=time_chunk):
+    """Open an ERA5 netcdf file or zarr store without reading the data.
+
+    chunks: int, time steps per chunk of a netcdf file, a zarr store keeps
+    its own chunks.
+    """
+    if target_file.rstrip("/").endswith(".zarr"):
+        return xr.open_zarr(target_file)
+    return xr.open_dataset(target_file, chunks={"time": chunks})
+
+
+def coordinate_index(values, bounds):
+    """Return the positions of the coordinate values within bounds.
+
+    bounds: float for the nearest value, list of two floats for a range.
+    """
+    values = np.asarray(values)
+    if np.size(bounds) == 1:
+        return [int(np.abs(values - float(np.ravel(bounds)[0])).argmin())]
+    low, high = sorted(float(b) for b in bounds)
+    return list(np.flatnonzero((values >= low) & (values <= high)))
+
+
+def select_points(ds, lon=None, lat=None):
+    """Select the weather variables of the requested grid points.
+
+    lon, lat: float for the nearest grid point, list of two floats for all
+    grid points of a range, None for all grid points.
+    """
+    ds = ds[[v for v in era5_variables if v in ds.data_vars]]
+    if lon is not None:
+        ds = ds.isel(longitude=coordinate_index(ds.longitude, lon))
+    if lat is not None:
+        ds = ds.isel(latitude=coordinate_index(ds.latitude, lat))
+    return ds
+
+
+def weather_frames(ds, lon=None, lat=None):
+    """Return the pvlib and windpowerlib weather data of grid points.
+
+    The selected data is read once and formatted for both libraries. For a
+    single grid point (lon and lat given as floats) the frames are indexed
+    by time only, like era5.weather_df_from_era5 with a single location.
+    returns: pvlib dataframe, windpowerlib dataframe.
+    """
+    ds = select_points(ds, lon, lat).load()
+    solar_data = era5.format_pvlib(ds.copy())
+    wind_data = era5.format_windpowerlib(ds.copy())
+    if np.size(lon) == 1 and np.size(lat) == 1 and lon is not None and \
+            lat is not None:
+        solar_data.index = solar_data.index.droplevel([1, 2])
+        wind_data.index = wind_data.index.droplevel([1, 2])
+    return solar_data, wind_data
+
+
+def convert_to_zarr(target_file, store, point_chunk=1):
+    """Write the ERA5 variables to a zarr store chunked by grid point.
+
+    Each chunk holds the full time series of point_chunk x point_chunk grid
+    points, the netcdf file is read in chunks along time.
+    """
+    ds = select_points(open_era5(target_file))
+    ds = ds.chunk({"time": -1, "latitude": point_chunk,
+                   "longitude": point_chunk})
+    for name in ds.variables:
+        ds[name].encoding.pop("chunks", None)
+    ds.to_zarr(store, mode="w")
+    return store
+
+
+if __name__ == "__main__":
+    parser = optparse.OptionParser(usage="%prog [options] target_file store")
+    parser.add_option("-c", "--point-chunk", action="store",
+                      dest="point_chunk", type="int", default=1,
+                      help="grid points per chunk along lat and lon")
+    (options, args) = parser.parse_args()
+    if len(args) != 2:
+        parser.error("expected target_file and store")
+    convert_to_zarr(args[0], args[1], options.point_chunk)
+    print("INFO: weather data of {} written to {}".format(args[0], args[1]))